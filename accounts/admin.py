@@ -5,7 +5,7 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import UserProfile, LoginAttempt, PasswordResetToken
+from .models import UserProfile, LoginAttempt, LoginRollup, PasswordResetToken, DigestRun
 
 
 class UserProfileInline(admin.StackedInline):
@@ -200,17 +200,24 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 @admin.register(LoginAttempt)
 class LoginAttemptAdmin(admin.ModelAdmin):
-    """Admin for LoginAttempt model."""
+    """Admin for LoginAttempt model.
+    
+    Only the last LOGIN_LOG_RETENTION of attempts is kept here; older ones
+    are in the login rollups.
+    """
     
     list_display = (
         'username', 'ip_address', 'success', 'timestamp',
         'user_agent_short', 'location_info'
     )
     
+    # No ip_address filter: listing its choices scans the whole table
     list_filter = (
-        'success', 'timestamp', 'ip_address'
+        'success', 'timestamp'
     )
     
+    show_full_result_count = False
+    
     search_fields = (
         'username', 'ip_address', 'user_agent'
     )
@@ -253,6 +260,34 @@ class LoginAttemptAdmin(admin.ModelAdmin):
         return {'delete_selected': actions['delete_selected']}
 
 
+@admin.register(LoginRollup)
+class LoginRollupAdmin(admin.ModelAdmin):
+    """Admin for LoginRollup model."""
+    
+    list_display = (
+        'username', 'ip_address', 'success', 'attempts', 'period',
+        'period_start', 'last_attempt_at'
+    )
+    
+    list_filter = ('period', 'success')
+    
+    search_fields = ('username', 'ip_address')
+    
+    date_hierarchy = 'period_start'
+    
+    ordering = ('-period_start',)
+    
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        """Rollups are computed from the login attempts."""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        """Rollups are computed from the login attempts."""
+        return False
+
+
 @admin.register(PasswordResetToken)
 class PasswordResetTokenAdmin(admin.ModelAdmin):
     """Admin for PasswordResetToken model."""
@@ -318,6 +353,28 @@ class PasswordResetTokenAdmin(admin.ModelAdmin):
     delete_expired.short_description = _('Delete expired tokens')
 
 
+@admin.register(DigestRun)
+class DigestRunAdmin(admin.ModelAdmin):
+    """Admin for DigestRun model."""
+    
+    list_display = (
+        'period_start', 'period_end', 'status', 'sent', 'failed',
+        'duration', 'finished_at'
+    )
+    
+    list_filter = ('status',)
+    
+    ordering = ('-period_end',)
+    
+    def has_add_permission(self, request):
+        """Runs are created by send_newsletter_digest."""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        """Runs are records of what was sent."""
+        return False
+
+
 # Unregister the default User admin and register our custom one
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,263 @@
+"""Batched logging of login attempts, with hourly and daily rollups.
+
+``record()`` does not insert a ``LoginAttempt`` in the request. It puts the
+attempt on an in-process queue, and a writer thread inserts the queue with
+``bulk_create``. A batch is written once it reaches ``LOGIN_LOG_BATCH_SIZE``
+or ``LOGIN_LOG_FLUSH_INTERVAL`` seconds after its first attempt. The same
+write recomputes the hourly ``LoginRollup`` rows the batch falls in, and
+the dashboard and the admin read those rows. When the queue is full the
+attempt is written in the request instead of being dropped.
+
+Rollups are recomputed from the raw rows rather than incremented, so
+rolling up the same hour twice is harmless. ``compact()`` (the
+``compact_login_attempts`` command) rolls up every raw row, deletes raw
+rows older than ``LOGIN_LOG_RETENTION`` and folds hourly rollups older
+than ``LOGIN_ROLLUP_HOURLY_RETENTION`` into daily ones. The raw table
+therefore only holds the last few days.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import LoginAttempt, LoginRollup
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_KEY = ('username', 'ip_address', 'success')
+
+CompactResult = namedtuple('CompactResult', ['rolled_up', 'deleted', 'folded'])
+
+# Put on the queue to make the writer thread write what it has and exit
+_STOP = object()
+
+
+def _batch_size():
+    return getattr(settings, 'LOGIN_LOG_BATCH_SIZE', 100)
+
+
+def _hour(value):
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _day(value):
+    return _hour(value).replace(hour=0)
+
+
+# Rollups -------------------------------------------------------------------
+
+def _upsert(period, rows):
+    """Store aggregated ``rows`` as the ``period`` rollups, replacing their counts."""
+    rollups = [
+        LoginRollup(
+            period=period, period_start=row['bucket'], username=row['username'],
+            ip_address=row['ip_address'], success=row['success'], attempts=row['total'],
+            first_attempt_at=row['first'], last_attempt_at=row['last'],
+        )
+        for row in rows
+    ]
+    LoginRollup.objects.bulk_create(
+        rollups, batch_size=500, update_conflicts=True,
+        unique_fields=['period', 'period_start', *ROLLUP_KEY],
+        update_fields=['attempts', 'first_attempt_at', 'last_attempt_at'],
+    )
+    return len(rollups)
+
+
+def rollup(attempts):
+    """Recompute the hourly rollups of ``attempts`` from them; return how many were stored.
+
+    ``attempts`` must hold every raw row of the hours it covers for its
+    usernames, or the rollups of those hours are undercounted.
+    """
+    rows = (
+        attempts.order_by()
+        .annotate(bucket=TruncHour('timestamp', tzinfo=dt_timezone.utc))
+        .values('bucket', *ROLLUP_KEY)
+        .annotate(total=Count('id'), first=Min('timestamp'), last=Max('timestamp'))
+    )
+    return _upsert('hour', rows)
+
+
+def write(attempts):
+    """Insert ``attempts`` and recompute the hourly rollups they fall in."""
+    with transaction.atomic():
+        LoginAttempt.objects.bulk_create(attempts, batch_size=_batch_size())
+        timestamps = [attempt.timestamp for attempt in attempts]
+        rollup(LoginAttempt.objects.filter(
+            username__in={attempt.username for attempt in attempts},
+            timestamp__gte=_hour(min(timestamps)),
+            timestamp__lt=_hour(max(timestamps)) + timedelta(hours=1),
+        ))
+
+
+def recent_logins(username, limit=5):
+    """Return the latest successful-login rollups of ``username``, newest first."""
+    return LoginRollup.objects.filter(username=username, success=True).order_by('-last_attempt_at')[:limit]
+
+
+# Writer thread -------------------------------------------------------------
+
+class LoginLogWriter:
+    """Queue of login attempts written in batches by a background thread."""
+
+    def __init__(self, maxsize=0):
+        self.queue = queue.Queue(maxsize)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def put(self, attempt):
+        """Queue ``attempt``; return ``False`` when the queue is full."""
+        try:
+            self.queue.put_nowait(attempt)
+        except queue.Full:
+            return False
+        return True
+
+    def _take(self):
+        """Wait for an attempt, then collect more for up to the flush interval."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + getattr(settings, 'LOGIN_LOG_FLUSH_INTERVAL', 2)
+        while len(batch) < _batch_size() and batch[-1] is not _STOP:
+            try:
+                batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        close_old_connections()
+        try:
+            write(batch)
+        except Exception:
+            logger.exception('Could not write %d login attempts; writing them one by one', len(batch))
+            # One bad row (e.g. an unparsable address) must not lose the rest
+            for attempt in batch:
+                try:
+                    write([attempt])
+                except Exception:
+                    logger.exception('Could not write the login attempt of %s', attempt.username)
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._take()
+                attempts = [attempt for attempt in batch if attempt is not _STOP]
+                if attempts:
+                    self._write(attempts)
+                if batch[-1] is _STOP:
+                    break
+        finally:
+            connections.close_all()
+
+    def start(self):
+        """Start the writer thread unless it runs in this process already."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            # After a fork the parent's thread object is copied but not running
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='login-log-writer', daemon=True)
+                self.thread.start()
+
+    def flush(self):
+        """Write every queued attempt in the calling thread; return how many."""
+        attempts = []
+        while True:
+            try:
+                attempt = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if attempt is not _STOP:
+                attempts.append(attempt)
+        if attempts:
+            write(attempts)
+        return len(attempts)
+
+    def stop(self, timeout=5):
+        """Let the writer thread write what it has, then write what is left."""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+        if self.thread is None or not self.thread.is_alive():
+            self.flush()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return this process's writer, which is flushed when the process exits."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = LoginLogWriter(getattr(settings, 'LOGIN_LOG_QUEUE_SIZE', 10000))
+                atexit.register(_writer.stop)
+    return _writer
+
+
+def record(username, ip_address, user_agent='', success=False):
+    """Log a login attempt through the writer thread, or inline without ``LOGIN_LOG_ASYNC``."""
+    attempt = LoginAttempt(
+        username=username, ip_address=ip_address, user_agent=user_agent,
+        success=success, timestamp=timezone.now(),
+    )
+    if getattr(settings, 'LOGIN_LOG_ASYNC', True):
+        writer = get_writer()
+        writer.start()
+        if writer.put(attempt):
+            return
+        logger.warning('The login log queue is full; writing the attempt of %s in the request', username)
+    write([attempt])
+
+
+# Retention -----------------------------------------------------------------
+
+def _delete(queryset, chunk_size=2000):
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return deleted
+        count, _ = queryset.model.objects.filter(pk__in=pks).delete()
+        deleted += count
+
+
+def compact(now=None):
+    """Roll up the raw attempts, delete old ones and fold old hourly rollups into days.
+
+    Returns a ``CompactResult``. Every step recomputes its rollups, so an
+    interrupted run is completed by the next one.
+    """
+    now = now or timezone.now()
+    hourly_cutoff = _day(now - timedelta(seconds=getattr(settings, 'LOGIN_ROLLUP_HOURLY_RETENTION', 60 * 60 * 24 * 90)))
+    # Raw rows never outlive their hourly rollups, so a folded day is never recomputed
+    raw_cutoff = max(
+        _hour(now - timedelta(seconds=getattr(settings, 'LOGIN_LOG_RETENTION', 60 * 60 * 24 * 7))),
+        hourly_cutoff,
+    )
+
+    rolled_up = rollup(LoginAttempt.objects.all())
+    deleted = _delete(LoginAttempt.objects.filter(timestamp__lt=raw_cutoff))
+
+    hourly = LoginRollup.objects.filter(period='hour', period_start__lt=hourly_cutoff)
+    folded = _upsert('day', (
+        hourly.order_by()
+        .annotate(bucket=TruncDay('period_start', tzinfo=dt_timezone.utc))
+        .values('bucket', *ROLLUP_KEY)
+        .annotate(total=Sum('attempts'), first=Min('first_attempt_at'), last=Max('last_attempt_at'))
+    ))
+    _delete(hourly)
+    return CompactResult(rolled_up, deleted, folded)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from accounts.login_log import compact
+
+
+class Command(BaseCommand):
+    help = 'Roll up login attempts and delete the raw attempts past LOGIN_LOG_RETENTION'
+
+    def handle(self, *args, **options):
+        result = compact()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ Stored {result.rolled_up} hourly rollups, deleted {result.deleted} old attempts '
+                f'and folded {result.folded} daily rollups'
+            )
+        )
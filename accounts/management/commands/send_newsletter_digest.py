@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accounts.newsletter import send_digest
+
+
+class Command(BaseCommand):
+    help = 'Email subscribed users a digest of the posts published since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Number of subscribers fetched per query',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Maximum messages per second (0 for no limit)',
+        )
+
+    def handle(self, *args, **options):
+        run = send_digest(chunk_size=options['chunk_size'], rate=options['rate'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ Sent {run.sent} digests, {run.failed} failed in {run.duration:.1f}s'
+            )
+        )
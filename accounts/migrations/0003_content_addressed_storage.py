@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:25
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_userprofile_user'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='avatar',
+            field=models.ImageField(blank=True, help_text='Profile picture', null=True, storage=core.storage.ContentAddressedStorage(), upload_to='avatars/', verbose_name='Avatar'),
+        ),
+    ]
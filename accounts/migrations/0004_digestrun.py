@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(help_text='Posts published after this time are included', verbose_name='Period Start')),
+                ('period_end', models.DateTimeField(verbose_name='Period End')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', max_length=10, verbose_name='Status')),
+                ('last_user_id', models.PositiveIntegerField(default=0, help_text='Subscribers up to this user have been handled', verbose_name='Last User ID')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='Sent')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Failed')),
+                ('duration', models.FloatField(default=0, verbose_name='Duration (seconds)')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Started At')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished At')),
+            ],
+            options={
+                'verbose_name': 'Digest Run',
+                'verbose_name_plural': 'Digest Runs',
+                'ordering': ['-period_end'],
+            },
+        ),
+    ]
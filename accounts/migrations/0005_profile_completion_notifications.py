@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_digestrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='completion_milestone',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Completion Milestone Emailed'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='completion_notified',
+            field=models.BooleanField(default=False, verbose_name='Completion Notified to Admins'),
+        ),
+    ]
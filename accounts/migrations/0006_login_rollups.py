@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:45
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_profile_completion_notifications'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loginattempt',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Timestamp'),
+        ),
+        migrations.CreateModel(
+            name='LoginRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4, verbose_name='Period')),
+                ('period_start', models.DateTimeField(verbose_name='Period Start')),
+                ('username', models.CharField(max_length=150, verbose_name='Username')),
+                ('ip_address', models.GenericIPAddressField(verbose_name='IP Address')),
+                ('success', models.BooleanField(default=False, verbose_name='Success')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('first_attempt_at', models.DateTimeField(verbose_name='First Attempt')),
+                ('last_attempt_at', models.DateTimeField(verbose_name='Last Attempt')),
+            ],
+            options={
+                'verbose_name': 'Login Rollup',
+                'verbose_name_plural': 'Login Rollups',
+                'ordering': ['-period_start'],
+                'indexes': [models.Index(fields=['username', 'last_attempt_at'], name='accounts_lo_usernam_575ced_idx'), models.Index(fields=['period', 'period_start'], name='accounts_lo_period_8f2d5b_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='loginrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'username', 'ip_address', 'success'), name='unique_login_rollup'),
+        ),
+    ]
@@ -1,14 +1,20 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
-from PIL import Image
+from core.storage import blob_storage
 import os
 
 
 class UserProfile(models.Model):
     """Extended user profile model."""
     
+    # Fields counted by get_completion_percentage(), on the user and the profile
+    USER_COMPLETION_FIELDS = ('first_name', 'last_name', 'email')
+    COMPLETION_FIELDS = ('bio', 'avatar', 'birth_date', 'phone', 'country', 'city')
+    COMPLETION_MILESTONES = (50, 80)
+    
     user = models.OneToOneField(
         User,
         on_delete=models.CASCADE,
@@ -26,6 +32,7 @@ class UserProfile(models.Model):
     
     avatar = models.ImageField(
         upload_to='avatars/',
+        storage=blob_storage,
         blank=True,
         null=True,
         verbose_name=_('Avatar'),
@@ -120,6 +127,17 @@ class UserProfile(models.Model):
         verbose_name=_('Newsletter Subscription')
     )
     
+    # Completion emails already sent
+    completion_milestone = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_('Completion Milestone Emailed')
+    )
+    
+    completion_notified = models.BooleanField(
+        default=False,
+        verbose_name=_('Completion Notified to Admins')
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -153,31 +171,6 @@ class UserProfile(models.Model):
             return self.avatar.url
         return '/static/images/default-avatar.svg'
     
-    def save(self, *args, **kwargs):
-        """Override save to resize avatar image."""
-        super().save(*args, **kwargs)
-        
-        if self.avatar:
-            self.resize_avatar()
-    
-    def resize_avatar(self):
-        """Resize avatar image to 300x300 pixels."""
-        try:
-            img = Image.open(self.avatar.path)
-            
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Resize image
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size, Image.Resampling.LANCZOS)
-                img.save(self.avatar.path, 'JPEG', quality=85, optimize=True)
-        except Exception as e:
-            # Log error but don't raise exception
-            print(f"Error resizing avatar: {e}")
-    
     def get_social_links(self):
         """Return dictionary of social media links."""
         links = {}
@@ -219,17 +212,8 @@ class UserProfile(models.Model):
     
     def get_completion_percentage(self):
         """Calculate profile completion percentage."""
-        fields = [
-            self.user.first_name,
-            self.user.last_name,
-            self.user.email,
-            self.bio,
-            self.avatar,
-            self.birth_date,
-            self.phone,
-            self.country,
-            self.city
-        ]
+        fields = [getattr(self.user, name) for name in self.USER_COMPLETION_FIELDS]
+        fields += [getattr(self, name) for name in self.COMPLETION_FIELDS]
         
         completed_fields = sum(1 for field in fields if field)
         return int((completed_fields / len(fields)) * 100)
@@ -262,8 +246,9 @@ class LoginAttempt(models.Model):
         verbose_name=_('Success')
     )
     
+    # Set when the attempt happens, not when the batch writer inserts it
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         verbose_name=_('Timestamp')
     )
     
@@ -281,6 +266,71 @@ class LoginAttempt(models.Model):
         return f"{self.username} - {status} - {self.timestamp}"
 
 
+class LoginRollup(models.Model):
+    """Login attempts of a username from an IP address with one outcome, per hour or day."""
+    
+    PERIOD_CHOICES = [
+        ('hour', _('Hour')),
+        ('day', _('Day')),
+    ]
+    
+    period = models.CharField(
+        max_length=4,
+        choices=PERIOD_CHOICES,
+        verbose_name=_('Period')
+    )
+    
+    period_start = models.DateTimeField(
+        verbose_name=_('Period Start')
+    )
+    
+    username = models.CharField(
+        max_length=150,
+        verbose_name=_('Username')
+    )
+    
+    ip_address = models.GenericIPAddressField(
+        verbose_name=_('IP Address')
+    )
+    
+    success = models.BooleanField(
+        default=False,
+        verbose_name=_('Success')
+    )
+    
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Attempts')
+    )
+    
+    first_attempt_at = models.DateTimeField(
+        verbose_name=_('First Attempt')
+    )
+    
+    last_attempt_at = models.DateTimeField(
+        verbose_name=_('Last Attempt')
+    )
+    
+    class Meta:
+        verbose_name = _('Login Rollup')
+        verbose_name_plural = _('Login Rollups')
+        ordering = ['-period_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'period_start', 'username', 'ip_address', 'success'],
+                name='unique_login_rollup',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['username', 'last_attempt_at']),
+            models.Index(fields=['period', 'period_start']),
+        ]
+    
+    def __str__(self):
+        status = _('Success') if self.success else _('Failed')
+        return f"{self.username} - {status} - {self.attempts} ({self.period} of {self.period_start})"
+
+
 class PasswordResetToken(models.Model):
     """Custom password reset token model."""
     
@@ -326,4 +376,69 @@ class PasswordResetToken(models.Model):
     
     def is_valid(self):
         """Check if token is valid (not used and not expired)."""
-        return not self.used and not self.is_expired()
\ No newline at end of file
+        return not self.used and not self.is_expired()
+
+
+class DigestRun(models.Model):
+    """One newsletter digest run, checkpointed so an interrupted run resumes."""
+    
+    STATUS_CHOICES = [
+        ('running', _('Running')),
+        ('completed', _('Completed')),
+    ]
+    
+    period_start = models.DateTimeField(
+        verbose_name=_('Period Start'),
+        help_text=_('Posts published after this time are included')
+    )
+    
+    period_end = models.DateTimeField(
+        verbose_name=_('Period End')
+    )
+    
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='running',
+        verbose_name=_('Status')
+    )
+    
+    last_user_id = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Last User ID'),
+        help_text=_('Subscribers up to this user have been handled')
+    )
+    
+    sent = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Sent')
+    )
+    
+    failed = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Failed')
+    )
+    
+    duration = models.FloatField(
+        default=0,
+        verbose_name=_('Duration (seconds)')
+    )
+    
+    started_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Started At')
+    )
+    
+    finished_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name=_('Finished At')
+    )
+    
+    class Meta:
+        verbose_name = _('Digest Run')
+        verbose_name_plural = _('Digest Runs')
+        ordering = ['-period_end']
+    
+    def __str__(self):
+        return f"Digest {self.period_start:%Y-%m-%d} – {self.period_end:%Y-%m-%d} ({self.get_status_display()})"
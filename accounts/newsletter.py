@@ -0,0 +1,136 @@
+"""Newsletter digest of recently published posts for subscribed users.
+
+A run covers the posts published since the previous run ended. The digest
+is rendered once per language, subscribers are streamed in ``user_id``
+order, and the emails go out over a connection that is reused for
+``NEWSLETTER_MESSAGES_PER_CONNECTION`` messages, paced to
+``NEWSLETTER_RATE`` messages per second.
+
+The run is checkpointed in ``DigestRun`` after every message, so running
+the command again after an interruption continues with the next subscriber
+instead of mailing everyone twice.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.utils import timezone, translation
+from django.utils.html import strip_tags
+from django.utils.translation import gettext as _
+
+from core.outbox import get_outbox_connection
+
+from .models import DigestRun, UserProfile
+
+logger = logging.getLogger(__name__)
+
+
+def current_run(now=None):
+    """Return the unfinished run, or start one covering the time since the last run."""
+    run = DigestRun.objects.filter(status='running').order_by('period_end').first()
+    if run is not None:
+        return run
+    now = now or timezone.now()
+    previous = DigestRun.objects.filter(status='completed').order_by('-period_end').first()
+    if previous is not None:
+        period_start = previous.period_end
+    else:
+        period_start = now - timedelta(seconds=getattr(settings, 'NEWSLETTER_DEFAULT_PERIOD', 60 * 60 * 24 * 7))
+    return DigestRun.objects.create(period_start=period_start, period_end=now)
+
+
+def digest_posts(run):
+    """Return the posts published within the period of ``run``."""
+    from blog.models import Post
+
+    return list(
+        Post.objects.published()
+        .filter(published_at__gt=run.period_start, published_at__lte=run.period_end)
+        .order_by('-published_at')
+    )
+
+
+def render_digest(posts, language):
+    """Return the ``(subject, text, html)`` of the digest in ``language``."""
+    site_name = getattr(settings, 'SITE_NAME', 'My Website')
+    context = {
+        'posts': posts,
+        'site_name': site_name,
+        'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000').rstrip('/'),
+    }
+    with translation.override(language):
+        subject = _('New on {}').format(site_name)
+        html = render_to_string('accounts/emails/digest.html', context)
+    return subject, strip_tags(html), html
+
+
+def subscribers(after_user_id=0, chunk_size=500):
+    """Stream ``(user_id, email, language)`` of subscribers after ``after_user_id``."""
+    return (
+        UserProfile.objects
+        .filter(newsletter_subscription=True, user__is_active=True, user_id__gt=after_user_id)
+        .exclude(user__email='')
+        .order_by('user_id')
+        .values_list('user_id', 'user__email', 'language')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def send_digest(chunk_size=None, rate=None, messages_per_connection=None, connection=None):
+    """Send the current digest run to every subscriber and return the finished ``DigestRun``."""
+    chunk_size = chunk_size or getattr(settings, 'NEWSLETTER_CHUNK_SIZE', 500)
+    rate = getattr(settings, 'NEWSLETTER_RATE', 10) if rate is None else rate
+    per_connection = messages_per_connection or getattr(settings, 'NEWSLETTER_MESSAGES_PER_CONNECTION', 100)
+    connection = connection or get_outbox_connection()
+
+    run = current_run()
+    posts = digest_posts(run)
+    started, recorded = time.monotonic(), run.duration
+    interval = 1 / rate if rate else 0
+    next_send = started
+    bodies, on_connection = {}, 0
+    from_email = settings.DEFAULT_FROM_EMAIL
+
+    try:
+        for user_id, email, language in (subscribers(run.last_user_id, chunk_size) if posts else ()):
+            if language not in bodies:
+                bodies[language] = render_digest(posts, language)
+            subject, text, html = bodies[language]
+
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_send = max(next_send, time.monotonic()) + interval
+
+            if on_connection >= per_connection:
+                connection.close()
+                on_connection = 0
+            message = EmailMultiAlternatives(subject, text, from_email, [email], connection=connection)
+            message.attach_alternative(html, 'text/html')
+            try:
+                connection.open()
+                message.send()
+            except Exception as error:
+                logger.warning('Could not send the digest to user %s: %s', user_id, error)
+                connection.close()
+                on_connection = 0
+                run.failed += 1
+            else:
+                on_connection += 1
+                run.sent += 1
+
+            run.last_user_id = user_id
+            run.duration = recorded + time.monotonic() - started
+            run.save(update_fields=['last_user_id', 'sent', 'failed', 'duration'])
+    finally:
+        connection.close()
+
+    run.status = 'completed'
+    run.finished_at = timezone.now()
+    run.duration = recorded + time.monotonic() - started
+    run.save(update_fields=['status', 'finished_at', 'duration'])
+    return run
@@ -1,13 +1,14 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from core import tracking
+from core.outbox import enqueue
+from core.tracking import when_changed
 from .models import UserProfile
-import os
 
 
 @receiver(post_save, sender=User)
@@ -18,13 +19,19 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save UserProfile when User is saved."""
+@when_changed(*UserProfile.USER_COMPLETION_FIELDS)
+def save_user_profile(sender, instance, created, **kwargs):
+    """Re-check profile completion when the user fields it counts change."""
+    if created:
+        return
     try:
-        instance.userprofile.save()
+        profile = instance.userprofile
     except UserProfile.DoesNotExist:
         # Create profile if it doesn't exist
         UserProfile.objects.create(user=instance)
+        return
+    notify_admins_of_completion(profile)
+    send_completion_milestone(profile)
 
 
 @receiver(post_save, sender=User)
@@ -44,46 +51,17 @@ def send_welcome_email(sender, instance, created, **kwargs):
             html_message = render_to_string('accounts/emails/welcome_email.html', context)
             plain_message = strip_tags(html_message)
             
-            # Send email
-            send_mail(
+            # Queue email; the mail worker sends it once the user is committed
+            enqueue(
                 subject=subject,
-                message=plain_message,
-                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@example.com'),
-                recipient_list=[instance.email],
-                html_message=html_message,
-                fail_silently=True,  # Don't raise exceptions if email fails
+                body=plain_message,
+                recipients=[instance.email],
+                html_body=html_message,
+                dedupe_key=f'welcome:{instance.pk}',
             )
         except Exception as e:
             # Log the error but don't prevent user creation
-            print(f"Failed to send welcome email to {instance.email}: {e}")
-
-
-@receiver(post_delete, sender=UserProfile)
-def delete_user_avatar(sender, instance, **kwargs):
-    """Delete avatar file when UserProfile is deleted."""
-    if instance.avatar:
-        try:
-            if os.path.isfile(instance.avatar.path):
-                os.remove(instance.avatar.path)
-        except Exception as e:
-            print(f"Failed to delete avatar file: {e}")
-
-
-@receiver(post_save, sender=UserProfile)
-def delete_old_avatar(sender, instance, **kwargs):
-    """Delete old avatar when a new one is uploaded."""
-    if not instance.pk:
-        return
-    
-    try:
-        old_instance = UserProfile.objects.get(pk=instance.pk)
-        if old_instance.avatar and old_instance.avatar != instance.avatar:
-            if os.path.isfile(old_instance.avatar.path):
-                os.remove(old_instance.avatar.path)
-    except UserProfile.DoesNotExist:
-        pass
-    except Exception as e:
-        print(f"Failed to delete old avatar file: {e}")
+            print(f"Failed to queue welcome email to {instance.email}: {e}")
 
 
 @receiver(post_save, sender=UserProfile)
@@ -110,75 +88,86 @@ def log_user_registration(sender, instance, created, **kwargs):
             print(f"Failed to log user registration: {e}")
 
 
+def notify_admins_of_completion(profile):
+    """Notify admins once when ``profile`` reaches 100% completion."""
+    if profile.completion_notified or profile.get_completion_percentage() < 100:
+        return
+    admin_emails = [email for name, email in getattr(settings, 'ADMINS', [])]
+    if not admin_emails:
+        return
+    # Persisted first, so concurrent saves and later logins never notify twice
+    if not UserProfile.objects.filter(pk=profile.pk, completion_notified=False).update(completion_notified=True):
+        return
+    tracking.mark_saved(profile, completion_notified=True)
+    
+    try:
+        context = {
+            'user': profile.user,
+            'profile': profile,
+            'site_name': getattr(settings, 'SITE_NAME', 'My Website'),
+        }
+        
+        subject = _('User Profile Completed: {}').format(profile.user.username)
+        html_message = render_to_string('accounts/emails/profile_completed_admin.html', context)
+        plain_message = strip_tags(html_message)
+        
+        enqueue(
+            subject=subject,
+            body=plain_message,
+            recipients=admin_emails,
+            html_body=html_message,
+            dedupe_key=f'profile-completed:{profile.user_id}',
+        )
+    except Exception as e:
+        print(f"Failed to notify admin about profile completion: {e}")
+
+
+def send_completion_milestone(profile):
+    """Email the user once for the highest completion milestone reached."""
+    completion = profile.get_completion_percentage()
+    reached = [milestone for milestone in UserProfile.COMPLETION_MILESTONES if completion >= milestone]
+    if not reached or reached[-1] <= profile.completion_milestone or not profile.user.email:
+        return
+    milestone = reached[-1]
+    claimed = UserProfile.objects.filter(pk=profile.pk, completion_milestone__lt=milestone)
+    if not claimed.update(completion_milestone=milestone):
+        return
+    tracking.mark_saved(profile, completion_milestone=milestone)
+    
+    try:
+        context = {
+            'user': profile.user,
+            'profile': profile,
+            'completion': completion,
+            'milestone': milestone,
+            'site_name': getattr(settings, 'SITE_NAME', 'My Website'),
+            'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000'),
+        }
+        
+        subject = _('Profile {}% Complete!').format(milestone)
+        html_message = render_to_string('accounts/emails/profile_milestone.html', context)
+        plain_message = strip_tags(html_message)
+        
+        enqueue(
+            subject=subject,
+            body=plain_message,
+            recipients=[profile.user.email],
+            html_body=html_message,
+            dedupe_key=f'profile-milestone:{profile.user_id}:{milestone}',
+        )
+    except Exception as e:
+        print(f"Failed to queue milestone email: {e}")
+
+
 @receiver(post_save, sender=UserProfile)
+@when_changed(*UserProfile.COMPLETION_FIELDS)
 def notify_admin_profile_completion(sender, instance, **kwargs):
     """Notify admin when user completes profile."""
-    completion = instance.get_completion_percentage()
-    
-    # Notify admin when profile is 100% complete
-    if completion == 100:
-        try:
-            admin_emails = [email for name, email in getattr(settings, 'ADMINS', [])]
-            
-            if admin_emails:
-                context = {
-                    'user': instance.user,
-                    'profile': instance,
-                    'site_name': getattr(settings, 'SITE_NAME', 'My Website'),
-                }
-                
-                subject = _('User Profile Completed: {}').format(instance.user.username)
-                html_message = render_to_string('accounts/emails/profile_completed_admin.html', context)
-                plain_message = strip_tags(html_message)
-                
-                send_mail(
-                    subject=subject,
-                    message=plain_message,
-                    from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@example.com'),
-                    recipient_list=admin_emails,
-                    html_message=html_message,
-                    fail_silently=True,
-                )
-        except Exception as e:
-            print(f"Failed to notify admin about profile completion: {e}")
+    notify_admins_of_completion(instance)
 
 
 @receiver(post_save, sender=UserProfile)
+@when_changed(*UserProfile.COMPLETION_FIELDS)
 def send_profile_completion_milestone_email(sender, instance, **kwargs):
-    """Send email when user reaches profile completion milestones."""
-    completion = instance.get_completion_percentage()
-    
-    # Send email at 50% and 80% completion
-    milestones = [50, 80]
-    
-    for milestone in milestones:
-        if completion >= milestone and instance.user.email:
-            # Check if we've already sent this milestone email
-            # You might want to track this in a separate model
-            try:
-                context = {
-                    'user': instance.user,
-                    'profile': instance,
-                    'completion': completion,
-                    'milestone': milestone,
-                    'site_name': getattr(settings, 'SITE_NAME', 'My Website'),
-                    'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000'),
-                }
-                
-                subject = _('Profile {}% Complete!').format(milestone)
-                html_message = render_to_string('accounts/emails/profile_milestone.html', context)
-                plain_message = strip_tags(html_message)
-                
-                send_mail(
-                    subject=subject,
-                    message=plain_message,
-                    from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@example.com'),
-                    recipient_list=[instance.user.email],
-                    html_message=html_message,
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Failed to send milestone email: {e}")
-            
-            # Break after sending the first applicable milestone
-            break
\ No newline at end of file
+    """Send email when user reaches profile completion milestones (50% and 80%)."""
+    send_completion_milestone(instance)
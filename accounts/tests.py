@@ -5,10 +5,20 @@ from django.core import mail
 from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from django.contrib.auth.models import update_last_login
 from datetime import datetime, timedelta
-from .models import UserProfile, LoginAttempt, PasswordResetToken
+from unittest import mock
+from blog.models import Post
+from core.models import OutboundEmail
+from core.outbox import drain
+from .models import UserProfile, LoginAttempt, LoginRollup, PasswordResetToken, DigestRun
+from . import login_log, newsletter
+from .newsletter import send_digest
 from .forms import CustomUserCreationForm, CustomAuthenticationForm, UserProfileForm
 import json
+from io import StringIO
 
 
 class UserProfileModelTest(TestCase):
@@ -514,7 +524,222 @@ class AccountsSignalsTest(TestCase):
             password='testpass123'
         )
         
-        # Check that welcome email was sent
+        # The welcome email is queued and sent by the mail worker
+        self.assertEqual(len(mail.outbox), 0)
+        drain()
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn('Welcome', mail.outbox[0].subject)
-        self.assertEqual(mail.outbox[0].to, ['email@example.com'])
\ No newline at end of file
+        self.assertEqual(mail.outbox[0].to, ['email@example.com'])
+
+
+class NewsletterDigestTest(TestCase):
+    """Test the newsletter digest sender."""
+    
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        for index in range(3):
+            user = User.objects.create_user(
+                username=f'reader{index}',
+                email=f'reader{index}@example.com',
+                password='testpass123'
+            )
+            UserProfile.objects.filter(user=user).update(
+                newsletter_subscription=index != 2,
+                language='ar' if index == 1 else 'en'
+            )
+        self.post = Post.objects.create(
+            title='Fresh Post', content='Body', excerpt='Fresh excerpt', author=self.author,
+            is_published=True, published_at=timezone.now() - timedelta(hours=1)
+        )
+        Post.objects.create(
+            title='Old Post', content='Body', excerpt='Old', author=self.author,
+            is_published=True, published_at=timezone.now() - timedelta(days=30)
+        )
+        mail.outbox = []
+    
+    def test_digest_sent_to_subscribers_once(self):
+        """Subscribers get the recent posts; the next run starts where this one ended."""
+        out = StringIO()
+        call_command('send_newsletter_digest', '--rate', '0', stdout=out)
+        self.assertIn('Sent 2 digests, 0 failed', out.getvalue())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['reader0@example.com', 'reader1@example.com'])
+        self.assertIn('Fresh Post', mail.outbox[0].alternatives[0][0])
+        self.assertNotIn('Old Post', mail.outbox[0].body)
+        
+        run = DigestRun.objects.get()
+        self.assertEqual((run.status, run.sent, run.failed), ('completed', 2, 0))
+        
+        mail.outbox = []
+        second = send_digest(rate=0)
+        self.assertEqual(second.period_start, run.period_end)
+        self.assertEqual(second.sent, 0)
+        self.assertEqual(mail.outbox, [])
+    
+    def test_digest_rendered_once_per_language(self):
+        """The body is rendered per language, not per subscriber."""
+        with mock.patch('accounts.newsletter.render_digest', wraps=newsletter.render_digest) as render:
+            send_digest(rate=0)
+        self.assertEqual(sorted(call.args[1] for call in render.call_args_list), ['ar', 'en'])
+    
+    def test_interrupted_run_resumes(self):
+        """A run that stopped part way continues with the next subscriber."""
+        sent = []
+        
+        def fail_second(messages):
+            sent.append(messages[0].to[0])
+            if len(sent) == 2:
+                raise KeyboardInterrupt
+            return 1
+        
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=fail_second):
+            with self.assertRaises(KeyboardInterrupt):
+                send_digest(rate=0)
+        run = DigestRun.objects.get()
+        self.assertEqual((run.status, run.sent), ('running', 1))
+        
+        send_digest(rate=0)
+        self.assertEqual([message.to[0] for message in mail.outbox], ['reader1@example.com'])
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.sent), ('completed', 2))
+
+
+
+class ProfileChangeTrackingTest(TestCase):
+    """Test that profile side effects run only when their fields change."""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='tracked',
+            email='tracked@example.com',
+            password='testpass123'
+        )
+        self.user = User.objects.get(pk=self.user.pk)
+    
+    def milestone_emails(self):
+        return OutboundEmail.objects.filter(dedupe_key__startswith='profile-milestone:').count()
+    
+    def test_login_does_not_touch_profile(self):
+        """Updating last_login is a single UPDATE of the user row."""
+        with self.assertNumQueries(1):
+            update_last_login(None, self.user)
+    
+    def test_unrelated_user_change_skips_profile(self):
+        """Saving user fields the profile does not count costs no profile queries."""
+        self.user.is_staff = True
+        with self.assertNumQueries(1):
+            self.user.save()
+    
+    def test_milestone_email_sent_once(self):
+        """A milestone is emailed once, even after the outbox forgets it."""
+        profile = self.user.userprofile
+        self.user.first_name, self.user.last_name = 'Tracked', 'User'
+        self.user.save()
+        profile.bio, profile.country = 'Bio', 'Iraq'
+        profile.save()
+        self.assertEqual(self.milestone_emails(), 1)
+        self.assertEqual(UserProfile.objects.get(pk=profile.pk).completion_milestone, 50)
+        
+        OutboundEmail.objects.all().delete()
+        profile.city = 'Baghdad'
+        profile.save()
+        self.user.save()
+        update_last_login(None, self.user)
+        self.assertEqual(self.milestone_emails(), 0)
+        
+        profile.phone, profile.birth_date = '123', datetime(1990, 1, 1).date()
+        profile.save()
+        self.assertEqual(self.milestone_emails(), 1)
+        self.assertEqual(UserProfile.objects.get(pk=profile.pk).completion_milestone, 80)
+
+
+class LoginLogTest(TestCase):
+    """Test batched login logging and the login rollups."""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.writer = login_log.LoginLogWriter()
+        self.writer.start = lambda: None
+    
+    def attempt(self, success=True, username='testuser', ip_address='127.0.0.1', **kwargs):
+        return LoginAttempt(username=username, ip_address=ip_address, success=success, **kwargs)
+    
+    def rollups(self, period='hour'):
+        return {
+            (rollup.username, rollup.success): rollup.attempts
+            for rollup in LoginRollup.objects.filter(period=period)
+        }
+    
+    @override_settings(LOGIN_LOG_ASYNC=True)
+    def test_login_is_queued_not_inserted(self):
+        """The login request only queues its attempt; a flush writes it and its rollup."""
+        with mock.patch.object(login_log, '_writer', self.writer):
+            self.client.post(reverse('accounts:login'), {'username': 'testuser', 'password': 'wrong'})
+            self.client.post(reverse('accounts:login'), {'username': 'testuser', 'password': 'testpass123'})
+        self.assertFalse(LoginAttempt.objects.exists())
+        self.assertEqual(self.writer.queue.qsize(), 2)
+        
+        self.assertEqual(self.writer.flush(), 2)
+        self.assertEqual(LoginAttempt.objects.count(), 2)
+        self.assertEqual(self.rollups(), {('testuser', True): 1, ('testuser', False): 1})
+    
+    @override_settings(LOGIN_LOG_ASYNC=True)
+    def test_full_queue_writes_inline(self):
+        """Attempts are written in the request rather than dropped when the queue is full."""
+        writer = login_log.LoginLogWriter(maxsize=1)
+        writer.start = lambda: None
+        with mock.patch.object(login_log, '_writer', writer):
+            login_log.record('testuser', '127.0.0.1')
+            login_log.record('testuser', '127.0.0.1')
+        self.assertEqual(LoginAttempt.objects.count(), 1)
+        self.assertEqual(writer.queue.qsize(), 1)
+    
+    @override_settings(LOGIN_LOG_BATCH_SIZE=2, LOGIN_LOG_FLUSH_INTERVAL=0)
+    def test_writer_takes_batches(self):
+        """The writer thread takes at most a batch, and stops at the stop marker."""
+        for _ in range(3):
+            self.writer.put(self.attempt())
+        self.writer.put(login_log._STOP)
+        self.assertEqual(len(self.writer._take()), 2)
+        batch = self.writer._take()
+        self.assertEqual(len(batch), 2)
+        self.assertIs(batch[-1], login_log._STOP)
+    
+    def test_rollups_are_recomputed(self):
+        """Rolling up the same hour again does not count its attempts twice."""
+        login_log.write([self.attempt(), self.attempt(), self.attempt(success=False)])
+        login_log.rollup(LoginAttempt.objects.all())
+        self.assertEqual(self.rollups(), {('testuser', True): 2, ('testuser', False): 1})
+    
+    def test_compact_keeps_counts(self):
+        """Old raw attempts are deleted and old hourly rollups folded into days without losing counts."""
+        now = timezone.now()
+        login_log.write([
+            self.attempt(timestamp=now - timedelta(days=100)),
+            self.attempt(timestamp=now - timedelta(days=100, hours=1)),
+            self.attempt(timestamp=now - timedelta(days=10)),
+            self.attempt(timestamp=now),
+        ])
+        LoginAttempt.objects.create(username='legacy', ip_address='10.0.0.1', timestamp=now - timedelta(days=10))
+        
+        out = StringIO()
+        call_command('compact_login_attempts', stdout=out)
+        self.assertIn('deleted 4 old attempts', out.getvalue())
+        self.assertEqual(list(LoginAttempt.objects.values_list('timestamp', flat=True)), [now])
+        self.assertEqual(self.rollups('day'), {('testuser', True): 2})
+        self.assertEqual(
+            sorted(LoginRollup.objects.filter(period='hour').values_list('username', 'attempts')),
+            [('legacy', 1), ('testuser', 1), ('testuser', 1)]
+        )
+        
+        login_log.compact()
+        self.assertEqual(self.rollups('day'), {('testuser', True): 2})
+        self.assertEqual(LoginRollup.objects.filter(period='hour').count(), 3)
+    
+    def test_dashboard_reads_rollups(self):
+        """The dashboard lists recent logins from the rollups."""
+        login_log.write([self.attempt(timestamp=timezone.now() - timedelta(days=30))])
+        LoginAttempt.objects.all().delete()
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('accounts:dashboard'))
+        self.assertEqual([rollup.attempts for rollup in response.context['recent_logins']], [1])
@@ -8,15 +8,16 @@ from django.views.generic import CreateView, UpdateView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.translation import gettext_lazy as _
 from django.http import JsonResponse, HttpResponseRedirect
-from django.core.mail import send_mail
-from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
 from django.contrib.auth.forms import PasswordChangeForm
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_protect
 from django.utils.decorators import method_decorator
-from .models import UserProfile, LoginAttempt, PasswordResetToken
+from core.outbox import enqueue
+from core.throttle import client_ip, lockout_remaining, record_failure, reset_failures, throttle, too_many_requests
+from .models import UserProfile, PasswordResetToken
+from . import login_log
 from .forms import (
     CustomUserCreationForm, UserProfileForm, CustomAuthenticationForm,
     CustomPasswordResetForm, CustomSetPasswordForm
@@ -37,7 +38,8 @@ def get_client_ip(request):
 
 def log_login_attempt(request, username, success=False):
     """Log login attempt for security tracking."""
-    LoginAttempt.objects.create(
+    # Queued and written in batches by the login log writer
+    login_log.record(
         username=username,
         ip_address=get_client_ip(request),
         user_agent=request.META.get('HTTP_USER_AGENT', ''),
@@ -60,23 +62,13 @@ class RegisterView(CreateView):
     
     def form_valid(self, form):
         """Handle valid form submission."""
-        response = super().form_valid(form)
+        # The welcome email is queued by send_welcome_email in the same transaction
+        with transaction.atomic():
+            response = super().form_valid(form)
         
         # Log successful registration
         log_login_attempt(self.request, form.cleaned_data['username'], success=True)
         
-        # Send welcome email
-        try:
-            send_mail(
-                subject=_('Welcome to Muntazir Portfolio'),
-                message=_('Thank you for registering! Welcome to our community.'),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[self.object.email],
-                fail_silently=True
-            )
-        except Exception:
-            pass  # Don't fail registration if email fails
-        
         messages.success(
             self.request,
             _('Registration successful! You can now log in.')
@@ -90,10 +82,17 @@ class RegisterView(CreateView):
         return context
 
 
+@throttle('login')
 @csrf_protect
 def login_view(request):
     """Custom login view with security features."""
     
+    if request.method == 'POST':
+        # Locked out (username, IP) pairs are refused before any database work
+        retry_after = lockout_remaining(request.POST.get('username', ''), client_ip(request))
+        if retry_after:
+            return too_many_requests(retry_after)
+    
     if request.user.is_authenticated:
         return redirect('core:home')
     
@@ -112,6 +111,7 @@ def login_view(request):
             if user is not None:
                 # Log successful login
                 log_login_attempt(request, username, success=True)
+                reset_failures(username, client_ip(request))
                 
                 # Login user
                 login(request, user)
@@ -130,12 +130,14 @@ def login_view(request):
             else:
                 # Log failed login
                 log_login_attempt(request, username, success=False)
+                record_failure(username, client_ip(request))
                 messages.error(request, _('Invalid username or password.'))
         else:
             # Log failed login attempt
             username = request.POST.get('username', '')
             if username:
                 log_login_attempt(request, username, success=False)
+                record_failure(username, client_ip(request))
     
     context = {
         'form': form,
@@ -258,6 +260,7 @@ def change_password_view(request):
     return render(request, 'accounts/change_password.html', context)
 
 
+@throttle('password_reset')
 def password_reset_request_view(request):
     """Password reset request view."""
     
@@ -277,28 +280,28 @@ def password_reset_request_view(request):
                 token = secrets.token_urlsafe(32)
                 expires_at = timezone.now() + timedelta(hours=24)
                 
-                # Invalidate old tokens
-                PasswordResetToken.objects.filter(user=user, used=False).update(used=True)
-                
-                # Create new token
-                reset_token = PasswordResetToken.objects.create(
-                    user=user,
-                    token=token,
-                    expires_at=expires_at
-                )
-                
                 # Send reset email
                 reset_url = request.build_absolute_uri(
                     reverse('accounts:password_reset_confirm', kwargs={'token': token})
                 )
                 
-                send_mail(
-                    subject=_('Password Reset Request'),
-                    message=_('Click the following link to reset your password: {}').format(reset_url),
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[email],
-                    fail_silently=False
-                )
+                with transaction.atomic():
+                    # Invalidate old tokens
+                    PasswordResetToken.objects.filter(user=user, used=False).update(used=True)
+                    
+                    # Create new token
+                    reset_token = PasswordResetToken.objects.create(
+                        user=user,
+                        token=token,
+                        expires_at=expires_at
+                    )
+                    
+                    enqueue(
+                        subject=_('Password Reset Request'),
+                        body=_('Click the following link to reset your password: {}').format(reset_url),
+                        recipients=[email],
+                        dedupe_key=f'password-reset:{reset_token.pk}',
+                    )
                 
                 messages.success(
                     request,
@@ -409,11 +412,8 @@ def dashboard_view(request):
     
     userprofile, created = UserProfile.objects.get_or_create(user=request.user)
     
-    # Get recent login attempts
-    recent_logins = LoginAttempt.objects.filter(
-        username=request.user.username,
-        success=True
-    ).order_by('-timestamp')[:5]
+    # Get recent logins from the rollups, which outlive the raw attempts
+    recent_logins = login_log.recent_logins(request.user.username)
     
     context = {
         'profile': userprofile,
@@ -425,6 +425,7 @@ def dashboard_view(request):
     return render(request, 'accounts/dashboard.html', context)
 
 
+@throttle('ajax_check', methods=None, as_json=True)
 @login_required
 def ajax_check_username(request):
     """AJAX view to check username availability."""
@@ -446,6 +447,7 @@ def ajax_check_username(request):
     return JsonResponse({'available': True, 'message': _('Username is available')})
 
 
+@throttle('ajax_check', methods=None, as_json=True)
 @login_required
 def ajax_check_email(request):
     """AJAX view to check email availability."""
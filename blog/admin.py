@@ -4,6 +4,7 @@ from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.utils import timezone
 from markdownx.admin import MarkdownxModelAdmin
+from core.search import search_queryset
 from .models import Post, Category, Comment
 
 
@@ -26,13 +27,14 @@ class CategoryAdmin(admin.ModelAdmin):
     
     def get_post_count(self, obj):
         """Display number of posts in category."""
-        count = obj.get_post_count()
+        count = obj.published_post_count
         if count > 0:
             url = reverse('admin:blog_post_changelist') + f'?category__id__exact={obj.id}'
             return format_html('<a href="{}">{} posts</a>', url, count)
         return '0 posts'
     
     get_post_count.short_description = _('Posts')
+    get_post_count.admin_order_field = 'published_post_count'
     get_post_count.allow_tags = True
     
     def color_display(self, obj):
@@ -80,12 +82,12 @@ class PostAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         (_('Statistics'), {
-            'fields': ('reading_time', 'views_count'),
+            'fields': ('reading_time', 'word_count', 'views_count', 'media_paths'),
             'classes': ('collapse',)
         }),
     )
     
-    readonly_fields = ['reading_time', 'views_count']
+    readonly_fields = ['reading_time', 'word_count', 'views_count', 'media_paths']
     
     def get_tags(self, obj):
         """Display tags as comma-separated list."""
@@ -108,6 +110,12 @@ class PostAdmin(admin.ModelAdmin):
         """Optimize queryset with select_related."""
         return super().get_queryset(request).select_related('author', 'category').prefetch_related('tags')
     
+    def get_search_results(self, request, queryset, search_term):
+        """Search posts through the full-text index instead of LIKE scans."""
+        if not search_term:
+            return queryset, False
+        return search_queryset(queryset, search_term, order_by_rank=False), False
+    
     actions = ['make_published', 'make_unpublished', 'make_featured', 'make_unfeatured']
     
     def make_published(self, request, queryset):
@@ -130,7 +138,12 @@ class PostAdmin(admin.ModelAdmin):
     
     def make_unpublished(self, request, queryset):
         """Mark selected posts as unpublished."""
-        updated = queryset.update(is_published=False)
+        updated = 0
+        for post in queryset.filter(is_published=True):
+            # Saved one by one so the archive and search index signals run
+            post.is_published = False
+            post.save()
+            updated += 1
         self.message_user(
             request,
             _(f'{updated} posts were successfully marked as unpublished.')
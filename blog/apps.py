@@ -5,4 +5,8 @@ from django.utils.translation import gettext_lazy as _
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
-    verbose_name = _('Blog')
\ No newline at end of file
+    verbose_name = _('Blog')
+    
+    def ready(self):
+        """Import signals when app is ready."""
+        import blog.signals
@@ -0,0 +1,110 @@
+"""Monthly archive index for published posts.
+
+``ArchiveBucket`` holds one row per month with the number of published
+posts whose ``published_at`` falls in it. Signals adjust the buckets in
+the same transaction as the post change. ``rebuild_archive_buckets`` checks
+the table against the posts and repairs it.
+
+Months are taken in the current time zone, like ``published_at__month``.
+"""
+
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+
+def bucket_key(is_published, published_at):
+    """Return the ``(year, month)`` a post counts towards, or ``None``."""
+    if not is_published or published_at is None:
+        return None
+    local = timezone.localtime(published_at) if timezone.is_aware(published_at) else published_at
+    return local.year, local.month
+
+
+def month_range(year, month=None):
+    """Return aware ``[start, end)`` datetimes covering a year or a month.
+
+    Filtering ``published_at`` on a range keeps the column bare, so the
+    ``-published_at`` index can be used.
+    """
+    start = datetime.datetime(year, month or 1, 1)
+    if month is None or month == 12:
+        end = datetime.datetime(year + 1, 1, 1)
+    else:
+        end = datetime.datetime(year, month + 1, 1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def adjust_buckets(old_key, new_key):
+    """Move one post from ``old_key`` to ``new_key`` (either may be ``None``)."""
+    from .models import ArchiveBucket
+
+    if old_key == new_key:
+        return
+    with transaction.atomic():
+        if old_key is not None:
+            year, month = old_key
+            ArchiveBucket.objects.filter(year=year, month=month, count__gt=0).update(count=F('count') - 1)
+            ArchiveBucket.objects.filter(year=year, month=month, count=0).delete()
+        if new_key is not None:
+            year, month = new_key
+            bucket, created = ArchiveBucket.objects.get_or_create(year=year, month=month, defaults={'count': 1})
+            if not created:
+                ArchiveBucket.objects.filter(pk=bucket.pk).update(count=F('count') + 1)
+
+
+def expected_buckets():
+    """Return ``{(year, month): count}`` computed from the posts table."""
+    from .models import Post
+
+    rows = (
+        Post.objects.filter(is_published=True, published_at__isnull=False)
+        .annotate(year=ExtractYear('published_at'), month=ExtractMonth('published_at'))
+        .order_by()
+        .values('year', 'month')
+        .annotate(count=Count('id'))
+    )
+    return {(row['year'], row['month']): row['count'] for row in rows}
+
+
+def check_buckets():
+    """Return ``{(year, month): (stored, expected)}`` for every mismatch."""
+    from .models import ArchiveBucket
+
+    expected = expected_buckets()
+    stored = {(b.year, b.month): b.count for b in ArchiveBucket.objects.all()}
+    return {
+        key: (stored.get(key, 0), expected.get(key, 0))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key, 0) != expected.get(key, 0)
+    }
+
+
+def rebuild_buckets():
+    """Replace the buckets with counts from the posts table.
+
+    Returns the number of buckets written.
+    """
+    from .models import ArchiveBucket
+
+    expected = expected_buckets()
+    with transaction.atomic():
+        ArchiveBucket.objects.all().delete()
+        ArchiveBucket.objects.bulk_create([
+            ArchiveBucket(year=year, month=month, count=count)
+            for (year, month), count in expected.items()
+        ])
+    return len(expected)
+
+
+def archive_months(limit=12):
+    """Return the most recent non-empty buckets up to the current month."""
+    from .models import ArchiveBucket
+
+    today = timezone.localdate()
+    return ArchiveBucket.objects.filter(count__gt=0).filter(
+        Q(year__lt=today.year) | Q(year=today.year, month__lte=today.month)
+    )[:limit]
@@ -0,0 +1,40 @@
+"""Card projections of posts for list pages.
+
+List pages render each post as a card: the title and link, cover, summary,
+category, dates, counters, tags and author. ``post_cards()`` restricts a
+post queryset to ``Post.CARD_FIELDS``, so the body columns (``content``,
+``plain_text``, the outline and media lists) are never read, however long
+the article. The author is flattened into two annotations instead of
+joining the whole user row:
+
+- ``author_name``: the full name, or the username when it is empty;
+- ``author_avatar``: the stored avatar name, turned into a URL with
+  ``avatar_url()`` (the ``avatar_url`` template filter).
+"""
+
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+from django.templatetags.static import static
+
+
+def post_cards(queryset):
+    """Return ``queryset`` loading only what a post card renders."""
+    full_name = Trim(Concat('author__first_name', Value(' '), 'author__last_name', output_field=CharField()))
+    return (
+        queryset.select_related('category')
+        .only(*queryset.model.CARD_FIELDS)
+        .annotate(
+            author_name=Coalesce(NullIf(full_name, Value('')), 'author__username'),
+            author_avatar=F('author__userprofile__avatar'),
+        )
+        .prefetch_related('tags')
+    )
+
+
+def avatar_url(name):
+    """Return the URL of a stored avatar name, or the default avatar."""
+    from accounts.models import UserProfile
+
+    if not name:
+        return static('images/default-avatar.svg')
+    return UserProfile._meta.get_field('avatar').storage.url(name)
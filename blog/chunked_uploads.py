@@ -0,0 +1,177 @@
+"""Resumable uploads assembled from chunks on local disk.
+
+Follows the core of the tus protocol (https://tus.io/protocols/resumable-upload):
+a client creates an upload with its total length, sends the bytes with
+``PATCH`` requests carrying the ``Upload-Offset`` they start at, asks for
+the current offset with ``HEAD`` after a dropped connection, and finalizes
+the upload with the SHA-256 of the whole file. Chunks are streamed from the
+request to a partial file in ``CHUNKED_UPLOAD_DIR`` in small blocks, so
+memory use does not grow with the chunk or file size, and the finished file
+is moved (not copied, on the same file system) into media storage.
+"""
+
+import base64
+import binascii
+import fcntl
+import hashlib
+import os
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A chunk or finalize request that cannot be applied; ``status`` is the HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AssembledFile(File):
+    """Finished partial file; storages that can move files move it instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def upload_dir():
+    path = str(getattr(settings, 'CHUNKED_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'tmp', 'uploads')))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def max_chunk_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def expiry():
+    return timedelta(seconds=getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 60 * 60 * 24))
+
+
+def partial_path(upload):
+    return os.path.join(upload_dir(), f'{upload.pk.hex}.part')
+
+
+def current_offset(upload):
+    """Return how many bytes of ``upload`` have been received."""
+    try:
+        return os.path.getsize(partial_path(upload))
+    except FileNotFoundError:
+        return 0
+
+
+def expires_at(upload):
+    return upload.updated_at + expiry()
+
+
+def parse_checksum(header):
+    """Return the digest of an ``Upload-Checksum: sha256 <base64>`` header."""
+    try:
+        algorithm, value = header.split(' ', 1)
+        digest = base64.b64decode(value.strip(), validate=True)
+    except (ValueError, binascii.Error):
+        raise UploadError('invalid checksum')
+    if algorithm.lower() != 'sha256':
+        raise UploadError('unsupported checksum algorithm')
+    return digest
+
+
+def append_chunk(upload, offset, stream, length, checksum=None):
+    """Write ``length`` bytes of ``stream`` to ``upload`` at ``offset``.
+
+    ``checksum`` is the SHA-256 digest of the chunk; on a mismatch the chunk
+    is discarded and the client may send it again. Returns the new offset.
+    """
+    if length > max_chunk_size():
+        raise UploadError('chunk too large', status=413)
+
+    path = partial_path(upload)
+    with open(path, 'ab') as partial_file:
+        try:
+            fcntl.flock(partial_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('another chunk is being written', status=409)
+
+        if offset != partial_file.seek(0, os.SEEK_END):
+            raise UploadError('offset mismatch', status=409)
+        if offset + length > upload.length:
+            raise UploadError('chunk exceeds upload length', status=413)
+
+        digest = hashlib.sha256()
+        remaining = length
+        try:
+            while remaining:
+                block = stream.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                partial_file.write(block)
+                digest.update(block)
+                remaining -= len(block)
+        except OSError:
+            # Dropped connection: keep what arrived, the client resumes from there
+            pass
+        if checksum is not None and digest.digest() != checksum:
+            partial_file.truncate(offset)
+            raise UploadError('checksum mismatch', status=460)
+        partial_file.flush()
+        new_offset = partial_file.tell()
+
+    upload.save(update_fields=['updated_at'])
+    return new_offset
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(partial(source.read, BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def assembled_file(upload, checksum):
+    """Return the finished file of ``upload`` after verifying its SHA-256 ``checksum``."""
+    if current_offset(upload) != upload.length:
+        raise UploadError('upload is incomplete', status=409)
+    path = partial_path(upload)
+    if file_digest(path) != checksum:
+        raise UploadError('checksum mismatch', status=460)
+    return AssembledFile(open(path, 'rb'), name=upload.filename)
+
+
+def discard(upload):
+    """Delete ``upload`` and its partial file."""
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def delete_expired():
+    """Delete uploads that were not touched within ``CHUNKED_UPLOAD_EXPIRY`` and stray partial files.
+
+    Returns the number of uploads and files removed.
+    """
+    from .models import ChunkedUpload
+
+    expired = ChunkedUpload.objects.filter(updated_at__lt=timezone.now() - expiry())
+    removed = 0
+    for upload in expired:
+        discard(upload)
+        removed += 1
+
+    known = {upload_id.hex for upload_id in ChunkedUpload.objects.values_list('pk', flat=True)}
+    cutoff = (timezone.now() - expiry()).timestamp()
+    with os.scandir(upload_dir()) as entries:
+        for entry in entries:
+            stem = entry.name.split('.', 1)[0]
+            if entry.is_file() and stem not in known and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+    return removed
@@ -0,0 +1,186 @@
+"""Single-pass analysis of the HTML body of a post.
+
+``analyze()`` parses the CKEditor HTML once and returns everything that is
+derived from it: the plain text, the word count, the reading time, an
+automatic excerpt, the heading outline of the table of contents, the first
+image and the media files the body references. ``Post.save()`` stores the
+results in columns, so templates, feeds and the search index read fields
+instead of parsing the body again.
+
+Words are counted after Arabic normalization (harakat split words
+otherwise) and Arabic words are read more slowly than Latin ones.
+
+Bump ``ANALYSIS_VERSION`` whenever the results change; ``analyze_posts``
+then recomputes the stored columns of every post.
+"""
+
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.db import transaction
+
+from core.search import TERM, WHITESPACE, normalize_text
+
+ANALYSIS_VERSION = 1
+
+WORDS_PER_MINUTE = 200
+ARABIC_WORDS_PER_MINUTE = 140
+EXCERPT_LENGTH = 300
+
+ARABIC_LETTERS = re.compile('[\u0600-\u06ff\u0750-\u077f\u08a0-\u08ff]')
+
+# The headings the table of contents lists
+OUTLINE_TAGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4}
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template'}
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption',
+    'figure', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'ol', 'p',
+    'pre', 'section', 'table', 'td', 'th', 'tr', 'ul',
+}
+URL_ATTRIBUTES = {'src', 'href', 'poster', 'data-src'}
+
+ContentAnalysis = namedtuple('ContentAnalysis', [
+    'text', 'word_count', 'reading_time', 'excerpt', 'headings', 'first_image', 'media',
+])
+
+
+def media_path(url):
+    """Return the ``MEDIA_ROOT`` path a URL points to, or ``None`` for other URLs."""
+    prefix = urlsplit(settings.MEDIA_URL).path
+    path = urlsplit(url.strip()).path
+    if path.startswith(prefix) and len(path) > len(prefix):
+        return unquote(path[len(prefix):])
+    return None
+
+
+class _ContentParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.headings = []
+        self.first_image = ''
+        self.media = {}
+        self.skipping = 0
+        self.heading = None
+
+    def _add_urls(self, tag, attrs):
+        for name, value in attrs:
+            if not value:
+                continue
+            if name == 'srcset':
+                urls = [candidate.split()[0] for candidate in value.split(',') if candidate.strip()]
+            elif name in URL_ATTRIBUTES:
+                urls = [value]
+            else:
+                continue
+            for url in urls:
+                path = media_path(url)
+                if path:
+                    self.media[path] = None
+        if tag == 'img' and not self.first_image:
+            src = dict(attrs).get('src') or ''
+            if src and not src.startswith('data:'):
+                self.first_image = src.strip()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+            return
+        if tag in BLOCK_TAGS:
+            self.chunks.append(' ')
+        if tag in OUTLINE_TAGS and self.heading is None:
+            self.heading = (OUTLINE_TAGS[tag], tag, [])
+        self._add_urls(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.chunks.append(' ')
+        self._add_urls(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+            return
+        if tag in BLOCK_TAGS:
+            self.chunks.append(' ')
+        if self.heading is not None and tag == self.heading[1]:
+            level, _, parts = self.heading
+            # Same ids as the ones the post page gives its headings
+            self.headings.append({
+                'level': level,
+                'text': WHITESPACE.sub(' ', ''.join(parts)).strip(),
+                'id': f'heading-{len(self.headings)}',
+            })
+            self.heading = None
+
+    def handle_data(self, data):
+        if self.skipping:
+            return
+        self.chunks.append(data)
+        if self.heading is not None:
+            self.heading[2].append(data)
+
+
+def excerpt(text, length=EXCERPT_LENGTH):
+    """Return the start of ``text``, cut at a word boundary within ``length`` characters."""
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if ' ' in cut:
+        cut = cut[:cut.rindex(' ')]
+    return cut.rstrip(' .,;:،؛') + '…'
+
+
+def reading_time(words, arabic_words=0):
+    """Return the minutes it takes to read ``words``, ``arabic_words`` of them Arabic."""
+    minutes = (words - arabic_words) / WORDS_PER_MINUTE + arabic_words / ARABIC_WORDS_PER_MINUTE
+    return max(1, round(minutes))
+
+
+def analyze(html):
+    """Return the ``ContentAnalysis`` of an HTML fragment."""
+    parser = _ContentParser()
+    parser.feed(str(html or ''))
+    parser.close()
+
+    text = WHITESPACE.sub(' ', ''.join(parser.chunks)).strip()
+    words = TERM.findall(normalize_text(text))
+    arabic_words = sum(1 for word in words if ARABIC_LETTERS.search(word))
+    return ContentAnalysis(
+        text=text,
+        word_count=len(words),
+        reading_time=reading_time(len(words), arabic_words),
+        excerpt=excerpt(text),
+        headings=parser.headings,
+        first_image=parser.first_image,
+        media=list(parser.media),
+    )
+
+
+def backfill(batch_size=200):
+    """Store the analysis of every post analysed by an older version; return how many.
+
+    Posts are handled in primary key order, one transaction per batch, so an
+    interrupted run continues with the posts it had not reached.
+    """
+    from .models import Post
+
+    analysed, last_pk = 0, 0
+    while True:
+        posts = list(
+            Post.objects.filter(analysis_version__lt=ANALYSIS_VERSION, pk__gt=last_pk)
+            .only('pk', 'content', 'excerpt')
+            .order_by('pk')[:batch_size]
+        )
+        if not posts:
+            return analysed
+        for post in posts:
+            post.analyze_content()
+        with transaction.atomic():
+            Post.objects.bulk_update(posts, Post.ANALYSIS_FIELDS)
+        analysed += len(posts)
+        last_pk = posts[-1].pk
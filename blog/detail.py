@@ -0,0 +1,72 @@
+"""Assembly of the post page in a fixed number of queries.
+
+``load_post_page()`` fetches everything the post page shows:
+
+1. the post with its author, author profile, category and number of
+   approved comments;
+2. its tags;
+3. its previous and next posts, by the ids ``blog.neighbours`` stored;
+4. its related posts, from the precomputed similarity table;
+5. the requested page of approved comments.
+
+Neighbours and related posts are loaded with the few columns a link needs,
+not their content. ``PostDetailPageTest.test_query_budget`` fails when the
+page needs more queries.
+"""
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
+
+from core.pagination import CursorPaginator
+
+from .models import Comment, Post
+
+# Columns the previous/next and related links render
+LINK_FIELDS = ('id', 'title', 'slug', 'cover_image', 'published_at', 'created_at')
+
+PostPage = namedtuple('PostPage', [
+    'post', 'tags', 'previous_post', 'next_post', 'related_posts', 'comments', 'comment_count',
+])
+
+
+def load_post_page(slug, comments_cursor=None, related_count=3):
+    """Return the ``PostPage`` of the published post ``slug``, or raise ``Http404``."""
+    approved_count = (
+        Comment.objects.filter(post=OuterRef('pk'), is_approved=True)
+        .order_by().values('post').annotate(total=Count('pk')).values('total')
+    )
+    post = get_object_or_404(
+        Post.objects.published()
+        .select_related('author__userprofile', 'category')
+        .prefetch_related('tags')
+        .defer('plain_text', 'media_paths')
+        .annotate(approved_comment_count=Coalesce(Subquery(approved_count), 0)),
+        slug=slug,
+    )
+    links = Post.objects.published().only(*LINK_FIELDS)
+
+    neighbour_ids = [pk for pk in (post.previous_post_id, post.next_post_id) if pk]
+    neighbours = {neighbour.pk: neighbour for neighbour in links.filter(pk__in=neighbour_ids)} if neighbour_ids else {}
+    related_posts = list(
+        links.filter(related_to_entries__post=post).order_by('-related_to_entries__score')[:related_count]
+    )
+
+    paginator = CursorPaginator(
+        Comment.objects.filter(post=post, is_approved=True),
+        getattr(settings, 'POST_COMMENTS_PER_PAGE', 20),
+        ordering=('-created_at', '-id'),
+    )
+
+    return PostPage(
+        post=post,
+        tags=list(post.tags.all()),
+        previous_post=neighbours.get(post.previous_post_id),
+        next_post=neighbours.get(post.next_post_id),
+        related_posts=related_posts,
+        comments=paginator.get_page(comments_cursor),
+        comment_count=post.approved_comment_count,
+    )
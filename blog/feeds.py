@@ -1,29 +1,85 @@
+import json
+
 from django.contrib.syndication.views import Feed
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404
 from django.urls import reverse
-from django.utils.translation import gettext_lazy as _
-from django.utils.feedgenerator import Atom1Feed
-from django.conf import settings
+from django.utils.feedgenerator import Atom1Feed, SyndicationFeed
+from django.utils.translation import get_language, gettext_lazy as _
+from core import prerender
 from .models import Post
 
 
-class LatestPostsFeed(Feed):
-    """RSS feed for latest blog posts."""
-    
-    title = _("Muntazir Hazim Thamer - Latest Blog Posts")
-    link = "/blog/"
-    description = _("Latest articles and insights from Muntazir Hazim Thamer's blog")
-    
-    def items(self):
+class JSONFeed(SyndicationFeed):
+    """JSON Feed 1.1 generator (https://jsonfeed.org/version/1.1)."""
+    
+    content_type = 'application/feed+json; charset=utf-8'
+    
+    def write(self, outfile, encoding):
+        feed = {
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': str(self.feed['title']),
+            'home_page_url': self.feed['link'],
+            'feed_url': self.feed['feed_url'],
+            'description': str(self.feed['description']),
+            'language': self.feed['language'],
+            'items': [self.item_json(item) for item in self.items],
+        }
+        json.dump({key: value for key, value in feed.items() if value}, outfile, ensure_ascii=False)
+    
+    def item_json(self, item):
+        data = {
+            'id': item['unique_id'] or item['link'],
+            'url': item['link'],
+            'title': str(item['title']),
+            'content_text': str(item['description']),
+            'date_published': item['pubdate'].isoformat() if item['pubdate'] else None,
+            'date_modified': item['updateddate'].isoformat() if item['updateddate'] else None,
+            'authors': [{'name': item['author_name']}] if item['author_name'] else None,
+            'tags': list(item['categories']) or None,
+        }
+        return {key: value for key, value in data.items() if value}
+
+
+class PostFeed(Feed):
+    """Base feed of published posts, pre-rendered once per content change.
+    
+    The rendered bytes are kept by ``core.prerender`` and served with strong
+    ETags, so polling readers get ``304 Not Modified`` without a query.
+    """
+    
+    def __call__(self, request, *args, **kwargs):
+        name = ':'.join([type(self).__name__, get_language() or '', *map(str, args), *map(str, kwargs.values())])
+        return prerender.serve(request, 'feeds', name, lambda: self.render_document(request, *args, **kwargs))
+    
+    def render_document(self, request, *args, **kwargs):
+        """Render the feed and return a ``prerender.Document``."""
+        try:
+            obj = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            raise Http404('Feed object does not exist.')
+        feedgen = self.get_feed(obj, request)
+        content = feedgen.writeString('utf-8').encode('utf-8')
+    
+        # A scheduled post going live changes the feed without a save
+        timeout = prerender.timeout_until(Post.objects.next_scheduled_at())
+        return prerender.build_document(content, feedgen.content_type, feedgen.latest_post_date(), timeout)
+    
+    def get_posts(self, obj=None):
+        """Return the published posts of this feed."""
+        return Post.objects.published().select_related('author', 'category').prefetch_related('tags')
+    
+    def items(self, obj=None):
         """Return latest 10 published posts."""
-        return Post.published.select_related('author', 'category').prefetch_related('tags')[:10]
+        return self.get_posts(obj)[:10]
     
     def item_title(self, item):
         """Return post title."""
         return item.title
     
     def item_description(self, item):
-        """Return post excerpt or truncated content."""
-        return item.excerpt or item.get_excerpt()
+        """Return post excerpt or the start of its content."""
+        return item.summary
     
     def item_link(self, item):
         """Return post absolute URL."""
@@ -60,6 +116,17 @@ class LatestPostsFeed(Feed):
         return False
 
 
+class LatestPostsFeed(PostFeed):
+    """RSS feed for latest blog posts."""
+    
+    title = _("Muntazir Hazim Thamer - Latest Blog Posts")
+    description = _("Latest articles and insights from Muntazir Hazim Thamer's blog")
+    
+    def link(self):
+        """Return blog URL."""
+        return reverse('blog:post_list')
+
+
 class LatestPostsAtomFeed(LatestPostsFeed):
     """Atom feed for latest blog posts."""
     
@@ -67,7 +134,13 @@ class LatestPostsAtomFeed(LatestPostsFeed):
     subtitle = LatestPostsFeed.description
 
 
-class CategoryFeed(Feed):
+class LatestPostsJSONFeed(LatestPostsFeed):
+    """JSON Feed for latest blog posts."""
+    
+    feed_type = JSONFeed
+
+
+class CategoryFeed(PostFeed):
     """RSS feed for posts in a specific category."""
     
     def get_object(self, request, slug):
@@ -87,35 +160,27 @@ class CategoryFeed(Feed):
         """Return feed description with category."""
         return _("Latest posts in {} category").format(obj.name)
     
-    def items(self, obj):
-        """Return latest posts in category."""
-        return Post.published.filter(category=obj).select_related('author', 'category').prefetch_related('tags')[:10]
-    
-    def item_title(self, item):
-        return item.title
-    
-    def item_description(self, item):
-        return item.excerpt or item.get_excerpt()
-    
-    def item_link(self, item):
-        return reverse('blog:post_detail', args=[item.slug])
-    
-    def item_pubdate(self, item):
-        return item.published_at
+    def get_posts(self, obj=None):
+        """Return published posts in category."""
+        return super().get_posts(obj).filter(category=obj)
+
+
+class CategoryAtomFeed(CategoryFeed):
+    """Atom feed for posts in a specific category."""
     
-    def item_updateddate(self, item):
-        return item.updated_at
+    feed_type = Atom1Feed
     
-    def item_author_name(self, item):
-        return item.author.get_full_name() or item.author.username
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class CategoryJSONFeed(CategoryFeed):
+    """JSON Feed for posts in a specific category."""
     
-    def item_categories(self, item):
-        categories = [item.category.name] if item.category else []
-        tags = [tag.name for tag in item.tags.all()]
-        return categories + tags
+    feed_type = JSONFeed
 
 
-class TagFeed(Feed):
+class TagFeed(PostFeed):
     """RSS feed for posts with a specific tag."""
     
     def get_object(self, request, slug):
@@ -135,29 +200,21 @@ class TagFeed(Feed):
         """Return feed description with tag."""
         return _("Latest posts tagged with '{}'").format(obj.name)
     
-    def items(self, obj):
-        """Return latest posts with tag."""
-        return Post.published.filter(tags__in=[obj]).select_related('author', 'category').prefetch_related('tags')[:10]
-    
-    def item_title(self, item):
-        return item.title
-    
-    def item_description(self, item):
-        return item.excerpt or item.get_excerpt()
-    
-    def item_link(self, item):
-        return reverse('blog:post_detail', args=[item.slug])
-    
-    def item_pubdate(self, item):
-        return item.published_at
+    def get_posts(self, obj=None):
+        """Return published posts with tag."""
+        return super().get_posts(obj).filter(tags=obj)
+
+
+class TagAtomFeed(TagFeed):
+    """Atom feed for posts with a specific tag."""
     
-    def item_updateddate(self, item):
-        return item.updated_at
+    feed_type = Atom1Feed
     
-    def item_author_name(self, item):
-        return item.author.get_full_name() or item.author.username
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class TagJSONFeed(TagFeed):
+    """JSON Feed for posts with a specific tag."""
     
-    def item_categories(self, item):
-        categories = [item.category.name] if item.category else []
-        tags = [tag.name for tag in item.tags.all()]
-        return categories + tags
\ No newline at end of file
+    feed_type = JSONFeed
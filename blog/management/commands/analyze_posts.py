@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from blog.content import ANALYSIS_VERSION, backfill
+
+
+class Command(BaseCommand):
+    help = 'Store the text, reading time, outline and media of posts not analysed by the current version'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of posts analysed and updated per query',
+        )
+
+    def handle(self, *args, **options):
+        analysed = backfill(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Analysed {analysed} posts (analysis version {ANALYSIS_VERSION})')
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from blog.chunked_uploads import delete_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that were abandoned before being finalized'
+
+    def handle(self, *args, **options):
+        removed = delete_expired()
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Removed {removed} abandoned uploads')
+        )
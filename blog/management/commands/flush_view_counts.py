@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from blog.counters import flush_views
+
+
+class Command(BaseCommand):
+    help = 'Write buffered post view counts from the cache to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of posts updated per UPDATE statement',
+        )
+
+    def handle(self, *args, **options):
+        flushed = flush_views(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Flushed {flushed} buffered views')
+        )
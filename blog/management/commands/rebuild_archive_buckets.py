@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.archive import check_buckets, rebuild_buckets
+
+
+class Command(BaseCommand):
+    help = 'Check the monthly archive buckets against the posts and rebuild them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report mismatches; exit with an error if there are any',
+        )
+
+    def handle(self, *args, **options):
+        mismatches = check_buckets()
+        for (year, month), (stored, expected) in sorted(mismatches.items()):
+            self.stdout.write(f'{year}-{month:02d}: stored {stored}, expected {expected}')
+
+        if options['check']:
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} archive buckets are out of date')
+            self.stdout.write(self.style.SUCCESS('✓ Archive buckets are consistent'))
+            return
+
+        written = rebuild_buckets()
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Rebuilt {written} archive buckets')
+        )
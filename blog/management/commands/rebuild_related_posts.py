@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from blog.related import TOP_K, rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related posts of every published post'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=TOP_K,
+            help='Number of related posts stored per post',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=256,
+            help='Number of posts compared against the corpus at once',
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_related_posts(
+            top_k=options['top_k'], batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Stored {written} related post entries')
+        )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from blog.media_library import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Import files in MEDIA_ROOT missing from the media library and fix index drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without changing the index',
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile(dry_run=options['dry_run'])
+        for label, paths in (('not indexed', drift.imported), ('changed', drift.changed), ('missing', drift.missing)):
+            for path in paths:
+                self.stdout.write(f'{label}: {path}')
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ {verb} {len(drift.imported)} unindexed, {len(drift.changed)} changed '
+                f'and {len(drift.missing)} missing files'
+            )
+        )
@@ -0,0 +1,143 @@
+"""Database index of the media library used by the editor's file browser.
+
+Every upload is recorded as a ``MediaAsset`` with its size, MIME type,
+dimensions and content hash, so browsing is one paginated query instead of
+a directory walk with several storage calls per file. Images get small
+grid thumbnails from the responsive derivative pipeline (``core.images``).
+
+``reconcile()`` (the ``reconcile_media`` command) imports files that reached
+``MEDIA_ROOT`` without an upload and reports rows whose file changed or
+disappeared.
+"""
+
+import mimetypes
+import os
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from PIL import Image, UnidentifiedImageError
+from core import images
+from core.storage import blob_sha256
+
+from .models import MediaAsset
+
+# Orderings offered by the file browser, keyset-paginated on these columns
+ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'name': ('name', 'id'),
+    'largest': ('-size', '-id'),
+    'smallest': ('size', 'id'),
+}
+
+Drift = namedtuple('Drift', ['imported', 'changed', 'missing'])
+
+
+def _dimensions(path, storage):
+    try:
+        with storage.open(path, 'rb') as source, Image.open(source) as image:
+            return image.size
+    except (OSError, UnidentifiedImageError):
+        return None, None
+
+
+def index_file(path, category, user=None, created_at=None, name=None, storage=None):
+    """Record the stored file ``path`` in the media library and return its asset.
+
+    A content-addressed file that is already indexed is returned as is, so
+    uploading the same bytes again keeps the first upload's details.
+    """
+    storage = storage or default_storage
+    asset = MediaAsset.objects.filter(path=path).first()
+    if asset is not None and blob_sha256(path):
+        return asset
+
+    width, height = _dimensions(path, storage) if category == 'images' else (None, None)
+    asset = asset or MediaAsset(path=path, name=name or os.path.basename(path), uploaded_by=user)
+    asset.category = category
+    asset.mime_type = mimetypes.guess_type(path)[0] or ''
+    asset.size = storage.size(path)
+    asset.width, asset.height = width, height
+    asset.sha256 = blob_sha256(path) or images.file_digest(path, storage)
+    if created_at is not None:
+        asset.created_at = created_at
+    asset.save()
+    if category == 'images':
+        images.schedule_paths([path])
+    return asset
+
+
+def remove_file(path):
+    """Drop ``path`` from the media library."""
+    MediaAsset.objects.filter(path=path).delete()
+
+
+def search(category=None, query=None):
+    """Return the assets of ``category`` whose name contains ``query``."""
+    assets = MediaAsset.objects.all()
+    if category:
+        assets = assets.filter(category=category)
+    if query:
+        assets = assets.filter(Q(name__icontains=query) | Q(path__icontains=query))
+    return assets
+
+
+def thumbnails(assets):
+    """Return the URL of the smallest derivative of each image asset, by hash."""
+    from core.models import ImageDerivative
+
+    hashes = {asset.sha256 for asset in assets if asset.category == 'images'}
+    urls = {}
+    derivatives = ImageDerivative.objects.filter(sha256__in=hashes).order_by('sha256', '-format', 'width')
+    for sha256, path in derivatives.values_list('sha256', 'path'):
+        urls.setdefault(sha256, default_storage.url(path))
+    return urls
+
+
+def _scan(folder, root):
+    """Yield ``(path, size, mtime)`` of every file under ``folder`` of MEDIA_ROOT."""
+    try:
+        entries = os.scandir(os.path.join(root, folder))
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            path = os.path.join(folder, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan(path, root)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                yield path, stat.st_size, stat.st_mtime
+
+
+def reconcile(dry_run=False):
+    """Bring the index in line with the upload folders of ``MEDIA_ROOT``.
+
+    Files without a row are imported, rows whose file size changed are
+    re-indexed and rows whose file is gone are deleted. With ``dry_run``
+    nothing is written. Returns a ``Drift`` of path lists.
+    """
+    from .upload_views import SUPPORTED_FILES
+
+    root = default_storage.location
+    indexed = dict(MediaAsset.objects.values_list('path', 'size'))
+    imported, changed, seen = [], [], set()
+    for category, config in SUPPORTED_FILES.items():
+        for path, size, mtime in _scan(config['folder'].rstrip('/'), root):
+            seen.add(path)
+            if path not in indexed:
+                imported.append(path)
+            elif indexed[path] != size:
+                changed.append(path)
+            else:
+                continue
+            if not dry_run:
+                created_at = datetime.fromtimestamp(mtime, tz=dt_timezone.utc) if path not in indexed else None
+                index_file(path, category, created_at=created_at)
+
+    missing = sorted(set(indexed) - seen)
+    if missing and not dry_run:
+        MediaAsset.objects.filter(path__in=missing).delete()
+    return Drift(sorted(imported), sorted(changed), missing)
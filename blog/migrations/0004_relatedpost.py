@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_alter_post_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='blog.post', verbose_name='Post')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to_entries', to='blog.post', verbose_name='Related Post')),
+            ],
+            options={
+                'verbose_name': 'Related Post',
+                'verbose_name_plural': 'Related Posts',
+                'ordering': ['post', '-score'],
+                'indexes': [models.Index(fields=['post', '-score'], name='blog_relate_post_id_890554_idx')],
+                'unique_together': {('post', 'related')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:50
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_buckets(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    ArchiveBucket = apps.get_model('blog', 'ArchiveBucket')
+    rows = (
+        Post.objects.filter(is_published=True, published_at__isnull=False)
+        .annotate(year=ExtractYear('published_at'), month=ExtractMonth('published_at'))
+        .order_by()
+        .values('year', 'month')
+        .annotate(count=Count('id'))
+    )
+    ArchiveBucket.objects.bulk_create([ArchiveBucket(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_relatedpost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Year')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='Month')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Count')),
+            ],
+            options={
+                'verbose_name': 'Archive Bucket',
+                'verbose_name_plural': 'Archive Buckets',
+                'ordering': ['-year', '-month'],
+                'unique_together': {('year', 'month')},
+            },
+        ),
+        migrations.RunPython(populate_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0007_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True, verbose_name='Path')),
+                ('name', models.CharField(max_length=255, verbose_name='Name')),
+                ('category', models.CharField(choices=[('images', 'Images'), ('videos', 'Videos'), ('audio', 'Audio'), ('documents', 'Documents'), ('archives', 'Archives')], max_length=20, verbose_name='Category')),
+                ('mime_type', models.CharField(blank=True, max_length=100, verbose_name='MIME Type')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Size')),
+                ('width', models.PositiveIntegerField(blank=True, null=True, verbose_name='Width')),
+                ('height', models.PositiveIntegerField(blank=True, null=True, verbose_name='Height')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At')),
+                ('uploaded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='media_assets', to=settings.AUTH_USER_MODEL, verbose_name='Uploaded By')),
+            ],
+            options={
+                'verbose_name': 'Media Asset',
+                'verbose_name_plural': 'Media Assets',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['category', '-created_at'], name='blog_mediaa_categor_dd9d61_idx'), models.Index(fields=['name'], name='blog_mediaa_name_f8083a_idx'), models.Index(fields=['size'], name='blog_mediaa_size_1cee03_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:25
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_mediaasset'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='blog/covers/', verbose_name='Cover Image'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='analysis_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Analysis Version'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='first_image',
+            field=models.CharField(blank=True, editable=False, max_length=500, verbose_name='First Image'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='headings',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Headings'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='media_paths',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Referenced Media'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='plain_text',
+            field=models.TextField(blank=True, editable=False, verbose_name='Plain Text'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='summary',
+            field=models.TextField(blank=True, editable=False, help_text='The excerpt, or the start of the content', verbose_name='Summary'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Word Count'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_posts(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    posts = list(
+        Post.objects.filter(is_published=True, published_at__isnull=False)
+        .order_by('published_at', 'pk').only('pk')
+    )
+    for previous, post, following in zip([None, *posts], posts, [*posts[1:], None]):
+        post.previous_post = previous
+        post.next_post = following
+    Post.objects.bulk_update(posts, ['previous_post', 'next_post'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_post_content_analysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='next_post',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blog.post', verbose_name='Next Post'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='previous_post',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blog.post', verbose_name='Previous Post'),
+        ),
+        migrations.RunPython(link_posts, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,3 @@
-import re
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
@@ -8,8 +7,9 @@ from django.utils.text import slugify
 from markdownx.models import MarkdownxField
 from ckeditor_uploader.fields import RichTextUploadingField
 from taggit.managers import TaggableManager
-from PIL import Image
-import math
+from core.storage import blob_storage
+import datetime
+import uuid
 
 
 class Category(models.Model):
@@ -18,6 +18,7 @@ class Category(models.Model):
     slug = models.SlugField(_('Slug'), unique=True)
     description = models.TextField(_('Description'), blank=True)
     color = models.CharField(_('Color'), max_length=7, default='#3B82F6', help_text=_('Hex color code'))
+    published_post_count = models.PositiveIntegerField(_('Published Posts'), default=0, editable=False)
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
 
     class Meta:
@@ -33,7 +34,7 @@ class Category(models.Model):
 
     def get_post_count(self):
         """Return number of published posts in this category."""
-        return self.posts.filter(is_published=True).count()
+        return type(self).objects.filter(pk=self.pk).values_list('published_post_count', flat=True).first() or 0
 
 
 class PostManager(models.Manager):
@@ -46,6 +47,13 @@ class PostManager(models.Manager):
     def featured(self):
         """Return featured posts."""
         return self.published().filter(is_featured=True)
+    
+    def next_scheduled_at(self):
+        """Return when the next scheduled post goes live, or ``None``."""
+        return (
+            self.filter(is_published=True, published_at__gt=timezone.now())
+            .order_by('published_at').values_list('published_at', flat=True).first()
+        )
 
 
 class Post(models.Model):
@@ -54,12 +62,21 @@ class Post(models.Model):
     slug = models.SlugField(_('Slug'), unique=True)
     excerpt = models.TextField(_('Excerpt'), max_length=300, help_text=_('Brief description of the post'))
     content = RichTextUploadingField(_('Content'))
-    cover_image = models.ImageField(_('Cover Image'), upload_to='blog/covers/', blank=True, null=True)
+    cover_image = models.ImageField(_('Cover Image'), upload_to='blog/covers/', storage=blob_storage, blank=True, null=True)
     
     # Metadata
     reading_time = models.PositiveIntegerField(_('Reading Time (minutes)'), default=1)
     views_count = models.PositiveIntegerField(_('Views Count'), default=0)
     
+    # Derived from the content by blog.content.analyze() on save
+    plain_text = models.TextField(_('Plain Text'), blank=True, editable=False)
+    word_count = models.PositiveIntegerField(_('Word Count'), default=0, editable=False)
+    summary = models.TextField(_('Summary'), blank=True, editable=False, help_text=_('The excerpt, or the start of the content'))
+    headings = models.JSONField(_('Headings'), default=list, blank=True, editable=False)
+    first_image = models.CharField(_('First Image'), max_length=500, blank=True, editable=False)
+    media_paths = models.JSONField(_('Referenced Media'), default=list, blank=True, editable=False)
+    analysis_version = models.PositiveSmallIntegerField(_('Analysis Version'), default=0, editable=False)
+    
     # Relationships
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts', verbose_name=_('Author'))
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='posts', verbose_name=_('Category'))
@@ -70,6 +87,16 @@ class Post(models.Model):
     is_featured = models.BooleanField(_('Featured'), default=False)
     published_at = models.DateTimeField(_('Published At'), blank=True, null=True)
     
+    # Neighbours in publishing order, stored by blog.neighbours
+    previous_post = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='+', verbose_name=_('Previous Post')
+    )
+    next_post = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='+', verbose_name=_('Next Post')
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
@@ -80,6 +107,18 @@ class Post(models.Model):
     
     objects = PostManager()
     
+    # Fields written by analyze_content()
+    ANALYSIS_FIELDS = (
+        'plain_text', 'word_count', 'reading_time', 'summary', 'headings',
+        'first_image', 'media_paths', 'analysis_version',
+    )
+    
+    # Fields a post card renders; see blog.cards
+    CARD_FIELDS = (
+        'id', 'title', 'slug', 'excerpt', 'summary', 'cover_image', 'reading_time', 'views_count',
+        'is_featured', 'published_at', 'created_at', 'category__name', 'category__slug', 'category__color',
+    )
+    
     class Meta:
         verbose_name = _('Post')
         verbose_name_plural = _('Posts')
@@ -102,71 +141,76 @@ class Post(models.Model):
         if self.is_published and not self.published_at:
             self.published_at = timezone.now()
         
-        # Calculate reading time
-        if self.content:
-            self.reading_time = self.calculate_reading_time()
+        # Derive text, reading time, outline and media from the content
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'content', 'excerpt'} & set(update_fields):
+            self.analyze_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.ANALYSIS_FIELDS}
         
         # Generate meta description from excerpt if not provided
-        if not self.meta_description and self.excerpt:
-            self.meta_description = self.excerpt[:160]
+        if not self.meta_description and self.summary:
+            self.meta_description = self.summary[:160]
         
         super().save(*args, **kwargs)
-        
-        # Resize cover image
-        if self.cover_image:
-            self.resize_cover_image()
     
     def get_absolute_url(self):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
     
+    def analyze_content(self):
+        """Store what one parse of the content derives from it."""
+        from .content import ANALYSIS_VERSION, analyze
+        analysis = analyze(self.content)
+        self.plain_text = analysis.text
+        self.word_count = analysis.word_count
+        self.reading_time = analysis.reading_time
+        self.summary = self.excerpt or analysis.excerpt
+        self.headings = analysis.headings
+        self.first_image = analysis.first_image
+        self.media_paths = analysis.media
+        self.analysis_version = ANALYSIS_VERSION
+    
+    @property
+    def rendered_content(self):
+        """The content with lazy media, intrinsic sizes and responsive images."""
+        from .postprocess import render
+        return render(self.content)
+    
+    def get_excerpt(self, length=200):
+        """Return the excerpt, or the start of the content's text."""
+        from .content import excerpt
+        return self.excerpt or excerpt(self.plain_text, length)
+    
     def calculate_reading_time(self):
         """Calculate reading time based on content length."""
-        # Remove markdown syntax and count words
-        text = re.sub(r'[#*`\[\]()_~]', '', self.content)
-        word_count = len(text.split())
-        # Average reading speed: 200 words per minute
-        reading_time = math.ceil(word_count / 200)
-        return max(1, reading_time)  # Minimum 1 minute
-    
-    def resize_cover_image(self):
-        """Resize cover image to optimize file size."""
-        try:
-            img = Image.open(self.cover_image.path)
-            
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Resize if too large
-            max_size = (1200, 630)  # Good for social media sharing
-            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                img.save(self.cover_image.path, 'JPEG', quality=85, optimize=True)
-        except Exception:
-            pass  # Handle image processing errors gracefully
+        from .content import analyze
+        return analyze(self.content).reading_time
     
     def get_related_posts(self, count=3):
-        """Get related posts based on category and tags."""
-        related_posts = Post.objects.published().exclude(id=self.id)
-        
-        # Filter by category first
-        if self.category:
-            related_posts = related_posts.filter(category=self.category)
-        
-        # If not enough posts, include posts with similar tags
-        if related_posts.count() < count:
-            tag_names = list(self.tags.names())
-            if tag_names:
-                related_posts = Post.objects.published().exclude(id=self.id).filter(
-                    tags__name__in=tag_names
-                ).distinct()
-        
-        return related_posts[:count]
+        """Get related posts from the precomputed similarity table."""
+        return (
+            Post.objects.published()
+            .filter(related_to_entries__post=self)
+            .select_related('author', 'category')
+            .order_by('-related_to_entries__score')[:count]
+        )
     
     def increment_views(self):
-        """Increment views count."""
+        """Increment views count immediately in the database."""
+        Post.objects.filter(pk=self.pk).update(views_count=models.F('views_count') + 1)
         self.views_count += 1
-        self.save(update_fields=['views_count'])
+    
+    def get_views_count(self, include_pending=True):
+        """Return views count, optionally including buffered views."""
+        if not include_pending:
+            return self.views_count
+        from .counters import pending_views
+        return self.views_count + pending_views(self.pk)
+    
+    @property
+    def total_views(self):
+        """Views count including views not yet flushed to the database."""
+        return self.get_views_count()
     
     @property
     def reading_time_display(self):
@@ -197,4 +241,105 @@ class Comment(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f'{self.name} on {self.post.title}'
\ No newline at end of file
+        return f'{self.name} on {self.post.title}'
+
+
+class RelatedPost(models.Model):
+    """Precomputed content-similarity neighbour of a post."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries', verbose_name=_('Post'))
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_to_entries', verbose_name=_('Related Post'))
+    score = models.FloatField(_('Score'))
+    
+    class Meta:
+        verbose_name = _('Related Post')
+        verbose_name_plural = _('Related Posts')
+        ordering = ['post', '-score']
+        unique_together = ['post', 'related']
+        indexes = [
+            models.Index(fields=['post', '-score']),
+        ]
+    
+    def __str__(self):
+        return f'{self.post} → {self.related} ({self.score:.3f})'
+
+
+class ArchiveBucket(models.Model):
+    """Number of published posts per month, kept up to date by signals."""
+    year = models.PositiveSmallIntegerField(_('Year'))
+    month = models.PositiveSmallIntegerField(_('Month'))
+    count = models.PositiveIntegerField(_('Count'), default=0)
+    
+    class Meta:
+        verbose_name = _('Archive Bucket')
+        verbose_name_plural = _('Archive Buckets')
+        ordering = ['-year', '-month']
+        unique_together = ['year', 'month']
+    
+    def __str__(self):
+        return f'{self.year}-{self.month:02d} ({self.count})'
+    
+    @property
+    def date(self):
+        """First day of the bucket's month."""
+        return datetime.date(self.year, self.month, 1)
+    
+    def get_absolute_url(self):
+        return reverse('blog:archive_month', kwargs={'year': self.year, 'month': self.month})
+
+
+class ChunkedUpload(models.Model):
+    """File upload sent in chunks over several requests, resumable until finalized."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads', verbose_name=_('User'))
+    filename = models.CharField(_('Filename'), max_length=255)
+    file_type = models.CharField(_('File Type'), max_length=20)
+    length = models.PositiveBigIntegerField(_('Length'))
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Chunked Upload')
+        verbose_name_plural = _('Chunked Uploads')
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.filename} ({self.user})'
+
+
+class MediaAsset(models.Model):
+    """File in the media library, indexed when it is uploaded."""
+    CATEGORY_CHOICES = [
+        ('images', _('Images')),
+        ('videos', _('Videos')),
+        ('audio', _('Audio')),
+        ('documents', _('Documents')),
+        ('archives', _('Archives')),
+    ]
+    
+    path = models.CharField(_('Path'), max_length=255, unique=True)
+    name = models.CharField(_('Name'), max_length=255)
+    category = models.CharField(_('Category'), max_length=20, choices=CATEGORY_CHOICES)
+    mime_type = models.CharField(_('MIME Type'), max_length=100, blank=True)
+    size = models.PositiveBigIntegerField(_('Size'))
+    width = models.PositiveIntegerField(_('Width'), blank=True, null=True)
+    height = models.PositiveIntegerField(_('Height'), blank=True, null=True)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, db_index=True)
+    uploaded_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True, related_name='media_assets', verbose_name=_('Uploaded By')
+    )
+    created_at = models.DateTimeField(_('Created At'), default=timezone.now)
+    
+    class Meta:
+        verbose_name = _('Media Asset')
+        verbose_name_plural = _('Media Assets')
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['category', '-created_at']),
+            models.Index(fields=['name']),
+            models.Index(fields=['size']),
+        ]
+    
+    def __str__(self):
+        return self.path
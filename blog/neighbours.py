@@ -0,0 +1,53 @@
+"""Stored previous/next links between published posts.
+
+Every published post keeps the ids of the posts just before and after it
+in publishing order (``published_at``, then ``id``), so the post page loads
+its neighbours by primary key instead of searching for them. Scheduled
+posts are linked as well; the post page skips a neighbour that is not live
+yet.
+
+Signals relink a post, and the posts around its old and new position, when
+it is published, unpublished, rescheduled or deleted.
+"""
+
+from django.db.models import Q
+
+
+def _linked():
+    from .models import Post
+    return Post.objects.filter(is_published=True, published_at__isnull=False)
+
+
+def neighbours(post):
+    """Return the ``(previous, next)`` ids of ``post`` in publishing order."""
+    if not post.is_published or post.published_at is None:
+        return None, None
+    linked = _linked().exclude(pk=post.pk)
+    before = Q(published_at__lt=post.published_at) | Q(published_at=post.published_at, pk__lt=post.pk)
+    after = Q(published_at__gt=post.published_at) | Q(published_at=post.published_at, pk__gt=post.pk)
+    previous = linked.filter(before).order_by('-published_at', '-pk').values_list('pk', flat=True).first()
+    following = linked.filter(after).order_by('published_at', 'pk').values_list('pk', flat=True).first()
+    return previous, following
+
+
+def relink(post_ids):
+    """Store the neighbours of the posts ``post_ids``; return how many changed."""
+    from .models import Post
+
+    changed = 0
+    posts = Post.objects.filter(pk__in={pk for pk in post_ids if pk}).only(
+        'pk', 'is_published', 'published_at', 'previous_post', 'next_post'
+    )
+    for post in posts:
+        links = neighbours(post)
+        if links != (post.previous_post_id, post.next_post_id):
+            Post.objects.filter(pk=post.pk).update(previous_post_id=links[0], next_post_id=links[1])
+            changed += 1
+    return changed
+
+
+def relink_around(post, old_links=(None, None)):
+    """Relink ``post`` and the posts around its old and its new position."""
+    links = neighbours(post)
+    relink({post.pk, *old_links, *links})
+    post.previous_post_id, post.next_post_id = links
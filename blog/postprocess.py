@@ -0,0 +1,252 @@
+"""Post-processing of post bodies for lazy media and intrinsic sizes.
+
+``Post.content`` keeps the HTML CKEditor produced. ``render()`` returns the
+copy the post page shows:
+
+- images and iframes get ``loading="lazy"`` (and images
+  ``decoding="async"``), and videos and audio ``preload="none"``;
+- images without a size get the ``width``/``height`` recorded in the media
+  index, so the page does not shift while they load;
+- ``/media/uploads/images/...`` images whose derivatives exist become a
+  ``<picture>`` with the WebP and JPEG srcsets of ``core.images``;
+- YouTube embeds become a thumbnail that loads the player on click.
+
+The body is tokenized once, the media it references are looked up in one
+batch, and the output is cached by content hash and language. A post save
+renders it once the transaction commits and schedules the derivatives of
+the body images; the cached entry keeps those images, so the body is
+rendered again once their derivatives exist.
+"""
+
+import hashlib
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language, gettext as _
+
+from core import images
+
+from .content import media_path
+
+KEY_PREFIX = 'postbody:'
+# Bump when the output changes so cached bodies are rendered again
+VERSION = 1
+
+IMAGE_FOLDER = 'uploads/images/'
+# Formats the derivative encoder can read
+RASTER_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+FALLBACK_FORMAT = 'jpeg'
+DEFAULT_SIZES = '(min-width: 1024px) 768px, 100vw'
+
+MEDIA_TAGS = {'img', 'iframe', 'video', 'audio'}
+YOUTUBE_HOSTS = {'youtube.com', 'www.youtube.com', 'm.youtube.com', 'youtube-nocookie.com', 'www.youtube-nocookie.com'}
+YOUTUBE_EMBED = re.compile(r'^/embed/([\w-]{11})$')
+
+
+def get_body_cache():
+    """Return the cache holding processed post bodies."""
+    return caches[getattr(settings, 'POST_BODY_CACHE', 'default')]
+
+
+class _Tag:
+    """A start tag the processor may rewrite."""
+
+    def __init__(self, name, attrs, closed):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.closed = closed
+
+    def __str__(self):
+        attrs = ''.join(
+            f' {name}' if value is None else f' {name}="{escape(value)}"'
+            for name, value in self.attrs.items()
+        )
+        return f'<{self.name}{attrs}{" /" if self.closed else ""}>'
+
+
+# Marks an ``</iframe>``, which ends a replaced YouTube embed
+_IFRAME_END = object()
+
+
+class _Tokenizer(HTMLParser):
+    """Split HTML into media start tags, ``</iframe>`` markers and raw text."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.tokens = []
+
+    def handle_starttag(self, tag, attrs):
+        self.tokens.append(_Tag(tag, attrs, False) if tag in MEDIA_TAGS else self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        self.tokens.append(_Tag(tag, attrs, True) if tag in MEDIA_TAGS else self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        self.tokens.append(_IFRAME_END if tag == 'iframe' else f'</{tag}>')
+
+    def handle_data(self, data):
+        self.tokens.append(data)
+
+    def handle_entityref(self, name):
+        self.tokens.append(f'&{name};')
+
+    def handle_charref(self, name):
+        self.tokens.append(f'&#{name};')
+
+    def handle_comment(self, data):
+        self.tokens.append(f'<!--{data}-->')
+
+    def handle_decl(self, decl):
+        self.tokens.append(f'<!{decl}>')
+
+    def handle_pi(self, data):
+        self.tokens.append(f'<?{data}>')
+
+    def unknown_decl(self, data):
+        self.tokens.append(f'<![{data}]>')
+
+
+def _srcset(candidates):
+    return ', '.join(f'{url} {width}w' for url, width in candidates)
+
+
+def _is_derivable(path):
+    return bool(path) and path.startswith(IMAGE_FOLDER) and path.lower().endswith(RASTER_EXTENSIONS)
+
+
+def _dimensions(paths):
+    """Return ``{path: (width, height)}`` of the indexed media ``paths``."""
+    from .models import MediaAsset
+
+    if not paths:
+        return {}
+    rows = MediaAsset.objects.filter(path__in=paths, width__isnull=False, height__isnull=False)
+    return {path: (width, height) for path, width, height in rows.values_list('path', 'width', 'height')}
+
+
+def _youtube_id(src):
+    parts = urlsplit(src)
+    if parts.hostname in YOUTUBE_HOSTS:
+        match = YOUTUBE_EMBED.match(parts.path)
+        return match.group(1) if match else None
+    return None
+
+
+def _facade(tag, video_id):
+    parts = urlsplit(tag.attrs['src'])
+    query = urlencode([*((key, value) for key, value in parse_qsl(parts.query) if key != 'autoplay'), ('autoplay', '1')])
+    embed = urlunsplit((parts.scheme or 'https', parts.netloc, parts.path, query, ''))
+    width, height = tag.attrs.get('width') or '', tag.attrs.get('height') or ''
+    if not (width.isdigit() and height.isdigit()):
+        width, height = '560', '315'
+    label = tag.attrs.get('title') or _('Play video')
+    return (
+        f'<div class="video-facade" data-embed-src="{escape(embed)}" style="aspect-ratio: {width} / {height}">'
+        f'<button type="button" class="video-facade-play" aria-label="{escape(label)}">'
+        f'<img src="https://i.ytimg.com/vi/{video_id}/hqdefault.jpg" alt="" loading="lazy" decoding="async" width="480" height="360">'
+        f'</button></div>'
+    )
+
+
+def _image(tag, path, dimensions, derivatives):
+    attrs = tag.attrs
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    if derivatives is not None:
+        size = (derivatives.width, derivatives.height)
+    else:
+        size = dimensions.get(path)
+    if size and not attrs.get('width') and not attrs.get('height'):
+        attrs['width'], attrs['height'] = str(size[0]), str(size[1])
+    if derivatives is None or attrs.get('srcset'):
+        return str(tag)
+
+    srcsets = derivatives.srcsets
+    fallback = srcsets.get(FALLBACK_FORMAT) or next(iter(srcsets.values()))
+    sizes = attrs.get('sizes') or DEFAULT_SIZES
+    attrs.update({'src': fallback[-1][0], 'srcset': _srcset(fallback), 'sizes': sizes})
+    sources = ''.join(
+        f'<source type="image/{format}" srcset="{escape(_srcset(candidates))}" sizes="{escape(sizes)}">'
+        for format, candidates in srcsets.items() if candidates is not fallback
+    )
+    tag.closed = False
+    return f'<picture>{sources}{tag}</picture>'
+
+
+def process(html):
+    """Return ``(processed html, pending image paths)`` of a post body.
+
+    Pending images are library images that have no derivatives yet.
+    """
+    tokenizer = _Tokenizer()
+    tokenizer.feed(str(html or ''))
+    tokenizer.close()
+    tokens = tokenizer.tokens
+
+    image_paths = {
+        media_path(token.attrs.get('src') or '')
+        for token in tokens if isinstance(token, _Tag) and token.name == 'img'
+    } - {None}
+    derivatives = {path: images.lookup(path) for path in image_paths if _is_derivable(path)}
+    dimensions = _dimensions([path for path in image_paths if derivatives.get(path) is None])
+
+    output, in_facade = [], False
+    for token in tokens:
+        if in_facade:
+            in_facade = token is not _IFRAME_END
+            continue
+        if token is _IFRAME_END:
+            output.append('</iframe>')
+        elif not isinstance(token, _Tag):
+            output.append(token)
+        elif token.name == 'img':
+            path = media_path(token.attrs.get('src') or '')
+            output.append(_image(token, path, dimensions, derivatives.get(path)))
+        elif token.name == 'iframe':
+            video_id = _youtube_id(token.attrs.get('src') or '')
+            if video_id:
+                output.append(_facade(token, video_id))
+                # Drop the iframe up to its end tag
+                in_facade = not token.closed
+            else:
+                token.attrs.setdefault('loading', 'lazy')
+                output.append(str(token))
+        else:
+            token.attrs.setdefault('preload', 'none')
+            output.append(str(token))
+    pending = sorted(path for path, found in derivatives.items() if found is None)
+    return ''.join(output), pending
+
+
+def _key(html):
+    digest = hashlib.sha256(str(html).encode('utf-8')).hexdigest()
+    return f'{KEY_PREFIX}{VERSION}:{get_language() or ""}:{digest}'
+
+
+def _entry(html):
+    cache = get_body_cache()
+    key = _key(html)
+    entry = cache.get(key)
+    # Render again once a pending image got its derivatives
+    if entry is None or any(images.lookup(path) is not None for path in entry[1]):
+        entry = process(html)
+        cache.set(key, entry, getattr(settings, 'POST_BODY_CACHE_TIMEOUT', 60 * 60 * 24 * 30))
+    return entry
+
+
+def render(html):
+    """Return the processed post body, from the cache when it is current."""
+    if not html:
+        return mark_safe('')
+    return mark_safe(_entry(html)[0])
+
+
+def prepare(html):
+    """Render a saved body into the cache and schedule the derivatives of its images."""
+    if html:
+        images.schedule_paths(_entry(html)[1])
@@ -0,0 +1,260 @@
+"""Content-similarity engine for related posts.
+
+Every published post is turned into a TF-IDF vector built from its title,
+excerpt, plain-text content, tags and category. Cosine neighbours are
+computed with NumPy in batched matrix products and stored in
+``RelatedPost``, so the detail page reads them with one indexed lookup.
+
+``rebuild_related_posts`` recomputes every row. ``update_related_posts``
+only rewrites the rows whose neighbour lists can be affected by the given
+posts, but still vectorizes the whole corpus, so saves do not call it:
+they mark the post stale with ``mark_stale()``, and the
+``update_related_posts`` command applies every pending update with a
+single corpus load. Marks expire after a day, when the nightly rebuild has
+covered them anyway.
+"""
+
+import math
+from collections import Counter
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Min
+
+from core.search import TERM, normalize_text
+
+TOP_K = 6
+MIN_SCORE = 0.05
+MAX_FEATURES = 20000
+MIN_TERM_LENGTH = 3
+
+TITLE_WEIGHT = 2
+TAG_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+
+PENDING_PREFIX = 'blog:related:pending:'
+PENDING_TIMEOUT = 60 * 60 * 24
+
+STOP_WORDS = frozenset(normalize_text(word) for word in (
+    'and the for with that this from are was were you your have has not but '
+    'all can will into about what when which their there they them then than '
+    'its our out how also more some such only other'
+    ' التي الذي الذين هذا هذه ذلك تلك على الى إلى عن مع كان كانت يكون لقد قد '
+    'لكن ولكن أو ثم كما بين حتى عند كل بعض غير هو هي هم نحن أن إن لم لن'
+).split())
+
+
+def _terms(text):
+    return [
+        term for term in TERM.findall(normalize_text(text).lower())
+        if len(term) >= MIN_TERM_LENGTH and not term.isdigit() and term not in STOP_WORDS
+    ]
+
+
+def post_features(post):
+    """Return a ``Counter`` of the weighted features of a post."""
+    features = Counter(_terms(post.excerpt))
+    features.update(_terms(post.plain_text))
+    for term in _terms(post.title):
+        features[term] += TITLE_WEIGHT
+    for tag in post.tags.all():
+        features[f'tag:{tag.slug}'] += TAG_WEIGHT
+    if post.category_id:
+        features[f'category:{post.category.slug}'] += CATEGORY_WEIGHT
+    return features
+
+
+class Corpus:
+    """L2-normalized TF-IDF matrix of all published posts."""
+
+    def __init__(self, post_ids, matrix):
+        self.post_ids = post_ids
+        self.matrix = matrix
+        self.row = {post_id: index for index, post_id in enumerate(post_ids)}
+
+    @classmethod
+    def load(cls):
+        from .models import Post
+
+        posts = (
+            Post.objects.published()
+            .select_related('category')
+            .prefetch_related('tags')
+            .only('id', 'title', 'excerpt', 'plain_text', 'category__slug')
+            .order_by('id')
+        )
+        post_ids = []
+        documents = []
+        for post in posts:
+            post_ids.append(post.pk)
+            documents.append(post_features(post))
+        return cls(post_ids, cls.vectorize(documents))
+
+    @staticmethod
+    def vectorize(documents):
+        """Build the TF-IDF matrix for a list of feature counters.
+
+        Features that occur in a single document cannot make two posts
+        similar, so they only contribute to the row norms and are left out
+        of the matrix to keep it small.
+        """
+        document_frequency = Counter()
+        for features in documents:
+            document_frequency.update(features.keys())
+        shared = [feature for feature, df in document_frequency.items() if df > 1]
+        shared.sort(key=lambda feature: (-document_frequency[feature], feature))
+        columns = {feature: index for index, feature in enumerate(shared[:MAX_FEATURES])}
+
+        total = len(documents)
+        matrix = np.zeros((total, len(columns)), dtype=np.float32)
+        norms = np.zeros(total, dtype=np.float32)
+        for row, features in enumerate(documents):
+            for feature, count in features.items():
+                idf = math.log((1 + total) / (1 + document_frequency[feature])) + 1
+                weight = (1 + math.log(count)) * idf
+                norms[row] += weight * weight
+                column = columns.get(feature)
+                if column is not None:
+                    matrix[row, column] = weight
+        norms = np.sqrt(norms)
+        norms[norms == 0] = 1
+        return matrix / norms[:, None]
+
+    def similarities(self, rows):
+        """Return cosine similarities of ``rows`` against the whole corpus."""
+        scores = self.matrix[rows] @ self.matrix.T
+        scores[np.arange(len(rows)), rows] = -1  # A post is not its own neighbour
+        return scores
+
+    def neighbours(self, rows, top_k=TOP_K):
+        """Yield ``(post_id, [(related_id, score), ...])`` for the given rows."""
+        if not len(rows) or not len(self.post_ids):
+            return
+        scores = self.similarities(rows)
+        k = min(top_k, scores.shape[1] - 1)
+        if k <= 0:
+            for row in rows:
+                yield self.post_ids[row], []
+            return
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for index, row in enumerate(rows):
+            columns = top[index][np.argsort(-scores[index, top[index]])]
+            yield self.post_ids[row], [
+                (self.post_ids[column], float(scores[index, column]))
+                for column in columns if scores[index, column] >= MIN_SCORE
+            ]
+
+
+def _write(corpus, rows, top_k, batch_size):
+    from .models import RelatedPost
+
+    written = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        entries = [
+            RelatedPost(post_id=post_id, related_id=related_id, score=score)
+            for post_id, neighbours in corpus.neighbours(batch, top_k)
+            for related_id, score in neighbours
+        ]
+        with transaction.atomic():
+            RelatedPost.objects.filter(post_id__in=[corpus.post_ids[row] for row in batch]).delete()
+            RelatedPost.objects.bulk_create(entries)
+        written += len(entries)
+    return written
+
+
+def rebuild_related_posts(top_k=TOP_K, batch_size=256):
+    """Recompute related posts for every published post.
+
+    Returns the number of ``RelatedPost`` rows written.
+    """
+    from .models import RelatedPost
+
+    corpus = Corpus.load()
+    RelatedPost.objects.exclude(post_id__in=corpus.post_ids).delete()
+    RelatedPost.objects.exclude(related_id__in=corpus.post_ids).delete()
+    return _write(corpus, list(range(len(corpus.post_ids))), top_k, batch_size)
+
+
+def update_related_posts(post_ids, top_k=TOP_K, batch_size=256):
+    """Refresh related posts after the given posts were saved or removed.
+
+    Only the rows that can change are recomputed: the posts themselves,
+    posts that currently list one of them, and posts for which one of them
+    is now a better match than their weakest stored neighbour.
+    """
+    from .models import RelatedPost
+
+    post_ids = set(post_ids)
+    corpus = Corpus.load()
+    changed = [corpus.row[post_id] for post_id in post_ids if post_id in corpus.row]
+    removed = post_ids.difference(corpus.row)
+
+    affected = set(changed)
+    affected.update(
+        corpus.row[post_id]
+        for post_id in RelatedPost.objects.filter(related_id__in=post_ids).values_list('post_id', flat=True)
+        if post_id in corpus.row
+    )
+    if removed:
+        RelatedPost.objects.filter(post_id__in=removed).delete()
+
+    if changed:
+        weakest = {
+            entry['post_id']: (entry['weakest'], entry['total'])
+            for entry in RelatedPost.objects.values('post_id').annotate(
+                weakest=Min('score'), total=Count('id')
+            )
+        }
+        # Similarity is symmetric, so one product gives every post's score
+        # against the changed ones
+        scores = corpus.similarities(changed).max(axis=0)
+        for row, score in enumerate(scores):
+            if score < MIN_SCORE:
+                continue
+            floor, total = weakest.get(corpus.post_ids[row], (0, 0))
+            if total < top_k or score > floor:
+                affected.add(row)
+
+    return _write(corpus, sorted(affected), top_k, batch_size)
+
+
+def get_pending_cache():
+    """Return the cache holding the posts waiting for a related posts update."""
+    return caches[getattr(settings, 'BLOG_RELATED_PENDING_CACHE', 'default')]
+
+
+def _pending_key(post_id):
+    return f'{PENDING_PREFIX}{post_id}'
+
+
+def mark_stale(post_ids):
+    """Queue the given posts for the next ``update_pending_related_posts()``."""
+    get_pending_cache().set_many({_pending_key(post_id): 1 for post_id in post_ids}, timeout=PENDING_TIMEOUT)
+
+
+def update_pending_related_posts(top_k=TOP_K, batch_size=256):
+    """Apply the queued updates with one ``update_related_posts()`` call.
+
+    Marks are removed before the update runs, so posts saved meanwhile are
+    picked up by the next run. Returns ``(posts, rows written)``.
+    """
+    from .models import Post
+
+    cache = get_pending_cache()
+    post_ids = Post.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+    pending = []
+    while True:
+        batch = list(islice(post_ids, batch_size))
+        if not batch:
+            break
+        found = cache.get_many([_pending_key(post_id) for post_id in batch])
+        if found:
+            cache.delete_many(list(found))
+            pending.extend(post_id for post_id in batch if _pending_key(post_id) in found)
+    if not pending:
+        return 0, 0
+    return len(pending), update_related_posts(pending, top_k=top_k, batch_size=batch_size)
@@ -0,0 +1,121 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from taggit.models import Tag, TaggedItem
+
+from core import prerender
+
+from . import postprocess
+from .archive import adjust_buckets, bucket_key
+from .models import Category, Post, RelatedPost
+from .neighbours import relink, relink_around
+from .related import mark_stale
+
+
+def schedule_related_update(post_ids):
+    """Queue related posts updates once the current transaction commits."""
+    transaction.on_commit(partial(mark_stale, list(post_ids)))
+
+
+@receiver(post_save, sender=Post)
+def update_related_on_save(sender, instance, raw=False, **kwargs):
+    """Refresh the related posts affected by a saved post."""
+    if not raw:
+        schedule_related_update([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def prepare_post_body(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Render the saved body and schedule its image derivatives once the post commits."""
+    if not raw and (update_fields is None or 'content' in update_fields):
+        transaction.on_commit(partial(postprocess.prepare, instance.content))
+
+
+@receiver(m2m_changed, sender=TaggedItem)
+def update_related_on_tags(sender, instance, action, **kwargs):
+    """Refresh related posts when the tags of a post change."""
+    if isinstance(instance, Post) and action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_related_update([instance.pk])
+
+
+@receiver(pre_delete, sender=Post)
+def remember_related_referrers(sender, instance, **kwargs):
+    """Remember which posts list a post before the cascade removes the rows."""
+    instance._related_referrers = list(
+        RelatedPost.objects.filter(related=instance).values_list('post_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def update_related_on_delete(sender, instance, **kwargs):
+    """Refill the neighbour lists that pointed at a deleted post."""
+    referrers = getattr(instance, '_related_referrers', [])
+    if referrers:
+        schedule_related_update(referrers)
+
+
+@receiver(pre_save, sender=Post)
+def remember_publish_state(sender, instance, **kwargs):
+    """Remember the archive month and the neighbours a post had before saving."""
+    previous = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list(
+            'is_published', 'published_at', 'previous_post_id', 'next_post_id'
+        ).first()
+    instance._archive_bucket = bucket_key(*previous[:2]) if previous else None
+    instance._publish_state = previous[:2] if previous else None
+    instance._neighbour_links = previous[2:] if previous else (None, None)
+
+
+@receiver(post_save, sender=Post)
+def update_archive_on_save(sender, instance, **kwargs):
+    """Move a post between archive months when it is (un)published or rescheduled."""
+    adjust_buckets(
+        getattr(instance, '_archive_bucket', None),
+        bucket_key(instance.is_published, instance.published_at),
+    )
+    instance._archive_bucket = bucket_key(instance.is_published, instance.published_at)
+
+
+@receiver(post_delete, sender=Post)
+def update_archive_on_delete(sender, instance, **kwargs):
+    """Remove a deleted post from its archive month."""
+    adjust_buckets(bucket_key(instance.is_published, instance.published_at), None)
+
+
+@receiver(post_save, sender=Post)
+def update_neighbours_on_save(sender, instance, created=False, raw=False, **kwargs):
+    """Relink the posts around a post that was published, unpublished or rescheduled."""
+    state = (instance.is_published, instance.published_at)
+    if raw or (not created and getattr(instance, '_publish_state', None) == state):
+        return
+    relink_around(instance, getattr(instance, '_neighbour_links', (None, None)))
+    instance._publish_state = state
+    instance._neighbour_links = (instance.previous_post_id, instance.next_post_id)
+
+
+@receiver(post_delete, sender=Post)
+def update_neighbours_on_delete(sender, instance, **kwargs):
+    """Link the posts on either side of a deleted post to each other."""
+    relink([instance.previous_post_id, instance.next_post_id])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def regenerate_feeds(sender, raw=False, **kwargs):
+    """Render the feeds again after posts, categories or tags change."""
+    if not raw:
+        prerender.invalidate('feeds')
+
+
+@receiver(m2m_changed, sender=TaggedItem)
+def regenerate_feeds_on_tags(sender, instance, action, **kwargs):
+    """Render the feeds again when the tags of a post change."""
+    if isinstance(instance, Post) and action in ('post_add', 'post_remove', 'post_clear'):
+        prerender.invalidate('feeds')
@@ -1,10 +1,14 @@
-from django.contrib.sitemaps import Sitemap
+from functools import cached_property
+
+from django.db.models import Max, Q
 from django.urls import reverse
+from django.utils import timezone
+from core.sitemaps import I18nSitemap
 from .models import Post, Category
-from taggit.models import Tag
+from core.counters import tags_with_counts
 
 
-class PostSitemap(Sitemap):
+class PostSitemap(I18nSitemap):
     """Sitemap for blog posts."""
     
     changefreq = 'weekly'
@@ -12,38 +16,46 @@ class PostSitemap(Sitemap):
     
     def items(self):
         """Return all published posts."""
-        return Post.published.all()
+        return Post.objects.published().only('slug', 'updated_at').order_by('-published_at', '-id')
     
     def lastmod(self, obj):
         """Return last modification date."""
         return obj.updated_at
     
+    def get_latest_lastmod(self):
+        return Post.objects.published().aggregate(latest=Max('updated_at'))['latest']
+    
     def location(self, obj):
         """Return post URL."""
         return reverse('blog:post_detail', args=[obj.slug])
 
 
-class CategorySitemap(Sitemap):
+class CategorySitemap(I18nSitemap):
     """Sitemap for blog categories."""
     
     changefreq = 'monthly'
     priority = 0.6
     
     def items(self):
-        """Return all categories that have published posts."""
-        return Category.objects.filter(posts__is_published=True).distinct()
+        """Return all categories that have published posts, with their latest post update."""
+        published = Q(posts__is_published=True, posts__published_at__lte=timezone.now())
+        return Category.objects.filter(published_post_count__gt=0).annotate(
+            latest_post_update=Max('posts__updated_at', filter=published)
+        )
     
     def lastmod(self, obj):
         """Return last modification date based on latest post in category."""
-        latest_post = obj.posts.filter(is_published=True).order_by('-updated_at').first()
-        return latest_post.updated_at if latest_post else obj.created_at
+        return obj.latest_post_update or obj.created_at
+    
+    def get_latest_lastmod(self):
+        return Post.objects.published().filter(category__isnull=False).aggregate(latest=Max('updated_at'))['latest']
     
     def location(self, obj):
         """Return category URL."""
         return reverse('blog:category_posts', args=[obj.slug])
 
 
-class TagSitemap(Sitemap):
+class TagSitemap(I18nSitemap):
     """Sitemap for blog tags."""
     
     changefreq = 'monthly'
@@ -51,22 +63,29 @@ class TagSitemap(Sitemap):
     
     def items(self):
         """Return all tags that have published posts."""
-        return Tag.objects.filter(
-            taggit_taggeditem_items__content_type__model='post',
-            taggit_taggeditem_items__object_id__in=Post.published.values_list('id', flat=True)
-        ).distinct()
+        return tags_with_counts(Post).order_by('name')
+    
+    @cached_property
+    def latest_post_updates(self):
+        """Return ``{tag id: latest update of its published posts}`` from one grouped query."""
+        return dict(
+            Post.objects.published().filter(tags__isnull=False)
+            .values_list('tags').annotate(latest=Max('updated_at')).order_by()
+        )
     
     def lastmod(self, obj):
         """Return last modification date based on latest post with this tag."""
-        latest_post = Post.published.filter(tags__in=[obj]).order_by('-updated_at').first()
-        return latest_post.updated_at if latest_post else None
+        return self.latest_post_updates.get(obj.pk)
+    
+    def get_latest_lastmod(self):
+        return Post.objects.published().filter(tags__isnull=False).aggregate(latest=Max('updated_at'))['latest']
     
     def location(self, obj):
         """Return tag URL."""
         return reverse('blog:tag_posts', args=[obj.slug])
 
 
-class BlogStaticSitemap(Sitemap):
+class BlogStaticSitemap(I18nSitemap):
     """Sitemap for static blog pages."""
     
     changefreq = 'monthly'
@@ -78,4 +97,4 @@ class BlogStaticSitemap(Sitemap):
     
     def location(self, item):
         """Return URL for static pages."""
-        return reverse(item)
\ No newline at end of file
+        return reverse(item)
@@ -1,13 +1,12 @@
 """Custom template tags for the blog app."""
 
 from django import template
-from django.utils.safestring import mark_safe
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.translation import gettext as _
-import re
-import markdown
-from markdown.extensions import codehilite, toc
+from core.rendering import render as render_markdown
+from blog import cards
+from blog.content import analyze
 
 register = template.Library()
 
@@ -15,29 +14,13 @@ register = template.Library()
 @register.filter
 def markdown_to_html(text):
     """Convert markdown text to HTML."""
-    if not text:
-        return ''
-    
-    md = markdown.Markdown(
-        extensions=[
-            'markdown.extensions.codehilite',
-            'markdown.extensions.toc',
-            'markdown.extensions.fenced_code',
-            'markdown.extensions.tables',
-            'markdown.extensions.nl2br',
-        ],
-        extension_configs={
-            'markdown.extensions.codehilite': {
-                'css_class': 'highlight',
-                'use_pygments': True,
-            },
-            'markdown.extensions.toc': {
-                'permalink': True,
-            },
-        }
-    )
-    
-    return mark_safe(md.convert(text))
+    return render_markdown(text).html
+
+
+@register.filter
+def markdown_toc(text):
+    """Return the table of contents of markdown text."""
+    return render_markdown(text).toc
 
 
 @register.filter
@@ -46,14 +29,8 @@ def reading_time(content):
     if not content:
         return 0
     
-    # Remove HTML tags and count words
-    text = re.sub(r'<[^>]+>', '', str(content))
-    word_count = len(text.split())
-    
-    # Average reading speed is 200-250 words per minute
-    # We'll use 200 for a conservative estimate
-    minutes = max(1, round(word_count / 200))
-    return minutes
+    # Same estimate as the one stored in Post.reading_time
+    return analyze(content).reading_time
 
 
 @register.filter
@@ -78,23 +55,10 @@ def truncate_chars_html(value, length):
 
 @register.simple_tag
 def get_related_posts(post, limit=3):
-    """Get related posts based on tags and category."""
+    """Get related posts from the precomputed similarity table."""
     if not post:
         return []
-    
-    from blog.models import Post
-    
-    # Get posts with same tags or category
-    related = Post.objects.published().exclude(id=post.id)
-    
-    if post.category:
-        related = related.filter(category=post.category)
-    
-    if post.tags.exists():
-        tag_ids = post.tags.values_list('id', flat=True)
-        related = related.filter(tags__in=tag_ids).distinct()
-    
-    return related.select_related('author', 'category')[:limit]
+    return post.get_related_posts(limit)
 
 
 @register.simple_tag
@@ -121,16 +85,24 @@ def get_featured_posts(limit=3):
     return Post.objects.published().filter(is_featured=True).order_by('-created_at')[:limit]
 
 
-@register.inclusion_tag('blog/partials/post_card.html')
-def render_post_card(post, show_excerpt=True, show_author=True):
-    """Render a post card component."""
+@register.inclusion_tag('blog/partials/post_card.html', takes_context=True)
+def render_post_card(context, post, show_excerpt=True, show_author=True, position=0):
+    """Render a post card component for a post of ``blog.cards.post_cards()``."""
     return {
         'post': post,
         'show_excerpt': show_excerpt,
         'show_author': show_author,
+        'position': position,
+        'request': context.get('request'),
     }
 
 
+@register.filter
+def avatar_url(name):
+    """Return the URL of a stored avatar name, or the default avatar."""
+    return cards.avatar_url(name)
+
+
 @register.simple_tag
 def post_url(post):
     """Get the absolute URL for a post."""
@@ -178,15 +150,9 @@ def build_absolute_uri(path, request):
 @register.simple_tag
 def get_archive_months():
     """Get months with published posts for archive."""
-    from blog.models import Post
-    from django.db.models import Count
-    from django.utils import timezone
+    from blog.archive import archive_months
     
-    return (Post.objects.published()
-            .extra({'month': "date_trunc('month', created_at)"})
-            .values('month')
-            .annotate(count=Count('id'))
-            .order_by('-month')[:12])
+    return archive_months(12)
 
 
 @register.filter
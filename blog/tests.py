@@ -1,11 +1,38 @@
-from django.test import TestCase, Client
+import base64
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+from io import BytesIO, StringIO
+
+from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from .models import Post, Category, Comment
+from django.core.management.base import CommandError
+from .models import ArchiveBucket, ChunkedUpload, MediaAsset, Post, Category, Comment, RelatedPost
+from .chunked_uploads import delete_expired, partial_path
+from .cards import avatar_url, post_cards
+from .content import ANALYSIS_VERSION, analyze
+from .postprocess import render as render_body
+from .media_library import reconcile
 from .forms import CommentForm, SearchForm
+from .archive import check_buckets, month_range
+from .counters import flush_views, pending_views, record_view
+from .related import Corpus, rebuild_related_posts, update_pending_related_posts
+from .templatetags.blog_extras import get_archive_months
 from taggit.models import Tag
+from PIL import Image
 
 
 class CategoryModelTest(TestCase):
@@ -112,14 +139,16 @@ class PostModelTest(TestCase):
     def test_post_get_related_posts(self):
         """Test related posts functionality."""
         # Create another post in same category
-        related_post = Post.objects.create(
-            title='Related Post',
-            slug='related-post',
-            content='Related content',
-            author=self.user,
-            category=self.category,
-            is_published=True
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            related_post = Post.objects.create(
+                title='Related Post',
+                slug='related-post',
+                content='Related content',
+                author=self.user,
+                category=self.category,
+                is_published=True
+            )
+        update_pending_related_posts()
         
         related_posts = self.post.get_related_posts()
         self.assertIn(related_post, related_posts)
@@ -274,6 +303,7 @@ class BlogViewsTest(TestCase):
     """Test cases for blog views."""
     
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(
             username='testuser',
@@ -313,7 +343,13 @@ class BlogViewsTest(TestCase):
         initial_views = self.post.views_count
         self.client.get(reverse('blog:post_detail', args=[self.post.slug]))
         self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, initial_views)
+        self.assertEqual(self.post.total_views, initial_views + 1)
+        
+        flush_views()
+        self.post.refresh_from_db()
         self.assertEqual(self.post.views_count, initial_views + 1)
+        self.assertEqual(self.post.total_views, initial_views + 1)
     
     def test_category_posts_view(self):
         """Test category posts view."""
@@ -373,10 +409,246 @@ class BlogViewsTest(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class ViewCounterTest(TestCase):
+    """Test cases for buffered view counters."""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.post = Post.objects.create(
+            title='Test Post',
+            slug='test-post',
+            content='Test content',
+            author=self.user,
+            is_published=True,
+            published_at=timezone.now()
+        )
+    
+    def test_record_view_is_buffered(self):
+        """Test that recorded views stay in the cache until flushed."""
+        record_view(self.post.pk)
+        record_view(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 0)
+        self.assertEqual(pending_views(self.post.pk), 2)
+        self.assertEqual(self.post.get_views_count(include_pending=False), 0)
+        self.assertEqual(self.post.get_views_count(), 2)
+    
+    def test_flush_applies_deltas_in_one_update(self):
+        """Test that flushing writes all pending views with a single UPDATE."""
+        other = Post.objects.create(
+            title='Other Post',
+            slug='other-post',
+            content='Other content',
+            author=self.user,
+            is_published=True,
+            published_at=timezone.now()
+        )
+        for _ in range(3):
+            record_view(self.post.pk)
+        record_view(other.pk)
+        
+        with CaptureQueriesContext(connection) as queries:
+            flushed = flush_views()
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        
+        self.assertEqual(flushed, 4)
+        self.post.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.post.views_count, 3)
+        self.assertEqual(other.views_count, 1)
+        self.assertEqual(pending_views(self.post.pk), 0)
+        self.assertEqual(flush_views(), 0)
+    
+    def test_flush_command(self):
+        """Test the flush_view_counts management command."""
+        record_view(self.post.pk)
+        call_command('flush_view_counts', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 1)
+
+
+class RelatedPostsTest(TestCase):
+    """Test cases for the precomputed related posts."""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.django = Category.objects.create(name='Django', slug='django')
+        self.cooking = Category.objects.create(name='Cooking', slug='cooking')
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.orm = self.create_post('Django ORM tips', 'Querysets, indexes and select_related', self.django, ['django', 'orm'])
+            self.cache = self.create_post('Django caching', 'Caching querysets with Redis and indexes', self.django, ['django', 'redis'])
+            self.bread = self.create_post('Baking bread', 'Flour, water, salt and patience', self.cooking, ['bread'])
+        update_pending_related_posts()
+    
+    def create_post(self, title, content, category, tags):
+        post = Post.objects.create(
+            title=title,
+            slug=title.lower().replace(' ', '-'),
+            content=content,
+            excerpt=content,
+            author=self.user,
+            category=category,
+            is_published=True,
+            published_at=timezone.now()
+        )
+        post.tags.add(*tags)
+        return post
+    
+    def test_related_posts_are_ranked_by_similarity(self):
+        """Test that similar posts are stored and unrelated ones are not."""
+        self.assertEqual(list(self.orm.get_related_posts()), [self.cache])
+        self.assertEqual(list(self.bread.get_related_posts()), [])
+    
+    def test_related_posts_single_query(self):
+        """Test that reading related posts costs one query."""
+        with self.assertNumQueries(1):
+            list(self.orm.get_related_posts())
+    
+    def test_save_updates_affected_rows(self):
+        """Test that editing a post refreshes the lists that mention it."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bread.category = self.django
+            self.bread.content = 'Django querysets, indexes and caching'
+            self.bread.save()
+            self.bread.tags.add('django')
+        update_pending_related_posts()
+        self.assertIn(self.bread, self.orm.get_related_posts())
+        self.assertIn(self.orm, self.bread.get_related_posts())
+    
+    def test_unpublish_and_delete_remove_entries(self):
+        """Test that hidden and deleted posts drop out of related lists."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cache.is_published = False
+            self.cache.save()
+        self.assertEqual(list(self.orm.get_related_posts()), [])
+        update_pending_related_posts()
+        self.assertFalse(RelatedPost.objects.filter(post=self.cache).exists())
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.orm.delete()
+        update_pending_related_posts()
+        self.assertFalse(RelatedPost.objects.exists())
+    
+    def test_saves_are_applied_by_the_update_command(self):
+        """Test that saving only queues the post and the command applies it once."""
+        with mock.patch.object(Corpus, 'load', wraps=Corpus.load) as load:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.bread.content = 'Django querysets, indexes and caching'
+                self.bread.save()
+                self.bread.tags.add('django')
+            load.assert_not_called()
+            self.assertNotIn(self.orm, self.bread.get_related_posts())
+            
+            out = StringIO()
+            call_command('update_related_posts', stdout=out)
+            load.assert_called_once()
+        self.assertIn('Updated 1 changed posts', out.getvalue())
+        self.assertIn(self.orm, self.bread.get_related_posts())
+        self.assertEqual(update_pending_related_posts(), (0, 0))
+    
+    def test_rebuild_command(self):
+        """Test the rebuild_related_posts management command."""
+        RelatedPost.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_related_posts', stdout=out)
+        self.assertIn('Stored 2 related post entries', out.getvalue())
+        self.assertEqual(rebuild_related_posts(top_k=1), 2)
+        self.assertEqual(list(self.cache.get_related_posts()), [self.orm])
+
+
+class ArchiveBucketTest(TestCase):
+    """Test cases for the monthly archive index."""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.march = timezone.make_aware(timezone.datetime(2024, 3, 15, 12))
+        self.april = timezone.make_aware(timezone.datetime(2024, 4, 1, 0, 30))
+        self.post = self.create_post('march-post', self.march)
+    
+    def create_post(self, slug, published_at, is_published=True):
+        return Post.objects.create(
+            title=slug,
+            slug=slug,
+            content='Content',
+            author=self.user,
+            is_published=is_published,
+            published_at=published_at
+        )
+    
+    def buckets(self):
+        return {(b.year, b.month): b.count for b in ArchiveBucket.objects.all()}
+    
+    def test_publish_reschedule_unpublish_delete(self):
+        """Test that buckets follow the lifecycle of a post."""
+        self.create_post('march-draft', self.march, is_published=False)
+        self.assertEqual(self.buckets(), {(2024, 3): 1})
+        
+        self.post.published_at = self.april
+        self.post.save()
+        self.assertEqual(self.buckets(), {(2024, 4): 1})
+        
+        self.post.is_published = False
+        self.post.save()
+        self.assertEqual(self.buckets(), {})
+        
+        self.post.is_published = True
+        self.post.save()
+        self.create_post('april-post', self.april)
+        self.assertEqual(self.buckets(), {(2024, 4): 2})
+        
+        self.post.delete()
+        self.assertEqual(self.buckets(), {(2024, 4): 1})
+        self.assertEqual(check_buckets(), {})
+    
+    def test_month_range_matches_month_lookup(self):
+        """Test that range filtering matches the __month lookup at the edges."""
+        start, end = month_range(2024, 4)
+        in_range = Post.objects.filter(published_at__gte=start, published_at__lt=end)
+        by_lookup = Post.objects.filter(published_at__year=2024, published_at__month=4)
+        self.create_post('april-post', self.april)
+        self.assertEqual(list(in_range), list(by_lookup))
+        self.assertEqual(in_range.count(), 1)
+        self.assertEqual(month_range(2024, 12)[1], timezone.make_aware(timezone.datetime(2025, 1, 1)))
+    
+    def test_archive_months_tag(self):
+        """Test the archive widget reads the buckets."""
+        self.create_post('future-post', timezone.now() + timezone.timedelta(days=400))
+        months = list(get_archive_months())
+        self.assertEqual([(b.year, b.month, b.count) for b in months], [(2024, 3, 1)])
+        self.assertEqual(months[0].get_absolute_url(), reverse('blog:archive_month', args=[2024, 3]))
+    
+    def test_rebuild_command(self):
+        """Test the consistency check and rebuild command."""
+        ArchiveBucket.objects.update(count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_archive_buckets', '--check', stdout=StringIO())
+        out = StringIO()
+        call_command('rebuild_archive_buckets', stdout=out)
+        self.assertIn('2024-03: stored 5, expected 1', out.getvalue())
+        self.assertEqual(self.buckets(), {(2024, 3): 1})
+        call_command('rebuild_archive_buckets', '--check', stdout=StringIO())
+
+
 class BlogFeedsTest(TestCase):
     """Test cases for blog feeds."""
     
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
@@ -397,6 +669,67 @@ class BlogFeedsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/rss+xml; charset=utf-8')
         self.assertContains(response, self.post.title)
+    
+    def test_atom_and_json_feeds(self):
+        """Test Atom and JSON Feed output."""
+        response = self.client.get(reverse('blog:atom_feed'))
+        self.assertEqual(response['Content-Type'], 'application/atom+xml; charset=utf-8')
+        self.assertContains(response, self.post.title)
+        
+        response = self.client.get(reverse('blog:json_feed'))
+        self.assertEqual(response['Content-Type'], 'application/feed+json; charset=utf-8')
+        data = json.loads(response.content)
+        self.assertEqual(data['version'], 'https://jsonfeed.org/version/1.1')
+        self.assertEqual([item['title'] for item in data['items']], ['Test Post'])
+        self.assertEqual(data['items'][0]['content_text'], 'Test content')
+    
+    def test_category_and_tag_feeds(self):
+        """Test per-category and per-tag feeds."""
+        category = Category.objects.create(name='Django', slug='django')
+        Post.objects.create(
+            title='Other Post', slug='other-post', content='Other', author=self.user,
+            is_published=True, published_at=timezone.now(),
+        )
+        self.post.category = category
+        self.post.save()
+        self.post.tags.add('orm')
+        
+        for name, slug in (('blog:category_rss_feed', 'django'), ('blog:tag_json_feed', 'orm')):
+            response = self.client.get(reverse(name, args=[slug]))
+            self.assertContains(response, 'Test Post')
+            self.assertNotContains(response, 'Other Post')
+        self.assertEqual(self.client.get(reverse('blog:category_atom_feed', args=['missing'])).status_code, 404)
+    
+    def test_conditional_get_without_queries(self):
+        """Readers presenting the ETag get a 304 without touching the DB."""
+        url = reverse('blog:rss_feed')
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+    
+    def test_gzip(self):
+        """Gzip-accepting readers get the precompressed bytes."""
+        url = reverse('blog:rss_feed')
+        plain = self.client.get(url)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+    
+    def test_regenerated_after_update(self):
+        """Updating a post renders the feed again."""
+        url = reverse('blog:rss_feed')
+        etag = self.client.get(url)['ETag']
+        self.post.title = 'Updated Title'
+        self.post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Updated Title')
 
 
 class BlogSitemapsTest(TestCase):
@@ -432,4 +765,575 @@ class BlogSitemapsTest(TestCase):
         """Test that sitemap contains categories with posts."""
         from .sitemaps import CategorySitemap
         sitemap = CategorySitemap()
-        self.assertIn(self.category, sitemap.items())
\ No newline at end of file
+        self.assertIn(self.category, sitemap.items())
+    
+    def test_sitemap_index_lists_sections(self):
+        """Test that the sitemap index links every section."""
+        response = self.client.get('/sitemap.xml')
+        self.assertEqual(response.status_code, 200)
+        for section in ('static', 'posts', 'categories', 'tags', 'projects', 'books', 'book-categories'):
+            self.assertContains(response, f'/sitemap-{section}.xml')
+    
+    def test_section_has_language_alternates(self):
+        """Test that section sitemaps list each language with hreflang alternates."""
+        response = self.client.get('/sitemap-posts.xml')
+        self.assertContains(response, '/ar/blog/post/test-post/')
+        self.assertContains(response, '/en/blog/post/test-post/')
+        self.assertContains(response, 'hreflang="en"')
+        self.assertContains(response, 'hreflang="x-default"')
+        self.assertEqual(self.client.get('/sitemap-missing.xml').status_code, 404)
+    
+    def test_pages_are_sliced_per_language(self):
+        """Test that pagination counts one URL per item and language."""
+        from .sitemaps import PostSitemap
+        sitemap = PostSitemap()
+        sitemap.limit = 1
+        self.assertEqual(sitemap.paginator.num_pages, 2)
+        self.assertEqual(list(sitemap.paginator.page(2).object_list), [(self.post, 'en')])
+    
+    def test_tag_lastmod_uses_one_query(self):
+        """Test that tag lastmods come from a single grouped query."""
+        from django.contrib.sites.models import Site
+        from .sitemaps import TagSitemap
+        for index in range(3):
+            post = Post.objects.create(
+                title=f'Tagged {index}', slug=f'tagged-{index}', content='Content', author=self.user,
+                is_published=True, published_at=timezone.now(),
+            )
+            post.tags.add(f'tag-{index}', 'shared')
+        site = Site(domain='example.com')
+        # Count, page of tags and the grouped lastmod query
+        with self.assertNumQueries(3):
+            urls = TagSitemap().get_urls(site=site, protocol='https')
+        self.assertEqual(len(urls), 8)
+        self.assertTrue(all(url['lastmod'] for url in urls))
+    
+    def test_prerendered_until_content_changes(self):
+        """Test that section files are served with ETags until a post changes."""
+        cache.clear()
+        response = self.client.get('/sitemap-posts.xml', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/sitemap-posts.xml', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        
+        Post.objects.create(
+            title='Another', slug='another', content='Content', author=self.user,
+            is_published=True, published_at=timezone.now(),
+        )
+        response = self.client.get('/sitemap-posts.xml', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/blog/post/another/')
+
+
+class ChunkedUploadTest(TestCase):
+    """Test the resumable chunked upload endpoints."""
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CHUNKED_UPLOAD_DIR=os.path.join(self.media_root, '.uploads'),
+            CHUNKED_UPLOAD_MAX_CHUNK_SIZE=1024,
+        )
+        self.override.enable()
+        self.user = User.objects.create_user(username='uploader', password='pass')
+        self.client.login(username='uploader', password='pass')
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def checksum(self, data):
+        return 'sha256 ' + base64.b64encode(hashlib.sha256(data).digest()).decode()
+    
+    def create(self, filename, length):
+        metadata = 'filename ' + base64.b64encode(filename.encode()).decode()
+        return self.client.post(
+            reverse('blog:create_chunked_upload'), HTTP_UPLOAD_LENGTH=str(length), HTTP_UPLOAD_METADATA=metadata,
+        )
+    
+    def patch(self, location, offset, chunk, **headers):
+        return self.client.generic(
+            'PATCH', location, chunk, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset), **headers,
+        )
+    
+    def finalize(self, upload_id, data):
+        return self.client.post(
+            reverse('blog:finalize_chunked_upload', args=[upload_id]), HTTP_UPLOAD_CHECKSUM=self.checksum(data),
+        )
+    
+    def test_resumable_upload(self):
+        """Chunks are appended at the reported offset and the file is stored on finalize."""
+        data = os.urandom(2500)
+        response = self.create('notes.pdf', len(data))
+        self.assertEqual(response.status_code, 201)
+        location = response['Location']
+        upload_id = response.json()['id']
+        
+        self.assertEqual(self.patch(location, 0, data[:1000])['Upload-Offset'], '1000')
+        # A resent chunk at a stale offset is refused
+        self.assertEqual(self.patch(location, 0, data[:1000]).status_code, 409)
+        # Resume after a dropped connection: ask for the offset first
+        offset = int(self.client.head(location)['Upload-Offset'])
+        self.assertEqual(offset, 1000)
+        self.patch(location, offset, data[offset:2000])
+        self.patch(location, 2000, data[2000:])
+        
+        response = self.finalize(upload_id, data)
+        self.assertEqual(response.status_code, 200)
+        path = response.json()['url'].replace('/media/', '', 1)
+        with default_storage.open(path) as stored:
+            self.assertEqual(stored.read(), data)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertFalse(os.listdir(os.path.join(self.media_root, '.uploads')))
+    
+    def test_checksums_are_verified(self):
+        """A corrupted chunk is discarded and a wrong final checksum is refused."""
+        data = os.urandom(1500)
+        response = self.create('archive.zip', len(data))
+        location, upload_id = response['Location'], response.json()['id']
+        
+        response = self.patch(location, 0, data[:1000], HTTP_UPLOAD_CHECKSUM=self.checksum(b'other'))
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(response['Upload-Offset'], '0')
+        self.patch(location, 0, data[:1000], HTTP_UPLOAD_CHECKSUM=self.checksum(data[:1000]))
+        self.assertEqual(self.finalize(upload_id, data).status_code, 409)
+        
+        self.patch(location, 1000, data[1000:])
+        self.assertEqual(self.finalize(upload_id, b'other').status_code, 460)
+        self.assertEqual(self.finalize(upload_id, data).status_code, 200)
+    
+    def test_limits_are_checked_before_receiving(self):
+        """Unsupported types, oversized files and chunks are refused up front."""
+        self.assertEqual(self.create('script.exe', 10).status_code, 415)
+        self.assertEqual(self.create('video.mp4', 60 * 1024 * 1024).status_code, 413)
+        location = self.create('notes.pdf', 5000)['Location']
+        self.assertEqual(self.patch(location, 0, b'x' * 1025).status_code, 413)
+        
+        other = User.objects.create_user(username='other', password='pass')
+        self.client.force_login(other)
+        self.assertEqual(self.client.head(location).status_code, 404)
+    
+    def test_images_are_compressed_on_finalize(self):
+        """Assembled images go through the same post-processing as direct uploads."""
+        output = BytesIO()
+        Image.new('RGB', (2400, 1200), 'red').save(output, 'PNG')
+        data = output.getvalue()
+        response = self.create('photo.png', len(data))
+        location, upload_id = response['Location'], response.json()['id']
+        for offset in range(0, len(data), 1024):
+            self.patch(location, offset, data[offset:offset + 1024])
+        
+        path = self.finalize(upload_id, data).json()['url'].replace('/media/', '', 1)
+        with default_storage.open(path) as stored, Image.open(stored) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (1920, 960)))
+    
+    def test_abandoned_uploads_are_deleted(self):
+        """cleanup_uploads removes uploads untouched for longer than the expiry."""
+        response = self.create('notes.pdf', 100)
+        self.patch(response['Location'], 0, b'x' * 10)
+        upload = ChunkedUpload.objects.get()
+        self.assertEqual(delete_expired(), 0)
+        
+        ChunkedUpload.objects.update(updated_at=timezone.now() - timezone.timedelta(days=2))
+        out = StringIO()
+        call_command('cleanup_uploads', stdout=out)
+        self.assertIn('Removed 1 abandoned uploads', out.getvalue())
+        self.assertFalse(os.path.exists(partial_path(upload)))
+
+
+class MediaLibraryTest(TestCase):
+    """Test the media asset index behind the file browser."""
+    
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.user = User.objects.create_user(username='editor', password='pass')
+        self.client.login(username='editor', password='pass')
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('blog:upload_file'), {'upload': SimpleUploadedFile(name, content)})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def image(self, size=(400, 200)):
+        output = BytesIO()
+        Image.new('RGB', size, 'green').save(output, 'PNG')
+        return output.getvalue()
+    
+    def browse(self, **params):
+        return self.client.get(reverse('blog:browse_files'), params).json()
+    
+    def test_uploads_are_indexed(self):
+        """An upload records its size, MIME type, dimensions, hash and uploader."""
+        data = self.upload('photo.png', self.image())
+        asset = MediaAsset.objects.get()
+        self.assertEqual(data['url'], default_storage.url(asset.path))
+        self.assertEqual((asset.category, asset.mime_type, asset.width, asset.height), ('images', 'image/png', 400, 200))
+        self.assertEqual(asset.size, default_storage.size(asset.path))
+        self.assertEqual(asset.uploaded_by, self.user)
+        with default_storage.open(asset.path) as stored:
+            self.assertEqual(asset.sha256, hashlib.sha256(stored.read()).hexdigest())
+        
+        files = self.browse()['files']
+        self.assertEqual(files[0]['name'], asset.name)
+        self.assertIn('/derivatives/', files[0]['thumbnail'])
+        
+        self.client.post(reverse('blog:delete_file'), json.dumps({'url': data['url']}), content_type='application/json')
+        self.assertFalse(MediaAsset.objects.exists())
+    
+    def test_browse_is_paginated_filtered_and_sorted(self):
+        """Browsing reads one page from the index without touching storage."""
+        for index in range(5):
+            self.upload(f'doc{index}.pdf', b'x' * (index + 1))
+        self.upload('photo.png', self.image())
+        
+        with mock.patch.object(default_storage, 'exists') as exists, mock.patch.object(default_storage, 'size') as size:
+            page = self.browse(category='documents', sort='largest', per_page=2)
+        exists.assert_not_called()
+        size.assert_not_called()
+        self.assertEqual(page['total'], 5)
+        self.assertEqual([f['size'] for f in page['files']], [5, 4])
+        self.assertEqual([f['size'] for f in self.browse(category='documents', sort='largest', per_page=2, page=page['next'])['files']], [3, 2])
+        self.assertEqual([f['category'] for f in self.browse(q='photo')['files']], ['images'])
+    
+    def test_reconcile_imports_and_detects_drift(self):
+        """Files added or removed behind the index are imported or dropped."""
+        self.upload('kept.pdf', b'kept')
+        gone = self.upload('gone.pdf', b'gone')
+        default_storage.delete(gone['url'].replace('/media/', '', 1))
+        default_storage.save('uploads/documents/manual.pdf', SimpleUploadedFile('manual.pdf', b'manual'))
+        
+        drift = reconcile(dry_run=True)
+        self.assertEqual(drift.imported, ['uploads/documents/manual.pdf'])
+        self.assertEqual(len(drift.missing), 1)
+        self.assertEqual(MediaAsset.objects.count(), 2)
+        
+        out = StringIO()
+        call_command('reconcile_media', stdout=out)
+        self.assertIn('Fixed 1 unindexed, 0 changed and 1 missing files', out.getvalue())
+        self.assertEqual(sorted(MediaAsset.objects.values_list('name', flat=True)), ['kept.pdf', 'manual.pdf'])
+
+
+class PostContentAnalysisTest(TestCase):
+    """Test the content analysis stored when a post is saved."""
+    
+    CONTENT = (
+        '<h2>Introduction</h2><p>Hello&nbsp;world, <strong>bold</strong> text.</p>'
+        '<script>var hidden = 1;</script>'
+        '<h3>مُقَدِّمَة</h3><p>كَتَبَ الطالبُ الدرسَ</p>'
+        '<p><img src="/media/uploads/images/aa/bb/photo.png" srcset="/media/uploads/images/photo-640.webp 640w">'
+        '<a href="/media/uploads/documents/file%20one.pdf">file</a> <a href="https://example.com/x">x</a></p>'
+    )
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', password='password')
+        self.category = Category.objects.create(name='Notes', slug='notes')
+        self.post = Post.objects.create(
+            title='Analysed', slug='analysed', content=self.CONTENT, excerpt='', category=self.category,
+            author=self.user, is_published=True, published_at=timezone.now()
+        )
+    
+    def test_single_pass_results(self):
+        """One parse yields the text, counts, outline, first image and media."""
+        analysis = analyze(self.CONTENT)
+        self.assertEqual(
+            analysis.text,
+            'Introduction Hello world, bold text. مُقَدِّمَة كَتَبَ الطالبُ الدرسَ file x'
+        )
+        self.assertEqual(analysis.word_count, 11)
+        self.assertEqual(analysis.headings, [
+            {'level': 2, 'text': 'Introduction', 'id': 'heading-0'},
+            {'level': 3, 'text': 'مُقَدِّمَة', 'id': 'heading-1'},
+        ])
+        self.assertEqual(analysis.first_image, '/media/uploads/images/aa/bb/photo.png')
+        self.assertEqual(analysis.media, [
+            'uploads/images/aa/bb/photo.png', 'uploads/images/photo-640.webp', 'uploads/documents/file one.pdf',
+        ])
+    
+    def test_arabic_is_read_more_slowly(self):
+        """Arabic text gets a longer reading time than as many Latin words."""
+        self.assertEqual(analyze('<p>%s</p>' % ' '.join(['word'] * 300)).reading_time, 2)
+        self.assertEqual(analyze('<p>%s</p>' % ' '.join(['كلمة'] * 300)).reading_time, 2)
+        self.assertEqual(analyze('<p>%s</p>' % ' '.join(['كلمة'] * 500)).reading_time, 4)
+        self.assertEqual(analyze('<p>%s</p>' % ' '.join(['word'] * 500)).reading_time, 2)
+    
+    def test_save_stores_analysis(self):
+        """Saving stores the derived columns; unrelated partial saves skip the parse."""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.analysis_version, ANALYSIS_VERSION)
+        self.assertEqual(post.word_count, 11)
+        self.assertTrue(post.summary.startswith('Introduction Hello'))
+        self.assertEqual(post.meta_description, post.summary[:160])
+        self.assertEqual(post.get_excerpt(), post.summary)
+        
+        post.content = '<h1>Only</h1>'
+        with mock.patch('blog.content.analyze', wraps=analyze) as parse:
+            post.save(update_fields=['views_count'])
+            self.assertFalse(parse.called)
+            post.save(update_fields=['content'])
+            self.assertEqual(parse.call_count, 1)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.word_count, post.summary, post.first_image), (1, 'Only', ''))
+    
+    def test_backfill_is_batched_and_resumable(self):
+        """analyze_posts fills in the posts analysed by an older version only."""
+        Post.objects.create(title='Second', slug='second', content='<p>Two words</p>', excerpt='Given', author=self.user)
+        Post.objects.update(analysis_version=0, word_count=0, summary='', headings=[])
+        
+        out = StringIO()
+        call_command('analyze_posts', '--batch-size', '1', stdout=out)
+        self.assertIn('Analysed 2 posts', out.getvalue())
+        self.assertEqual(
+            sorted(Post.objects.values_list('slug', 'word_count', 'summary', 'analysis_version')),
+            [('analysed', 11, Post.objects.get(slug='analysed').plain_text, ANALYSIS_VERSION),
+             ('second', 2, 'Given', ANALYSIS_VERSION)]
+        )
+        self.assertEqual(len(Post.objects.get(slug='analysed').headings), 2)
+        
+        out = StringIO()
+        call_command('analyze_posts', stdout=out)
+        self.assertIn('Analysed 0 posts', out.getvalue())
+    
+    def test_detail_renders_stored_outline(self):
+        """The table of contents comes from the stored headings."""
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertContains(response, 'href="#heading-1"', count=2)
+        self.assertNotContains(response, 'No headings found')
+
+
+class PostBodyProcessingTest(TestCase):
+    """Test the lazy-media post-processing of post bodies."""
+    
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.user = User.objects.create_user(username='editor', password='pass')
+        self.client.login(username='editor', password='pass')
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def upload_image(self, size=(400, 200)):
+        output = BytesIO()
+        Image.new('RGB', size, 'green').save(output, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('blog:upload_file'), {'upload': SimpleUploadedFile('photo.png', output.getvalue())})
+        return response.json()['url']
+    
+    def create_post(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(
+                title='Media', slug='media', content=content, excerpt='Media', author=self.user,
+                is_published=True, published_at=timezone.now()
+            )
+    
+    def test_library_images_become_responsive(self):
+        """Saving schedules derivatives; the body then renders a sized, lazy <picture>."""
+        url = self.upload_image()
+        content = f'<p><img alt="" src="{url}" /></p><p><img src="https://example.com/x.png"></p>'
+        post = self.create_post(content)
+        
+        body = post.rendered_content
+        self.assertIn('<picture><source type="image/webp" srcset="', body)
+        self.assertRegex(body, r'<img alt="" src="/media/derivatives/[^"]+\.jpg" loading="lazy" decoding="async" '
+                               r'width="400" height="200" srcset="[^"]+ 400w" sizes="[^"]+"></picture>')
+        self.assertIn('<img src="https://example.com/x.png" loading="lazy" decoding="async">', body)
+        self.assertEqual(Post.objects.get(pk=post.pk).content, content)
+    
+    def test_sizes_from_index_until_derivatives_exist(self):
+        """Images are sized from the media index first and made responsive once derivatives exist."""
+        with mock.patch('core.images.schedule_paths') as schedule:
+            url = self.upload_image(size=(300, 150))
+            post = self.create_post(f'<img src="{url}">')
+        path = url.replace('/media/', '', 1)
+        schedule.assert_any_call([path])
+        
+        body = post.rendered_content
+        self.assertIn('width="300" height="150"', body)
+        self.assertNotIn('<picture>', body)
+        
+        from core import images
+        images.generate(path)
+        self.assertIn('<picture>', post.rendered_content)
+    
+    def test_embeds_are_deferred(self):
+        """YouTube embeds become click-to-load facades; other embeds load lazily."""
+        post = self.create_post(
+            '<iframe width="640" height="360" src="https://www.youtube.com/embed/dQw4w9WgXcQ?start=10" allowfullscreen></iframe>'
+            '<iframe src="https://maps.example.com/embed"></iframe>'
+            '<video controls src="/media/uploads/videos/clip.mp4"></video>'
+            '<p>Tom &amp; Jerry &copy; <!-- note --></p>'
+        )
+        body = post.rendered_content
+        self.assertIn(
+            '<div class="video-facade" data-embed-src="https://www.youtube.com/embed/dQw4w9WgXcQ?start=10&amp;autoplay=1" '
+            'style="aspect-ratio: 640 / 360">', body
+        )
+        self.assertIn('https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg', body)
+        self.assertNotIn('youtube.com/embed/dQw4w9WgXcQ"', body)
+        self.assertIn('<iframe src="https://maps.example.com/embed" loading="lazy"></iframe>', body)
+        self.assertIn('<video controls src="/media/uploads/videos/clip.mp4" preload="none"></video>', body)
+        self.assertIn('<p>Tom &amp; Jerry &copy; <!-- note --></p>', body)
+    
+    def test_output_is_cached_by_content(self):
+        """A rendered body is served from the cache without queries."""
+        url = self.upload_image()
+        post = self.create_post(f'<img src="{url}">')
+        post.rendered_content
+        with self.assertNumQueries(0):
+            self.assertEqual(render_body(post.content), post.rendered_content)
+
+
+class PostDetailPageTest(TestCase):
+    """Test the stored neighbours and the query budget of the post page."""
+    
+    # Queries of an uncached post page, whatever the number of tags, related posts and
+    # comments: five for the page (see blog.detail) and two for the site settings and
+    # announcements of the base template
+    QUERY_BUDGET = 7
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author', password='pass')
+        self.category = Category.objects.create(name='Tech', slug='tech')
+        self.start = timezone.now() - timezone.timedelta(days=30)
+        self.first = self.create_post('first', 1)
+        self.second = self.create_post('second', 2)
+        self.third = self.create_post('third', 3)
+    
+    def create_post(self, slug, day, is_published=True):
+        post = Post.objects.create(
+            title=slug.title(), slug=slug, content=f'<p>{slug}</p>', excerpt=slug, author=self.user, category=self.category,
+            is_published=is_published, published_at=self.start + timezone.timedelta(days=day)
+        )
+        post.tags.add('python', f'tag-{slug}')
+        return post
+    
+    def links(self):
+        return {slug: (previous, following) for slug, previous, following in Post.objects.values_list(
+            'slug', 'previous_post__slug', 'next_post__slug'
+        )}
+    
+    def test_neighbours_follow_publishing(self):
+        """Publishing, rescheduling, unpublishing and deleting relink the neighbours."""
+        self.assertEqual(self.links(), {
+            'first': (None, 'second'), 'second': ('first', 'third'), 'third': ('second', None),
+        })
+        
+        self.first.published_at = self.start + timezone.timedelta(days=4)
+        self.first.save()
+        self.assertEqual(self.links(), {
+            'second': (None, 'third'), 'third': ('second', 'first'), 'first': ('third', None),
+        })
+        
+        self.third.is_published = False
+        self.third.save()
+        self.create_post('draft', 5, is_published=False)
+        self.assertEqual(self.links(), {
+            'second': (None, 'first'), 'third': (None, None), 'first': ('second', None), 'draft': (None, None),
+        })
+        
+        self.second.delete()
+        self.assertEqual(self.links()['first'], (None, None))
+    
+    def test_scheduled_neighbour_is_hidden(self):
+        """A scheduled post is linked but not shown until it goes live."""
+        scheduled = self.create_post('scheduled', 60)
+        self.assertEqual(self.links()['third'], ('second', 'scheduled'))
+        response = self.client.get(self.third.get_absolute_url())
+        self.assertEqual(response.context['previous_post'], self.second)
+        self.assertIsNone(response.context['next_post'])
+        self.assertNotContains(response, scheduled.get_absolute_url())
+    
+    def test_query_budget(self):
+        """The page needs the same number of queries as it grows."""
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get(self.second.get_absolute_url())
+        self.assertEqual(response.context['previous_post'], self.first)
+        self.assertEqual(response.context['next_post'], self.third)
+        self.assertContains(response, '#tag-second')
+        
+        for day in range(4, 10):
+            post = self.create_post(f'post-{day}', day)
+            RelatedPost.objects.create(post=self.second, related=post, score=day)
+            self.second.tags.add(f'extra-{day}')
+        for number in range(30):
+            Comment.objects.create(post=self.second, name=f'Reader {number}', email='r@example.com', content='Hi', is_approved=True)
+        cache.clear()
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get(self.second.get_absolute_url())
+        self.assertEqual(len(response.context['related_posts']), 3)
+        self.assertEqual(response.context['comment_count'], 30)
+        self.assertContains(response, '#extra-9')
+    
+    @override_settings(POST_COMMENTS_PER_PAGE=2)
+    def test_comment_pages(self):
+        """Approved comments are paginated newest first; the count covers every page."""
+        for number in range(3):
+            Comment.objects.create(post=self.second, name=f'Reader {number}', email='r@example.com', content='Hi', is_approved=True)
+        Comment.objects.create(post=self.second, name='Spammer', email='s@example.com', content='Buy', is_approved=False)
+        
+        response = self.client.get(self.second.get_absolute_url())
+        self.assertEqual([comment.name for comment in response.context['comments']], ['Reader 2', 'Reader 1'])
+        self.assertEqual(response.context['comment_count'], 3)
+        
+        cursor = response.context['comments'].next_page_number()
+        response = self.client.get(self.second.get_absolute_url(), {'comments': cursor})
+        self.assertEqual([comment.name for comment in response.context['comments']], ['Reader 0'])
+        self.assertNotContains(response, 'Spammer')
+
+
+class PostCardTest(TestCase):
+    """Test the card projection of list pages."""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer', password='pass')
+        self.category = Category.objects.create(name='Tech', slug='tech')
+        self.post = Post.objects.create(
+            title='Long Read', slug='long-read', content='<p>' + 'word ' * 5000 + '</p>', excerpt='Short summary',
+            author=self.user, category=self.category, is_published=True, published_at=timezone.now()
+        )
+        self.post.tags.add('python')
+    
+    def test_cards_skip_the_body(self):
+        """Cards load neither the body nor the author row, and flatten the author."""
+        post = post_cards(Post.objects.published()).get()
+        self.assertTrue({'content', 'plain_text', 'headings', 'media_paths', 'author_id'} <= post.get_deferred_fields())
+        self.assertEqual(post.author_name, 'writer')
+        self.assertEqual(avatar_url(post.author_avatar), '/static/images/default-avatar.svg')
+        
+        self.user.first_name, self.user.last_name = 'Muntazir', 'Hazim'
+        self.user.save()
+        self.user.userprofile.avatar = 'avatars/me.png'
+        self.user.userprofile.save()
+        post = post_cards(Post.objects.published()).get()
+        self.assertEqual(post.author_name, 'Muntazir Hazim')
+        self.assertEqual(avatar_url(post.author_avatar), self.user.userprofile.avatar.url)
+    
+    def test_list_page_renders_cards(self):
+        """The list page renders the card partial without reading post bodies."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog:post_list'))
+        self.assertContains(response, 'Long Read')
+        self.assertContains(response, '#python')
+        self.assertContains(response, 'writer')
+        post_queries = [query['sql'] for query in queries if 'FROM "blog_post"' in query['sql']]
+        self.assertTrue(post_queries)
+        for sql in post_queries:
+            self.assertNotIn('"blog_post"."content"', sql)
+            self.assertNotIn('"auth_user"."password"', sql)
@@ -1,16 +1,29 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from django.conf import settings
+from django.utils.http import http_date
+import base64
+import binascii
 import os
 import json
 import mimetypes
 from PIL import Image
 import uuid
 from datetime import datetime
+from core.pagination import CursorPaginator
+from core.storage import blob_storage
+from core.throttle import throttle
+from . import chunked_uploads, media_library
+from .models import ChunkedUpload, MediaAsset
+
+# إصدار بروتوكول tus المدعوم للرفع على أجزاء
+TUS_VERSION = '1.0.0'
 
 # إعدادات الملفات المدعومة
 SUPPORTED_FILES = {
@@ -51,19 +64,26 @@ def get_file_type(filename):
 
 def validate_file(file):
     """التحقق من صحة الملف"""
-    file_type, config = get_file_type(file.name)
+    return validate_upload(file.name, file.size)
+
+def validate_upload(filename, size):
+    """التحقق من نوع الملف وحجمه قبل استلامه"""
+    file_type, config = get_file_type(filename)
     
     if not file_type:
-        return False, f"نوع الملف غير مدعوم (.{file.name.split('.')[-1]})"
+        return False, f"نوع الملف غير مدعوم (.{filename.split('.')[-1]})"
     
-    if file.size > config['max_size']:
+    if size > config['max_size']:
         max_size_mb = config['max_size'] / (1024 * 1024)
         return False, f"حجم الملف كبير جداً (الحد الأقصى: {max_size_mb:.1f} ميجابايت)"
     
     return True, file_type
 
 def compress_image(image_file, max_width=1920, max_height=1080, quality=85):
-    """ضغط الصورة وتقليل حجمها"""
+    """ضغط الصورة وتقليل حجمها
+    
+    تُكتب الصورة المضغوطة في ملف مؤقت على القرص بدلاً من الذاكرة.
+    """
     try:
         with Image.open(image_file) as img:
             # تحويل RGBA إلى RGB إذا لزم الأمر
@@ -79,12 +99,12 @@ def compress_image(image_file, max_width=1920, max_height=1080, quality=85):
                 img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
             
             # حفظ الصورة المضغوطة
-            from io import BytesIO
-            output = BytesIO()
+            output = TemporaryUploadedFile(image_file.name, 'image/jpeg', None, None)
             img.save(output, format='JPEG', quality=quality, optimize=True)
+            output.size = output.tell()
             output.seek(0)
             
-            return ContentFile(output.read())
+            return output
     except Exception as e:
         print(f"خطأ في ضغط الصورة: {e}")
         return image_file
@@ -96,6 +116,35 @@ def generate_unique_filename(original_filename):
     unique_id = str(uuid.uuid4())[:8]
     return f"{timestamp}_{unique_id}_{name}{ext}"
 
+def save_upload(uploaded_file, original_name, file_type, user=None):
+    """حفظ ملف تم التحقق منه وفهرسته في مكتبة الوسائط وإرجاع معلوماته"""
+    config = SUPPORTED_FILES[file_type]
+    
+    # إنشاء اسم ملف فريد
+    unique_filename = generate_unique_filename(original_name)
+    file_path = os.path.join(config['folder'], unique_filename)
+    
+    # ضغط الصورة إذا كانت صورة
+    if file_type == 'images':
+        uploaded_file = compress_image(uploaded_file)
+    
+    # حفظ الملف باسم مشتق من محتواه، فالملف المكرر يعيد الرابط الموجود
+    try:
+        saved_path = blob_storage.save(file_path, uploaded_file)
+    finally:
+        uploaded_file.close()
+    asset = media_library.index_file(saved_path, file_type, user=user, name=original_name)
+    
+    return {
+        'url': blob_storage.url(saved_path),
+        'filename': os.path.basename(saved_path),
+        'original_name': original_name,
+        'size': asset.size,
+        'type': file_type,
+        'uploaded': True
+    }
+
+@throttle('upload', as_json=True)
 @login_required
 @require_http_methods(["POST"])
 def upload_file(request):
@@ -115,79 +164,162 @@ def upload_file(request):
                 'error': result
             }, status=400)
         
-        file_type = result
-        config = SUPPORTED_FILES[file_type]
-        
-        # إنشاء اسم ملف فريد
-        unique_filename = generate_unique_filename(uploaded_file.name)
-        file_path = os.path.join(config['folder'], unique_filename)
-        
-        # ضغط الصورة إذا كانت صورة
-        if file_type == 'images':
-            uploaded_file = compress_image(uploaded_file)
-        
-        # حفظ الملف
-        saved_path = default_storage.save(file_path, uploaded_file)
-        file_url = default_storage.url(saved_path)
-        
-        # إرجاع معلومات الملف
-        return JsonResponse({
-            'url': file_url,
-            'filename': unique_filename,
-            'original_name': uploaded_file.name,
-            'size': uploaded_file.size,
-            'type': file_type,
-            'uploaded': True
-        })
+        return JsonResponse(save_upload(uploaded_file, uploaded_file.name, result, request.user))
         
     except Exception as e:
         return JsonResponse({
             'error': f'خطأ في رفع الملف: {str(e)}'
         }, status=500)
 
+def parse_upload_metadata(header):
+    """قراءة ترويسة Upload-Metadata (أزواج مفتاح وقيمة بترميز base64)"""
+    metadata = {}
+    for pair in filter(None, (item.strip() for item in header.split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode('utf-8')
+        except (binascii.Error, UnicodeDecodeError):
+            metadata[key] = ''
+    return metadata
+
+def tus_response(upload=None, status=204, data=None):
+    """استجابة تحمل ترويسات بروتوكول tus وحالة الرفع"""
+    response = JsonResponse(data, status=status) if data is not None else HttpResponse(status=status)
+    response['Tus-Resumable'] = TUS_VERSION
+    response['Cache-Control'] = 'no-store'
+    if upload is not None:
+        response['Upload-Offset'] = str(chunked_uploads.current_offset(upload))
+        response['Upload-Length'] = str(upload.length)
+        response['Upload-Expires'] = http_date(chunked_uploads.expires_at(upload).timestamp())
+    return response
+
+def tus_error(message, status):
+    response = JsonResponse({'error': message}, status=status)
+    response['Tus-Resumable'] = TUS_VERSION
+    return response
+
+@login_required
+@require_http_methods(["POST"])
+def create_chunked_upload(request):
+    """بدء رفع ملف على أجزاء
+    
+    يرسل العميل حجم الملف في Upload-Length واسمه في Upload-Metadata.
+    """
+    try:
+        length = int(request.headers.get('Upload-Length', ''))
+    except ValueError:
+        return tus_error('حجم الملف غير صالح', 400)
+    
+    filename = os.path.basename(parse_upload_metadata(request.headers.get('Upload-Metadata', '')).get('filename', ''))
+    if not filename:
+        return tus_error('لم يتم تحديد اسم الملف', 400)
+    
+    # التحقق من نوع الملف وحجمه قبل استلام أي جزء
+    is_valid, result = validate_upload(filename, length)
+    if not is_valid:
+        return tus_error(result, 413 if get_file_type(filename)[0] else 415)
+    
+    upload = ChunkedUpload.objects.create(user=request.user, filename=filename, file_type=result, length=length)
+    location = reverse('blog:chunked_upload', args=[upload.pk])
+    response = tus_response(upload, status=201, data={'id': str(upload.pk), 'location': location, 'offset': 0})
+    response['Location'] = location
+    return response
+
+@login_required
+@require_http_methods(["HEAD", "PATCH", "DELETE"])
+def chunked_upload(request, upload_id):
+    """حالة الرفع (HEAD) وإرسال جزء (PATCH) وإلغاء الرفع (DELETE)"""
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id, user=request.user)
+    
+    if request.method == 'HEAD':
+        return tus_response(upload)
+    
+    if request.method == 'DELETE':
+        chunked_uploads.discard(upload)
+        return tus_response()
+    
+    if request.content_type != 'application/offset+octet-stream':
+        return tus_error('نوع المحتوى غير مدعوم', 415)
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.headers.get('Content-Length', ''))
+    except ValueError:
+        return tus_error('إزاحة الجزء غير صالحة', 400)
+    
+    try:
+        checksum = request.headers.get('Upload-Checksum')
+        if checksum is not None:
+            checksum = chunked_uploads.parse_checksum(checksum)
+        # يُكتب الجزء على القرص على دفعات صغيرة دون قراءته كاملاً في الذاكرة
+        chunked_uploads.append_chunk(upload, offset, request, length, checksum)
+    except chunked_uploads.UploadError as e:
+        response = tus_error(str(e), e.status)
+        response['Upload-Offset'] = str(chunked_uploads.current_offset(upload))
+        return response
+    
+    return tus_response(upload)
+
+@login_required
+@require_http_methods(["POST"])
+def finalize_chunked_upload(request, upload_id):
+    """إنهاء الرفع على أجزاء بعد التحقق من المجموع الاختباري"""
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id, user=request.user)
+    
+    try:
+        checksum = chunked_uploads.parse_checksum(request.headers.get('Upload-Checksum', ''))
+        assembled = chunked_uploads.assembled_file(upload, checksum)
+    except chunked_uploads.UploadError as e:
+        return tus_error(str(e), e.status)
+    
+    try:
+        data = save_upload(assembled, upload.filename, upload.file_type, request.user)
+    except Exception as e:
+        return tus_error(f'خطأ في رفع الملف: {str(e)}', 500)
+    finally:
+        assembled.close()
+    
+    chunked_uploads.discard(upload)
+    return tus_response(status=200, data=data)
+
+def asset_info(asset, thumbnails=None):
+    """معلومات ملف من مكتبة الوسائط"""
+    return {
+        'name': asset.name,
+        'url': default_storage.url(asset.path),
+        'size': asset.size,
+        'type': asset.mime_type or None,
+        'category': asset.category,
+        'width': asset.width,
+        'height': asset.height,
+        'thumbnail': (thumbnails or {}).get(asset.sha256),
+        'modified': asset.created_at.isoformat()
+    }
+
 @login_required
 @require_http_methods(["GET"])
 def browse_files(request):
-    """تصفح الملفات المرفوعة"""
+    """تصفح الملفات المرفوعة
+    
+    يدعم التصفية حسب النوع (category) والبحث بالاسم (q) والترتيب (sort)
+    والتنقل بين الصفحات عبر المؤشر (page).
+    """
     try:
-        files = []
+        assets = media_library.search(request.GET.get('category'), request.GET.get('q', '').strip())
+        ordering = media_library.ORDERINGS.get(request.GET.get('sort'), media_library.ORDERINGS['newest'])
+        try:
+            per_page = min(max(int(request.GET.get('per_page', 50)), 1), 200)
+        except ValueError:
+            per_page = 50
         
-        # تصفح جميع مجلدات الملفات
-        for file_type, config in SUPPORTED_FILES.items():
-            folder_path = config['folder']
-            
-            try:
-                # الحصول على قائمة الملفات في المجلد
-                if default_storage.exists(folder_path):
-                    folder_files = default_storage.listdir(folder_path)[1]  # [1] للملفات، [0] للمجلدات
-                    
-                    for filename in folder_files:
-                        file_path = os.path.join(folder_path, filename)
-                        if default_storage.exists(file_path):
-                            file_url = default_storage.url(file_path)
-                            file_size = default_storage.size(file_path)
-                            
-                            # تحديد نوع MIME
-                            mime_type, _ = mimetypes.guess_type(filename)
-                            
-                            files.append({
-                                'name': filename,
-                                'url': file_url,
-                                'size': file_size,
-                                'type': mime_type,
-                                'category': file_type,
-                                'modified': default_storage.get_modified_time(file_path).isoformat()
-                            })
-            except Exception as e:
-                print(f"خطأ في تصفح مجلد {folder_path}: {e}")
-                continue
-        
-        # ترتيب الملفات حسب تاريخ التعديل (الأحدث أولاً)
-        files.sort(key=lambda x: x['modified'], reverse=True)
+        paginator = CursorPaginator(assets, per_page, ordering=ordering, approximate_count=True)
+        page = paginator.get_page(request.GET.get('page'))
+        thumbnails = media_library.thumbnails(page)
         
         return JsonResponse({
-            'files': files,
-            'total': len(files)
+            'files': [asset_info(asset, thumbnails) for asset in page],
+            'total': paginator.count,
+            'next': page.next_page_number() if page.has_next() else None,
+            'previous': page.previous_page_number() if page.has_previous() else None
         })
         
     except Exception as e:
@@ -213,7 +345,9 @@ def delete_file(request):
         file_path = file_url.replace(settings.MEDIA_URL, '')
         
         if default_storage.exists(file_path):
-            default_storage.delete(file_path)
+            # قد يكون الملف نفسه مستخدماً في مكان آخر، فيبقى حتى يجمعه
+            # collect_media_garbage عندما لا يشير إليه شيء
+            media_library.remove_file(file_path)
             return JsonResponse({
                 'success': True,
                 'message': 'تم حذف الملف بنجاح'
@@ -243,6 +377,10 @@ def get_file_info(request):
         # استخراج مسار الملف من الرابط
         file_path = file_url.replace(settings.MEDIA_URL, '')
         
+        asset = MediaAsset.objects.filter(path=file_path).first()
+        if asset is not None:
+            return JsonResponse(asset_info(asset))
+        
         if not default_storage.exists(file_path):
             return JsonResponse({
                 'error': 'الملف غير موجود'
@@ -1,7 +1,7 @@
 from django.urls import path
 from . import views
 from . import upload_views
-from .feeds import LatestPostsFeed
+from . import feeds
 
 app_name = 'blog'
 
@@ -28,11 +28,22 @@ urlpatterns = [
     path('archive/<int:year>/', views.archive_view, name='archive_year'),
     path('archive/<int:year>/<int:month>/', views.archive_view, name='archive_month'),
     
-    # RSS Feed
-    path('rss/', LatestPostsFeed(), name='rss_feed'),
+    # Feeds
+    path('rss/', feeds.LatestPostsFeed(), name='rss_feed'),
+    path('atom/', feeds.LatestPostsAtomFeed(), name='atom_feed'),
+    path('feed.json', feeds.LatestPostsJSONFeed(), name='json_feed'),
+    path('category/<slug:slug>/rss/', feeds.CategoryFeed(), name='category_rss_feed'),
+    path('category/<slug:slug>/atom/', feeds.CategoryAtomFeed(), name='category_atom_feed'),
+    path('category/<slug:slug>/feed.json', feeds.CategoryJSONFeed(), name='category_json_feed'),
+    path('tag/<str:slug>/rss/', feeds.TagFeed(), name='tag_rss_feed'),
+    path('tag/<str:slug>/atom/', feeds.TagAtomFeed(), name='tag_atom_feed'),
+    path('tag/<str:slug>/feed.json', feeds.TagJSONFeed(), name='tag_json_feed'),
     
     # مسارات رفع الملفات
     path('upload/', upload_views.upload_file, name='upload_file'),
+    path('upload/chunked/', upload_views.create_chunked_upload, name='create_chunked_upload'),
+    path('upload/chunked/<uuid:upload_id>/', upload_views.chunked_upload, name='chunked_upload'),
+    path('upload/chunked/<uuid:upload_id>/finalize/', upload_views.finalize_chunked_upload, name='finalize_chunked_upload'),
     path('browse/', upload_views.browse_files, name='browse_files'),
     path('delete-file/', upload_views.delete_file, name='delete_file'),
     path('file-info/', upload_views.get_file_info, name='file_info'),
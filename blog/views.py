@@ -1,6 +1,4 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.utils.translation import gettext_lazy as _
 from django.http import Http404
@@ -8,45 +6,49 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
 from taggit.models import Tag
+from core.counters import categories_with_counts, tags_with_counts
+from core.pagecache import cached_page, replay_on_hit
+from core.pagination import CursorPaginationMixin, CursorPaginator
+from core.search import attach_snippets, search_queryset
+from core.throttle import throttle
 from .models import Post, Category, Comment
 from .forms import CommentForm, PostForm
+from .archive import month_range
+from .cards import post_cards
+from .counters import record_view
+from .detail import load_post_page
 
 
-class PostListView(ListView):
+@method_decorator(cached_page(query_params=('page',)), name='dispatch')
+class PostListView(CursorPaginationMixin, ListView):
     """Blog posts list view."""
     model = Post
     template_name = 'blog/post_list.html'
     context_object_name = 'posts'
     paginate_by = 9
+    cursor_ordering = ('-published_at', '-id')
     
     def get_queryset(self):
-        queryset = Post.objects.published().select_related('author', 'category').prefetch_related('tags')
+        queryset = post_cards(Post.objects.published())
         
         # Search functionality
         search_query = self.request.GET.get('search')
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(excerpt__icontains=search_query) |
-                Q(content__icontains=search_query) |
-                Q(tags__name__icontains=search_query)
-            ).distinct()
+            queryset = search_queryset(queryset, search_query)
         
         return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['search_query'] = self.request.GET.get('search', '')
-        context['categories'] = Category.objects.annotate(
-            post_count=Count('posts', filter=Q(posts__is_published=True))
-        ).filter(post_count__gt=0)
-        context['popular_tags'] = Tag.objects.annotate(
-            post_count=Count('taggit_taggeditem_items')
-        ).filter(post_count__gt=0).order_by('-post_count')[:10]
+        context['categories'] = categories_with_counts(Post)
+        context['popular_tags'] = tags_with_counts(Post, limit=10)
         return context
 
 
+@method_decorator(cached_page(query_params=('comments',)), name='dispatch')
 class PostDetailView(DetailView):
     """Blog post detail view."""
     model = Post
@@ -55,49 +57,41 @@ class PostDetailView(DetailView):
     slug_field = 'slug'
     slug_url_kwarg = 'slug'
     
-    def get_queryset(self):
-        return Post.objects.published().select_related('author', 'category').prefetch_related('tags')
-    
     def get_object(self, queryset=None):
-        obj = super().get_object(queryset)
-        # Increment views count
-        obj.increment_views()
-        return obj
+        # The post, its neighbours, related posts and comments in a fixed number of queries
+        self.page = load_post_page(self.kwargs['slug'], self.request.GET.get('comments'))
+        # Buffer the view in the cache; flush_view_counts writes it back.
+        # Page cache hits skip this method, so they record the view again.
+        record_view(self.page.post.pk)
+        replay_on_hit(record_view, self.page.post.pk)
+        return self.page.post
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        post = self.get_object()
-        
-        # Get related posts
-        context['related_posts'] = post.get_related_posts()
-        
-        # Get previous and next posts
-        context['previous_post'] = Post.objects.published().filter(
-            published_at__lt=post.published_at
-        ).first()
-        context['next_post'] = Post.objects.published().filter(
-            published_at__gt=post.published_at
-        ).order_by('published_at').first()
-        
-        # Get approved comments
-        context['comments'] = post.comments.filter(is_approved=True).order_by('-created_at')
-        
-        # Add comment form
-        context['comment_form'] = CommentForm()
-        
+        context.update({
+            'tags': self.page.tags,
+            'related_posts': self.page.related_posts,
+            'previous_post': self.page.previous_post,
+            'next_post': self.page.next_post,
+            'comments': self.page.comments,
+            'comment_count': self.page.comment_count,
+            'comment_form': CommentForm(),
+        })
         return context
 
 
-class CategoryPostsView(ListView):
+@method_decorator(cached_page(query_params=('page',)), name='dispatch')
+class CategoryPostsView(CursorPaginationMixin, ListView):
     """Posts by category view."""
     model = Post
     template_name = 'blog/category_posts.html'
     context_object_name = 'posts'
     paginate_by = 9
+    cursor_ordering = ('-published_at', '-id')
     
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
-        return Post.objects.published().filter(category=self.category).select_related('author', 'category').prefetch_related('tags')
+        return post_cards(Post.objects.published().filter(category=self.category))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -105,16 +99,18 @@ class CategoryPostsView(ListView):
         return context
 
 
-class TagPostsView(ListView):
+@method_decorator(cached_page(query_params=('page',)), name='dispatch')
+class TagPostsView(CursorPaginationMixin, ListView):
     """Posts by tag view."""
     model = Post
     template_name = 'blog/tag_posts.html'
     context_object_name = 'posts'
     paginate_by = 9
+    cursor_ordering = ('-published_at', '-id')
     
     def get_queryset(self):
         self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
-        return Post.objects.published().filter(tags=self.tag).select_related('author', 'category').prefetch_related('tags')
+        return post_cards(Post.objects.published().filter(tags=self.tag))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -122,19 +118,20 @@ class TagPostsView(ListView):
         return context
 
 
+@cached_page(query_params=('page',))
 def archive_view(request, year=None, month=None):
     """Archive view for posts by year/month."""
-    posts = Post.objects.published().select_related('author', 'category').prefetch_related('tags')
+    posts = post_cards(Post.objects.published())
     
     if year:
-        posts = posts.filter(published_at__year=year)
-        if month:
-            posts = posts.filter(published_at__month=month)
+        if month is not None and not 1 <= month <= 12:
+            raise Http404(_('Invalid month'))
+        start, end = month_range(year, month)
+        posts = posts.filter(published_at__gte=start, published_at__lt=end)
     
     # Pagination
-    paginator = Paginator(posts, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(posts, 9, ordering=('-published_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {
         'posts': page_obj,
@@ -153,14 +150,10 @@ def search_view(request):
     category_slug = request.GET.get('category', '')
     tag_slug = request.GET.get('tag', '')
     
-    posts = Post.objects.published().select_related('author', 'category').prefetch_related('tags')
+    posts = post_cards(Post.objects.published())
     
     if query:
-        posts = posts.filter(
-            Q(title__icontains=query) |
-            Q(excerpt__icontains=query) |
-            Q(content__icontains=query)
-        ).distinct()
+        posts = search_queryset(posts, query, snippets=True)
     
     if category_slug:
         posts = posts.filter(category__slug=category_slug)
@@ -168,19 +161,15 @@ def search_view(request):
     if tag_slug:
         posts = posts.filter(tags__slug=tag_slug)
     
-    # Pagination
-    paginator = Paginator(posts, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination (search results keep their relevance order)
+    paginator = CursorPaginator(posts, 9, ordering=('-published_at', '-id'), approximate_count=True)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    if query:
+        attach_snippets(page_obj, query)
     
     # Get categories and tags for filters
-    categories = Category.objects.annotate(
-        post_count=Count('posts', filter=Q(posts__is_published=True))
-    ).filter(post_count__gt=0)
-    
-    popular_tags = Tag.objects.annotate(
-        post_count=Count('taggit_taggeditem_items')
-    ).filter(post_count__gt=0).order_by('-post_count')[:20]
+    categories = categories_with_counts(Post)
+    popular_tags = tags_with_counts(Post, limit=20)
     
     context = {
         'posts': page_obj,
@@ -191,12 +180,13 @@ def search_view(request):
         'popular_tags': popular_tags,
         'page_obj': page_obj,
         'is_paginated': page_obj.has_other_pages(),
-        'results_count': posts.count(),
+        'results_count': paginator.count,
     }
     
     return render(request, 'blog/search.html', context)
 
 
+@throttle('comment')
 @login_required
 def add_comment(request, slug):
     """Add a comment to a blog post."""
@@ -12,8 +12,9 @@ class BookCategoryAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
     
     def get_book_count(self, obj):
-        return obj.get_book_count()
+        return obj.published_book_count
     get_book_count.short_description = _('Books Count')
+    get_book_count.admin_order_field = 'published_book_count'
 
 
 class BookNoteInline(admin.TabularInline):
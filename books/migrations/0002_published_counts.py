@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookcategory',
+            name='published_book_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Published Books'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:25
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_published_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='books/covers/', verbose_name='Cover Image'),
+        ),
+    ]
@@ -6,7 +6,8 @@ from django.contrib.auth.models import User
 from django.utils.text import slugify
 from markdownx.models import MarkdownxField
 from taggit.managers import TaggableManager
-from PIL import Image
+from core.rendering import render as render_markdown
+from core.storage import blob_storage
 
 
 class BookCategory(models.Model):
@@ -15,6 +16,7 @@ class BookCategory(models.Model):
     slug = models.SlugField(_('Slug'), unique=True)
     description = models.TextField(_('Description'), blank=True)
     color = models.CharField(_('Color'), max_length=7, default='#3B82F6', help_text=_('Hex color code'))
+    published_book_count = models.PositiveIntegerField(_('Published Books'), default=0, editable=False)
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
 
     class Meta:
@@ -30,7 +32,7 @@ class BookCategory(models.Model):
 
     def get_book_count(self):
         """Return number of published books in this category."""
-        return self.books.filter(is_published=True).count()
+        return type(self).objects.filter(pk=self.pk).values_list('published_book_count', flat=True).first() or 0
 
 
 class Book(models.Model):
@@ -57,7 +59,7 @@ class Book(models.Model):
     isbn = models.CharField(_('ISBN'), max_length=20, blank=True, null=True)
     description = models.TextField(_('Description'), blank=True)
     review = MarkdownxField(_('Review'), blank=True)
-    cover_image = models.ImageField(_('Cover Image'), upload_to='books/covers/', blank=True, null=True)
+    cover_image = models.ImageField(_('Cover Image'), upload_to='books/covers/', storage=blob_storage, blank=True, null=True)
     
     # Book details
     pages = models.PositiveIntegerField(_('Pages'), blank=True, null=True)
@@ -88,6 +90,9 @@ class Book(models.Model):
     meta_description = models.CharField(_('Meta Description'), max_length=160, blank=True)
     meta_keywords = models.CharField(_('Meta Keywords'), max_length=255, blank=True)
     
+    # Fields a book card renders; list pages load nothing else
+    CARD_FIELDS = ('id', 'title', 'slug', 'author', 'cover_image', 'status', 'rating', 'is_featured', 'created_at')
+    
     class Meta:
         verbose_name = _('Book')
         verbose_name_plural = _('Books')
@@ -112,31 +117,10 @@ class Book(models.Model):
             self.meta_description = self.description[:160]
         
         super().save(*args, **kwargs)
-        
-        # Resize cover image
-        if self.cover_image:
-            self.resize_cover_image()
     
     def get_absolute_url(self):
         return reverse('books:book_detail', kwargs={'slug': self.slug})
     
-    def resize_cover_image(self):
-        """Resize cover image to optimize file size."""
-        try:
-            img = Image.open(self.cover_image.path)
-            
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Resize if too large
-            max_size = (600, 800)  # Good for book covers
-            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                img.save(self.cover_image.path, 'JPEG', quality=85, optimize=True)
-        except Exception:
-            pass  # Handle image processing errors gracefully
-    
     @property
     def reading_progress(self):
         """Calculate reading progress percentage."""
@@ -167,6 +151,11 @@ class Book(models.Model):
         if self.rating:
             return '⭐' * self.rating
         return _('Not rated')
+    
+    @property
+    def review_html(self):
+        """Return the review rendered from Markdown."""
+        return render_markdown(self.review, 'markdownx').html
 
 
 class BookNote(models.Model):
@@ -186,4 +175,9 @@ class BookNote(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.book.title} - {self.title or 'Note'}"
\ No newline at end of file
+        return f"{self.book.title} - {self.title or 'Note'}"
+    
+    @property
+    def content_html(self):
+        """Return the note rendered from Markdown."""
+        return render_markdown(self.content, 'markdownx').html
@@ -0,0 +1,40 @@
+from django.db.models import Max, Q
+from core.counters import categories_with_counts
+from core.sitemaps import I18nSitemap
+from .models import Book
+
+
+class BookSitemap(I18nSitemap):
+    """Sitemap for published books."""
+    
+    changefreq = 'monthly'
+    priority = 0.6
+    
+    def items(self):
+        return Book.objects.filter(is_published=True).only('slug', 'updated_at').order_by('-created_at', '-id')
+    
+    def lastmod(self, obj):
+        return obj.updated_at
+    
+    def get_latest_lastmod(self):
+        return Book.objects.filter(is_published=True).aggregate(latest=Max('updated_at'))['latest']
+
+
+class BookCategorySitemap(I18nSitemap):
+    """Sitemap for book categories with published books."""
+    
+    changefreq = 'monthly'
+    priority = 0.5
+    
+    def items(self):
+        return categories_with_counts(Book).annotate(
+            latest_book_update=Max('books__updated_at', filter=Q(books__is_published=True))
+        ).order_by('name')
+    
+    def lastmod(self, obj):
+        return obj.latest_book_update or obj.created_at
+    
+    def get_latest_lastmod(self):
+        return Book.objects.filter(is_published=True, category__isnull=False).aggregate(
+            latest=Max('updated_at')
+        )['latest']
@@ -2,31 +2,34 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.db.models import Q, Count
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
+from django.utils.decorators import method_decorator
+from core.counters import categories_with_counts
+from core.pagecache import cached_page
+from core.pagination import CursorPaginationMixin
+from core.search import search_queryset
 from .models import Book, BookCategory, BookNote
 from .forms import BookForm, BookNoteForm
 
 
-class BookListView(ListView):
+@method_decorator(cached_page(query_params=('page', 'category', 'status', 'rating', 'sort')), name='dispatch')
+class BookListView(CursorPaginationMixin, ListView):
     """List all published books."""
     model = Book
     template_name = 'books/book_list.html'
     context_object_name = 'books'
     paginate_by = 12
+    cursor_ordering = ('-created_at', '-id')
+    approximate_count = True
     
     def get_queryset(self):
-        queryset = Book.objects.filter(is_published=True).select_related('category', 'added_by')
+        queryset = Book.objects.filter(is_published=True).only(*Book.CARD_FIELDS)
         
         # Search functionality
         search_query = self.request.GET.get('search')
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(author__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
+            queryset = search_queryset(queryset, search_query)
         
         # Filter by category
         category_slug = self.request.GET.get('category')
@@ -43,8 +46,8 @@ class BookListView(ListView):
         if rating:
             queryset = queryset.filter(rating=rating)
         
-        # Sorting
-        sort_by = self.request.GET.get('sort', '-created_at')
+        # Sorting (search results keep their relevance order unless asked)
+        sort_by = self.request.GET.get('sort', '' if search_query else '-created_at')
         if sort_by in ['title', '-title', 'author', '-author', 'rating', '-rating', 'created_at', '-created_at']:
             queryset = queryset.order_by(sort_by)
         
@@ -52,7 +55,7 @@ class BookListView(ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = BookCategory.objects.annotate(book_count=Count('books')).filter(book_count__gt=0)
+        context['categories'] = categories_with_counts(Book)
         context['search_query'] = self.request.GET.get('search', '')
         context['selected_category'] = self.request.GET.get('category', '')
         context['selected_status'] = self.request.GET.get('status', '')
@@ -61,6 +64,7 @@ class BookListView(ListView):
         return context
 
 
+@method_decorator(cached_page(), name='dispatch')
 class BookDetailView(DetailView):
     """Display book details."""
     model = Book
@@ -122,6 +126,7 @@ class BookDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+@method_decorator(cached_page(), name='dispatch')
 class BookCategoryListView(ListView):
     """List all book categories."""
     model = BookCategory
@@ -129,9 +134,10 @@ class BookCategoryListView(ListView):
     context_object_name = 'categories'
     
     def get_queryset(self):
-        return BookCategory.objects.annotate(book_count=Count('books')).filter(book_count__gt=0)
+        return categories_with_counts(Book)
 
 
+@method_decorator(cached_page(query_params=('page',)), name='dispatch')
 class CategoryBooksView(ListView):
     """List books in a specific category."""
     model = Book
@@ -144,7 +150,7 @@ class CategoryBooksView(ListView):
         return Book.objects.filter(
             category=self.category,
             is_published=True
-        ).select_related('category', 'added_by')
+        ).only(*Book.CARD_FIELDS)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
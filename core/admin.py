@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from .models import Project, ContactMessage, SiteSettings, Announcement
+from .models import Project, ContactMessage, SiteSettings, Announcement, OutboundEmail
 
 
 @admin.register(Project)
@@ -188,6 +188,24 @@ class AnnouncementAdmin(admin.ModelAdmin):
         js = ('admin/js/announcement_admin.js',)
 
 
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'dedupe_key', 'recipients']
+    readonly_fields = ['subject', 'body', 'html_body', 'from_email', 'recipients', 'dedupe_key',
+                       'attempts', 'last_error', 'created_at', 'sent_at']
+    actions = ['retry_now']
+    
+    def has_add_permission(self, request):
+        """Emails are only queued by the application."""
+        return False
+    
+    @admin.action(description=_('Retry selected emails now'))
+    def retry_now(self, request, queryset):
+        queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+
+
 # Customize admin site
 admin.site.site_header = _('منتظر حازم ثامر - لوحة الإدارة')
 admin.site.site_title = _('إدارة الموقع')
@@ -1,8 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 from django.utils.translation import gettext_lazy as _
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
-    verbose_name = _('Core')
\ No newline at end of file
+    verbose_name = _('Core')
+    
+    def ready(self):
+        """Import signals when app is ready."""
+        from . import signals
+        post_migrate.connect(signals.ensure_search_schema, sender=self)
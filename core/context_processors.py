@@ -1,14 +1,14 @@
-from .models import SiteSettings, Announcement
-from django.utils import timezone
-from django.db import models
+from . import pagecache
+from .snapshot import get_snapshot
 
 
 def site_settings(request):
     """Add site settings to template context."""
     try:
-        settings = SiteSettings.get_settings()
+        snapshot = get_snapshot()
+        pagecache.depends_on(*snapshot.dependencies)
         return {
-            'site_settings': settings,
+            'site_settings': snapshot.site_settings,
         }
     except Exception:
         # Return default values if settings don't exist
@@ -27,22 +27,15 @@ def site_settings(request):
 def active_announcements(request):
     """Add active announcements to template context."""
     try:
-        now = timezone.now()
-        announcements = Announcement.objects.filter(
-            is_active=True,
-            show_on_all_pages=True,
-            start_date__lte=now
-        ).filter(
-            models.Q(end_date__isnull=True) | models.Q(end_date__gt=now)
-        ).order_by('-priority', '-created_at')
-        
+        snapshot = get_snapshot()
+        pagecache.depends_on(*snapshot.dependencies)
         return {
-            'active_announcements': announcements,
-            'has_announcements': announcements.exists(),
+            'active_announcements': snapshot.announcements,
+            'has_announcements': bool(snapshot.announcements),
         }
     except Exception:
         # Return empty if there's an error
         return {
             'active_announcements': [],
             'has_announcements': False,
-        }
\ No newline at end of file
+        }
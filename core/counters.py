@@ -0,0 +1,182 @@
+"""Denormalized published-content counters.
+
+``Category.published_post_count``, ``BookCategory.published_book_count`` and
+``TagUsage`` rows are adjusted by signals when a counted object is
+published or unpublished, moves to another category, gains or loses tags,
+or is deleted. List views, the tag cloud, the sitemap and the admin read
+the counters instead of aggregating on every request.
+``reconcile_counters`` recomputes everything and fixes drift.
+"""
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, F, Q
+from taggit.models import Tag, TaggedItem
+
+# Counted model -> (category field, counter field on the category model)
+COUNTED_MODELS = {
+    'blog.post': ('category', 'published_post_count'),
+    'books.book': ('category', 'published_book_count'),
+}
+
+
+def is_counted(model):
+    return model._meta.label_lower in COUNTED_MODELS
+
+
+def counter_state(is_published, category_id):
+    """Return the ``(published, category_id)`` pair counters depend on."""
+    return bool(is_published), category_id
+
+
+def stored_state(instance):
+    """Return the counter state of ``instance`` as saved in the database."""
+    if not instance.pk:
+        return counter_state(False, None)
+    category_field, _ = COUNTED_MODELS[instance._meta.label_lower]
+    row = (
+        type(instance)._default_manager.filter(pk=instance.pk)
+        .values_list('is_published', f'{category_field}_id')
+        .first()
+    )
+    return counter_state(*row) if row else counter_state(False, None)
+
+
+def current_state(instance):
+    category_field, _ = COUNTED_MODELS[instance._meta.label_lower]
+    return counter_state(instance.is_published, getattr(instance, f'{category_field}_id'))
+
+
+def _category_model(model):
+    category_field, counter_field = COUNTED_MODELS[model._meta.label_lower]
+    return model._meta.get_field(category_field).related_model, counter_field
+
+
+def adjust_category(model, category_id, delta):
+    if category_id is None or not delta:
+        return
+    category_model, counter_field = _category_model(model)
+    queryset = category_model._default_manager.filter(pk=category_id)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{counter_field}__gte': -delta})
+    queryset.update(**{counter_field: F(counter_field) + delta})
+
+
+def adjust_tags(model, tag_ids, delta):
+    """Add ``delta`` to the usage of ``tag_ids`` for ``model``."""
+    from .models import TagUsage
+
+    tag_ids = list(tag_ids or [])
+    if not tag_ids or not delta:
+        return
+    content_type = ContentType.objects.get_for_model(model)
+    usages = TagUsage.objects.filter(content_type=content_type, tag_id__in=tag_ids)
+    if delta > 0:
+        TagUsage.objects.bulk_create(
+            [TagUsage(tag_id=tag_id, content_type=content_type) for tag_id in tag_ids],
+            ignore_conflicts=True,
+        )
+    else:
+        usages = usages.filter(published_count__gte=-delta)
+    usages.update(published_count=F('published_count') + delta)
+
+
+def tag_ids_of(instance):
+    return list(
+        TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=instance.pk,
+        ).values_list('tag_id', flat=True)
+    )
+
+
+def apply_state_change(instance, old, new):
+    """Update counters after ``instance`` went from state ``old`` to ``new``."""
+    if old == new:
+        return
+    model = type(instance)
+    (was_published, old_category), (is_published, new_category) = old, new
+    with transaction.atomic():
+        if was_published:
+            adjust_category(model, old_category, -1)
+        if is_published:
+            adjust_category(model, new_category, 1)
+        if was_published != is_published:
+            adjust_tags(model, tag_ids_of(instance), 1 if is_published else -1)
+
+
+# Reading -----------------------------------------------------------------
+
+def categories_with_counts(model):
+    """Return non-empty categories of ``model`` annotated with ``<kind>_count``.
+
+    The annotation keeps the ``post_count``/``book_count`` names the
+    templates use.
+    """
+    category_model, counter_field = _category_model(model)
+    alias = f'{model._meta.model_name}_count'
+    return category_model._default_manager.filter(
+        **{f'{counter_field}__gt': 0}
+    ).annotate(**{alias: F(counter_field)})
+
+
+def tags_with_counts(model, limit=None):
+    """Return tags used by published ``model`` objects, most used first."""
+    content_type = ContentType.objects.get_for_model(model)
+    alias = f'{model._meta.model_name}_count'
+    tags = Tag.objects.filter(
+        usages__content_type=content_type, usages__published_count__gt=0
+    ).annotate(**{alias: F('usages__published_count')}).order_by(f'-{alias}', 'name')
+    return tags[:limit] if limit else tags
+
+
+# Reconciling -------------------------------------------------------------
+
+def reconcile_counters(dry_run=False):
+    """Recompute every counter and fix the ones that drifted.
+
+    Returns a list of ``(description, stored, expected)`` for each fix.
+    """
+    from .models import TagUsage
+
+    fixes = []
+    with transaction.atomic():
+        for label, (category_field, counter_field) in COUNTED_MODELS.items():
+            model = apps.get_model(label)
+            category_model, _ = _category_model(model)
+            related_name = model._meta.get_field(category_field).remote_field.get_accessor_name()
+            expected = category_model._default_manager.annotate(
+                expected=Count(related_name, filter=Q(**{f'{related_name}__is_published': True}))
+            )
+            for category in expected:
+                stored = getattr(category, counter_field)
+                if stored != category.expected:
+                    fixes.append((f'{category_model._meta.label} {category.pk}', stored, category.expected))
+                    if not dry_run:
+                        category_model._default_manager.filter(pk=category.pk).update(
+                            **{counter_field: category.expected}
+                        )
+
+            content_type = ContentType.objects.get_for_model(model)
+            published_ids = model._default_manager.filter(is_published=True).values('pk')
+            expected_tags = dict(
+                TaggedItem.objects.filter(content_type=content_type, object_id__in=published_ids)
+                .values_list('tag_id')
+                .annotate(total=Count('id'))
+                .order_by()
+            )
+            stored_tags = dict(
+                TagUsage.objects.filter(content_type=content_type).values_list('tag_id', 'published_count')
+            )
+            for tag_id in expected_tags.keys() | stored_tags.keys():
+                stored, wanted = stored_tags.get(tag_id, 0), expected_tags.get(tag_id, 0)
+                if stored == wanted:
+                    continue
+                fixes.append((f'{model._meta.label} tag {tag_id}', stored, wanted))
+                if not dry_run:
+                    TagUsage.objects.update_or_create(
+                        tag_id=tag_id, content_type=content_type,
+                        defaults={'published_count': wanted},
+                    )
+    return fixes
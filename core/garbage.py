@@ -0,0 +1,189 @@
+"""Garbage collection of media files nothing references any more.
+
+A file in ``MEDIA_ROOT`` is referenced when a ``FileField`` of any model or
+a media URL inside an HTML/Markdown body (``MEDIA_REFERENCE_FIELDS``)
+points to it; the responsive derivatives of a referenced image are
+referenced too. Media library assets (``MEDIA_INDEX_MODELS``) are not
+references: every upload has one, and ``reconcile_media`` re-indexes any
+file it finds, so an editor upload is kept only while a body uses it. The referenced set is built by
+streaming the rows, and ``MEDIA_ROOT`` is scanned with one worker per
+top-level folder.
+
+Unreferenced files older than ``MEDIA_GC_GRACE_PERIOD`` are moved to
+``MEDIA_GC_QUARANTINE_DIR`` first and deleted on a later run once they have
+spent another grace period there; a file that is referenced again in the
+meantime is moved back.
+"""
+
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+
+from . import images
+from .storage import BLOB_FIELDS, MEDIA_INDEX_MODELS, MEDIA_REFERENCE_FIELDS, blob_sha256
+
+GarbageReport = namedtuple('GarbageReport', ['quarantined', 'quarantined_bytes', 'restored', 'deleted', 'reclaimed'])
+
+
+def grace_period():
+    return getattr(settings, 'MEDIA_GC_GRACE_PERIOD', 60 * 60 * 24 * 7)
+
+
+def quarantine_dir():
+    return str(getattr(settings, 'MEDIA_GC_QUARANTINE_DIR', os.path.join(settings.MEDIA_ROOT, '.quarantine')))
+
+
+def _media_url_re():
+    return re.compile(re.escape(settings.MEDIA_URL) + r'''([^\s"'<>()\[\]?#\\]+)''')
+
+
+def _body_references():
+    """Yield the media paths embedded in the HTML/Markdown fields."""
+    pattern = _media_url_re()
+    for label, fields in MEDIA_REFERENCE_FIELDS.items():
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__contains': settings.MEDIA_URL})
+        rows = apps.get_model(label).objects.filter(condition).values_list(*fields)
+        for values in rows.iterator(chunk_size=500):
+            for value in values:
+                for match in pattern.finditer(value or ''):
+                    yield unquote(match.group(1))
+
+
+def _field_references():
+    """Yield the paths stored in file fields, leaving out the media library index."""
+    for model in apps.get_models():
+        label = model._meta.label_lower
+        if label in MEDIA_INDEX_MODELS:
+            continue
+        fields = [field.name for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+        fields += [field for field in BLOB_FIELDS.get(label, ()) if field not in fields]
+        for field in fields:
+            rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            yield from rows.values_list(field, flat=True).iterator(chunk_size=2000)
+
+
+def referenced_paths():
+    """Return the set of ``MEDIA_ROOT`` paths something points to."""
+    from .models import ImageDerivative, ImageSource
+
+    referenced = set(_field_references())
+    referenced.update(_body_references())
+
+    hashes = {blob_sha256(path) for path in referenced} - {None}
+    for path, sha256 in ImageSource.objects.values_list('path', 'sha256').iterator(chunk_size=2000):
+        if path in referenced:
+            hashes.add(sha256)
+    for sha256, path in ImageDerivative.objects.values_list('sha256', 'path').iterator(chunk_size=2000):
+        if sha256 in hashes:
+            referenced.add(path)
+    return referenced
+
+
+def _scan(root, folder):
+    """Return ``(path, size, mtime)`` of the files below ``folder``, skipping dot entries."""
+    files, pending = [], [folder]
+    while pending:
+        current = pending.pop()
+        try:
+            entries = os.scandir(os.path.join(root, current))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                path = f'{current}/{entry.name}' if current else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat()
+                    files.append((path, stat.st_size, stat.st_mtime))
+    return files
+
+
+def scan(root):
+    """Return ``(path, size, mtime)`` of every file below ``root``, one worker per top-level folder.
+
+    Dot files and folders (chunked uploads, the quarantine, files being
+    saved) are skipped.
+    """
+    try:
+        with os.scandir(root) as entries:
+            entries = list(entries)
+    except FileNotFoundError:
+        return []
+    folders = [entry.name for entry in entries if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.')]
+    files = []
+    for entry in entries:
+        if entry.is_file(follow_symlinks=False) and not entry.name.startswith('.'):
+            stat = entry.stat()
+            files.append((entry.name, stat.st_size, stat.st_mtime))
+    if folders:
+        workers = min(getattr(settings, 'MEDIA_GC_WORKERS', 4), len(folders))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-gc') as pool:
+            for found in pool.map(lambda folder: _scan(root, folder), folders):
+                files.extend(found)
+    return files
+
+
+def _move(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(source, target)
+
+
+def _forget_rows(paths):
+    from .models import Blob, ImageDerivative, ImageSource
+
+    for model in (Blob, ImageDerivative, ImageSource):
+        model.objects.filter(path__in=paths).delete()
+
+
+def collect(dry_run=False):
+    """Quarantine unreferenced media files and delete those quarantined long enough.
+
+    With ``dry_run`` nothing is moved or deleted. Returns a ``GarbageReport``.
+    """
+    root = str(settings.MEDIA_ROOT)
+    quarantine = quarantine_dir()
+    cutoff = time.time() - grace_period()
+    referenced = referenced_paths()
+
+    quarantined = quarantined_bytes = restored = deleted = reclaimed = 0
+    for path, size, mtime in scan(root):
+        if path in referenced or mtime > cutoff:
+            continue
+        quarantined += 1
+        quarantined_bytes += size
+        if not dry_run:
+            target = os.path.join(quarantine, path)
+            _move(os.path.join(root, path), target)
+            # The grace period in quarantine starts now
+            os.utime(target)
+
+    removed = []
+    for path, size, mtime in scan(quarantine):
+        if path in referenced:
+            restored += 1
+            if not dry_run:
+                _move(os.path.join(quarantine, path), os.path.join(root, path))
+        elif mtime <= cutoff:
+            deleted += 1
+            reclaimed += size
+            if not dry_run:
+                os.remove(os.path.join(quarantine, path))
+                removed.append(path)
+    if removed:
+        _forget_rows(removed)
+        for path in removed:
+            images.forget(path)
+    return GarbageReport(quarantined, quarantined_bytes, restored, deleted, reclaimed)
@@ -0,0 +1,247 @@
+"""Responsive image derivatives generated off the request path.
+
+Saving a post, book or profile schedules its cover or avatar on a small
+worker pool once the transaction commits. The worker hashes the stored file
+and encodes it at each width of ``IMAGE_DERIVATIVE_WIDTHS`` (never wider
+than the source) in each format of ``IMAGE_DERIVATIVE_FORMATS``. The copies
+are stored under ``derivatives/<sha256>/`` and recorded in
+``ImageDerivative``, keyed by the hash of the source bytes: re-saving a model
+costs nothing, and uploading the same picture again only costs a hash.
+
+``{% responsive_image %}`` (``core_extras``) reads the derivatives of a file
+from the cache and renders the original file until they exist.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from . import pagecache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'images:derivatives:'
+CHUNK_SIZE = 64 * 1024
+
+# Image fields whose files get derivatives, by model label
+IMAGE_FIELDS = {
+    'blog.post': ('cover_image',),
+    'books.book': ('cover_image',),
+    'accounts.userprofile': ('avatar',),
+}
+
+# Pillow encoder name and file extension per derivative format
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+# srcsets: format -> [(url, width), ...] ordered by width
+Derivatives = namedtuple('Derivatives', ['width', 'height', 'srcsets'])
+
+_MISSING = 'missing'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Return the cache holding the derivative sets of image files."""
+    return caches[getattr(settings, 'IMAGE_DERIVATIVE_CACHE', 'default')]
+
+
+def _widths():
+    return sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (160, 320, 640, 960, 1280)))
+
+
+def _formats():
+    return getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', ('webp', 'jpeg'))
+
+
+def _path_hash(path):
+    return hashlib.sha1(path.encode('utf-8')).hexdigest()
+
+
+def dependency(path):
+    """Return the page-cache dependency of the derivatives of ``path``."""
+    return f'image:{_path_hash(path)}'
+
+
+def target_widths(source_width):
+    """Return the derivative widths of an image ``source_width`` pixels wide."""
+    widths = [width for width in _widths() if width < source_width]
+    widths.append(min(source_width, _widths()[-1]))
+    return sorted(set(widths))
+
+
+def derivative_path(sha256, width, format):
+    return f'derivatives/{sha256[:2]}/{sha256}/{width}.{FORMATS[format][1]}'
+
+
+def file_digest(path, storage=None):
+    """Return the SHA-256 of a stored file, read in chunks."""
+    storage = storage or default_storage
+    digest = hashlib.sha256()
+    with storage.open(path, 'rb') as source:
+        for chunk in iter(partial(source.read, CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(image, width, format):
+    height = max(round(image.height * width / image.width), 1)
+    resized = image.resize((width, height), Image.Resampling.LANCZOS) if width != image.width else image
+    if format == 'jpeg' or resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGB' if format == 'jpeg' or 'A' not in resized.getbands() else 'RGBA')
+    output = BytesIO()
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+    resized.save(output, FORMATS[format][0], quality=quality, optimize=format == 'jpeg')
+    return output.getvalue(), height
+
+
+def generate(path, force=False, storage=None):
+    """Create the derivatives of the stored image ``path``.
+
+    Nothing is encoded when the file was seen before with the same bytes,
+    or when another file with the same bytes already has its derivatives;
+    ``force`` encodes them again. Returns whether anything was written.
+    """
+    from .models import ImageDerivative, ImageSource
+
+    storage = storage or default_storage
+    sha256 = file_digest(path, storage)
+    source = ImageSource.objects.filter(path=path).first()
+    if source is not None and source.sha256 == sha256 and not force:
+        return False
+
+    with storage.open(path, 'rb') as source_file:
+        image = ImageOps.exif_transpose(Image.open(source_file))
+        image.load()
+
+    existing = set(ImageDerivative.objects.filter(sha256=sha256).values_list('format', 'width'))
+    for format in _formats():
+        for width in target_widths(image.width):
+            if (format, width) in existing and not force:
+                continue
+            content, height = _encode(image, width, format)
+            name = derivative_path(sha256, width, format)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(content))
+            ImageDerivative.objects.update_or_create(
+                sha256=sha256, format=format, width=width,
+                defaults={'height': height, 'path': name, 'size': len(content)},
+            )
+
+    ImageSource.objects.update_or_create(
+        path=path, defaults={'sha256': sha256, 'width': image.width, 'height': image.height},
+    )
+    forget(path)
+    return True
+
+
+def forget(path):
+    """Drop the cached derivatives of ``path`` and the pages showing it."""
+    get_image_cache().delete(f'{KEY_PREFIX}{_path_hash(path)}')
+    pagecache.invalidate([dependency(path)])
+
+
+def _load(path):
+    from .models import ImageDerivative, ImageSource
+
+    source = ImageSource.objects.filter(path=path).first()
+    if source is None:
+        return None
+    srcsets = {}
+    for derivative in ImageDerivative.objects.filter(sha256=source.sha256, format__in=_formats()):
+        srcsets.setdefault(derivative.format, []).append((default_storage.url(derivative.path), derivative.width))
+    if not srcsets:
+        return None
+    return Derivatives(source.width, source.height, srcsets)
+
+
+def lookup(path):
+    """Return the ``Derivatives`` of the stored image ``path``, or ``None`` while there are none."""
+    pagecache.depends_on(dependency(path))
+    cache = get_image_cache()
+    key = f'{KEY_PREFIX}{_path_hash(path)}'
+    derivatives = cache.get(key)
+    if derivatives is None:
+        derivatives = _load(path) or _MISSING
+        cache.set(key, derivatives, None)
+    return None if derivatives == _MISSING else derivatives
+
+
+def pending_paths(instance):
+    """Return the image files of ``instance`` that have no derivatives yet."""
+    paths = []
+    for field in IMAGE_FIELDS.get(instance._meta.label_lower, ()):
+        image = getattr(instance, field)
+        if image and lookup(image.name) is None:
+            paths.append(image.name)
+    return paths
+
+
+def _generate_all(paths):
+    for path in paths:
+        try:
+            generate(path)
+        except Exception:
+            logger.exception('Could not generate image derivatives of %s', path)
+
+
+def _run(paths):
+    try:
+        _generate_all(paths)
+    finally:
+        connections.close_all()
+
+
+def _executor_class():
+    # Under gevent ``threading`` is patched into greenlets, which would run
+    # the encoding on the worker's event loop; gevent's executor uses OS threads
+    try:
+        from gevent import monkey
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+    except ImportError:
+        return ThreadPoolExecutor
+    return NativeThreadPoolExecutor if monkey.is_module_patched('threading') else ThreadPoolExecutor
+
+
+def _submit(paths):
+    if not getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        _generate_all(paths)
+        return
+
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _executor_class()(
+                    max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+                    thread_name_prefix='image-derivatives',
+                )
+    _pool.submit(_run, paths)
+
+
+def schedule_paths(paths):
+    """Generate the derivatives of the stored images ``paths`` after the transaction commits."""
+    paths = list(paths)
+    if paths:
+        transaction.on_commit(partial(_submit, paths))
+
+
+def schedule(instance):
+    """Generate the missing derivatives of ``instance``'s images after the transaction commits."""
+    schedule_paths(pending_paths(instance))
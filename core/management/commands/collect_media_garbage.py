@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core.garbage import collect
+
+
+class Command(BaseCommand):
+    help = 'Quarantine media files nothing references and delete those quarantined past the grace period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be quarantined or deleted without touching files',
+        )
+
+    def handle(self, *args, **options):
+        report = collect(dry_run=options['dry_run'])
+
+        if options['dry_run']:
+            quarantine, restore, delete = 'Would quarantine', 'restore', 'Would delete'
+        else:
+            quarantine, restore, delete = 'Quarantined', 'restored', 'Deleted'
+        self.stdout.write(
+            f'{quarantine} {report.quarantined} files ({filesizeformat(report.quarantined_bytes)}), '
+            f'{restore} {report.restored}'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ {delete} {report.deleted} files, {filesizeformat(report.reclaimed)} reclaimed')
+        )
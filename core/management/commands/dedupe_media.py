@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core.storage import dedupe
+
+
+class Command(BaseCommand):
+    help = 'Move existing media files to content-addressed names and drop duplicate copies'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be moved without touching files or rows',
+        )
+
+    def handle(self, *args, **options):
+        report = dedupe(dry_run=options['dry_run'])
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ {verb} {report.renamed} files, {report.duplicates} duplicates, '
+                f'{filesizeformat(report.reclaimed)} reclaimed'
+            )
+        )
@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from core import images
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive derivatives of every cover and avatar whose bytes changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Encode every derivative again, e.g. after changing the widths or quality',
+        )
+
+    def handle(self, *args, **options):
+        paths = set()
+        for label, fields in images.IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field in fields:
+                paths.update(model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True))
+
+        generated = 0
+        for path in sorted(paths):
+            try:
+                generated += images.generate(path, force=options['force'])
+            except Exception as e:
+                self.stderr.write(f'{path}: {e}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Generated derivatives of {generated} of {len(paths)} images')
+        )
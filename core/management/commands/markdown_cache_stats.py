@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.rendering import render_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit and miss counters of the Markdown render and highlight caches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them',
+        )
+
+    def handle(self, *args, **options):
+        stats = render_stats()
+        for kind in ('render', 'highlight'):
+            hits = stats[f'{kind}_hits']
+            misses = stats[f'{kind}_misses']
+            total = hits + misses
+            ratio = f'{hits / total:.1%}' if total else 'n/a'
+            self.stdout.write(f'{kind}: {hits} hits, {misses} misses ({ratio} hit rate)')
+
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('✓ Counters reset'))
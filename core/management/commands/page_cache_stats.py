@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.pagecache import page_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit, miss, stale and bypass counters of the page cache per URL pattern'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them',
+        )
+
+    def handle(self, *args, **options):
+        stats = page_stats()
+        if not stats:
+            self.stdout.write('No page cache traffic recorded')
+        for name, counts in stats.items():
+            served = counts['hits'] + counts['misses'] + counts['stale']
+            ratio = f'{counts["hits"] / served:.1%}' if served else 'n/a'
+            self.stdout.write(
+                f'{name}: {counts["hits"]} hits, {counts["misses"]} misses, '
+                f'{counts["stale"]} stale, {counts["bypassed"]} bypassed ({ratio} hit rate)'
+            )
+
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('✓ Counters reset'))
@@ -0,0 +1,38 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import DOCUMENT_BUILDERS, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for posts, projects, books and notes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            help='Models to rebuild, e.g. blog.Post (default: all indexed models)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of objects indexed per batch',
+        )
+
+    def handle(self, *args, **options):
+        models = []
+        for label in options['models']:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError(f'Unknown model: {label}')
+            if model._meta.label_lower not in DOCUMENT_BUILDERS:
+                raise CommandError(f'{label} is not indexed for search')
+            models.append(model)
+
+        counts = rebuild_index(models or None, batch_size=options['batch_size'])
+        for label, count in counts.items():
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Indexed {count} {label} objects')
+            )
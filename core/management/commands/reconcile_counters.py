@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute category and tag counters and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted counters without fixing them',
+        )
+
+    def handle(self, *args, **options):
+        fixes = reconcile_counters(dry_run=options['dry_run'])
+        for description, stored, expected in fixes:
+            self.stdout.write(f'{description}: stored {stored}, expected {expected}')
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ {verb} {len(fixes)} drifted counters')
+        )
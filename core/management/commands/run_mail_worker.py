@@ -0,0 +1,56 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.outbox import drain, purge_sent
+
+
+class Command(BaseCommand):
+    help = 'Send the emails waiting in the outbox, polling for new ones until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of emails claimed and sent per batch',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds to wait between polls when the outbox is empty',
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        if not options['once']:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        while True:
+            close_old_connections()
+            result = drain(batch_size=options['batch_size'])
+            if any(result):
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'✓ Sent {result.sent} emails, {result.retried} to retry, {result.failed} failed'
+                    )
+                )
+            if options['once'] or self.stopping:
+                break
+            if not any(result):
+                purge_sent()
+                time.sleep(options['interval'])
+            if self.stopping:
+                break
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Object ID')),
+                ('kind', models.CharField(choices=[('post', 'Post'), ('project', 'Project'), ('book', 'Book'), ('note', 'Book Note')], max_length=20, verbose_name='Kind')),
+                ('title', models.CharField(max_length=300, verbose_name='Title')),
+                ('title_text', models.TextField(blank=True, verbose_name='Title Text')),
+                ('keywords', models.TextField(blank=True, verbose_name='Keywords')),
+                ('body', models.TextField(blank=True, verbose_name='Body')),
+                ('category', models.CharField(blank=True, max_length=100, verbose_name='Category')),
+                ('is_public', models.BooleanField(default=True, verbose_name='Public')),
+                ('published_at', models.DateTimeField(blank=True, null=True, verbose_name='Published At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Content Type')),
+            ],
+            options={
+                'verbose_name': 'Search Document',
+                'verbose_name_plural': 'Search Documents',
+                'indexes': [models.Index(fields=['kind', 'is_public'], name='core_search_kind_baf45e_idx')],
+                'unique_together': {('content_type', 'object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:53
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+COUNTED_MODELS = [
+    ('blog', 'post', 'category', 'published_post_count'),
+    ('books', 'book', 'bookcategory', 'published_book_count'),
+]
+
+
+def populate_counters(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagUsage = apps.get_model('core', 'TagUsage')
+    for app_label, model_name, category_name, counter_field in COUNTED_MODELS:
+        Model = apps.get_model(app_label, model_name)
+        Category = apps.get_model(app_label, category_name)
+        related_name = Model._meta.get_field('category').remote_field.related_name
+        for category in Category.objects.annotate(
+            total=Count(related_name, filter=Q(**{f'{related_name}__is_published': True}))
+        ):
+            Category.objects.filter(pk=category.pk).update(**{counter_field: category.total})
+
+        content_type = ContentType.objects.filter(app_label=app_label, model=model_name).first()
+        if content_type is None:
+            continue
+        rows = (
+            TaggedItem.objects.filter(
+                content_type=content_type,
+                object_id__in=Model.objects.filter(is_published=True).values('pk'),
+            )
+            .values_list('tag_id')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        TagUsage.objects.bulk_create([
+            TagUsage(tag_id=tag_id, content_type=content_type, published_count=total)
+            for tag_id, total in rows
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('core', '0002_searchdocument'),
+        ('blog', '0006_published_counts'),
+        ('books', '0002_published_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('published_count', models.PositiveIntegerField(default=0, verbose_name='Published Count')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Content Type')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='taggit.tag', verbose_name='Tag')),
+            ],
+            options={
+                'verbose_name': 'Tag Usage',
+                'verbose_name_plural': 'Tag Usages',
+                'indexes': [models.Index(fields=['content_type', '-published_count'], name='core_tagusa_content_fdf983_idx')],
+                'unique_together': {('tag', 'content_type')},
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
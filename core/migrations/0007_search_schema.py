@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:16
+
+from django.db import migrations, models
+
+
+class PostgresRunSQL(migrations.RunSQL):
+    """``RunSQL`` applied on PostgreSQL only."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+# core.search.POSTGRES_VECTOR at the time of this migration. IF NOT EXISTS
+# keeps sites whose index the old post_migrate hook created.
+CREATE_VECTOR_INDEX = (
+    "CREATE INDEX IF NOT EXISTS core_searchdocument_vector_gin ON core_searchdocument USING GIN (("
+    "setweight(to_tsvector('simple', coalesce(title_text, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(keywords, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(body, '')), 'C')"
+    "))"
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchdocument',
+            name='display_body',
+            field=models.TextField(blank=True, verbose_name='Display Body'),
+        ),
+        PostgresRunSQL(
+            CREATE_VECTOR_INDEX,
+            reverse_sql='DROP INDEX IF EXISTS core_searchdocument_vector_gin',
+        ),
+    ]
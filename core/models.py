@@ -1,3 +1,5 @@
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
@@ -20,6 +22,12 @@ class Project(models.Model):
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
 
+    # Fields a project card renders; list pages load nothing else
+    CARD_FIELDS = (
+        'id', 'title', 'slug', 'short_description', 'image', 'technologies',
+        'github_url', 'live_url', 'is_featured', 'order', 'created_at',
+    )
+
     class Meta:
         verbose_name = _('Project')
         verbose_name_plural = _('Projects')
@@ -225,4 +233,156 @@ class Announcement(models.Model):
         now = timezone.now()
         if self.end_date <= now:
             return None
-        return self.end_date - now
\ No newline at end of file
+        return self.end_date - now
+
+
+class SearchDocument(models.Model):
+    """Denormalized full-text search entry for an indexed object."""
+    KIND_CHOICES = [
+        ('post', _('Post')),
+        ('project', _('Project')),
+        ('book', _('Book')),
+        ('note', _('Book Note')),
+    ]
+    
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name=_('Content Type'))
+    object_id = models.PositiveBigIntegerField(_('Object ID'))
+    content_object = GenericForeignKey('content_type', 'object_id')
+    kind = models.CharField(_('Kind'), max_length=20, choices=KIND_CHOICES)
+    title = models.CharField(_('Title'), max_length=300)
+    
+    # Normalized text used for matching and ranking
+    title_text = models.TextField(_('Title Text'), blank=True)
+    keywords = models.TextField(_('Keywords'), blank=True)
+    body = models.TextField(_('Body'), blank=True)
+    
+    # The body as written, for result snippets
+    display_body = models.TextField(_('Display Body'), blank=True)
+    
+    category = models.CharField(_('Category'), max_length=100, blank=True)
+    is_public = models.BooleanField(_('Public'), default=True)
+    published_at = models.DateTimeField(_('Published At'), blank=True, null=True)
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Search Document')
+        verbose_name_plural = _('Search Documents')
+        unique_together = [('content_type', 'object_id')]
+        indexes = [
+            models.Index(fields=['kind', 'is_public']),
+        ]
+    
+    def __str__(self):
+        return f'{self.kind}: {self.title}'
+
+
+class TagUsage(models.Model):
+    """Number of published objects of one content type using a tag."""
+    tag = models.ForeignKey('taggit.Tag', on_delete=models.CASCADE, related_name='usages', verbose_name=_('Tag'))
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name=_('Content Type'))
+    published_count = models.PositiveIntegerField(_('Published Count'), default=0)
+    
+    class Meta:
+        verbose_name = _('Tag Usage')
+        verbose_name_plural = _('Tag Usages')
+        unique_together = [('tag', 'content_type')]
+        indexes = [
+            models.Index(fields=['content_type', '-published_count']),
+        ]
+    
+    def __str__(self):
+        return f'{self.tag} ({self.content_type.model}): {self.published_count}'
+
+
+class ImageSource(models.Model):
+    """Content hash and dimensions of a stored image that has derivatives."""
+    path = models.CharField(_('Path'), max_length=255, unique=True)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, db_index=True)
+    width = models.PositiveIntegerField(_('Width'))
+    height = models.PositiveIntegerField(_('Height'))
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Image Source')
+        verbose_name_plural = _('Image Sources')
+    
+    def __str__(self):
+        return self.path
+
+
+class ImageDerivative(models.Model):
+    """Resized copy of an image, shared by every stored file with the same bytes."""
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+    
+    sha256 = models.CharField(_('Source SHA-256'), max_length=64)
+    format = models.CharField(_('Format'), max_length=10, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField(_('Width'))
+    height = models.PositiveIntegerField(_('Height'))
+    path = models.CharField(_('Path'), max_length=255)
+    size = models.PositiveIntegerField(_('Size'))
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Image Derivative')
+        verbose_name_plural = _('Image Derivatives')
+        unique_together = [('sha256', 'format', 'width')]
+        ordering = ['sha256', 'format', 'width']
+    
+    def __str__(self):
+        return self.path
+
+
+class Blob(models.Model):
+    """File of the content-addressed media storage and the number of rows using it."""
+    path = models.CharField(_('Path'), max_length=255, unique=True)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(_('Size'), default=0)
+    ref_count = models.IntegerField(_('Reference Count'), default=0)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Blob')
+        verbose_name_plural = _('Blobs')
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.path} ({self.ref_count})'
+
+
+class OutboundEmail(models.Model):
+    """Email waiting in the outbox for the mail worker, written with the change that caused it."""
+    STATUS_CHOICES = [
+        ('pending', _('Pending')),
+        ('sent', _('Sent')),
+        ('failed', _('Failed')),
+    ]
+    
+    subject = models.CharField(_('Subject'), max_length=255)
+    body = models.TextField(_('Body'))
+    html_body = models.TextField(_('HTML Body'), blank=True)
+    from_email = models.CharField(_('From'), max_length=255)
+    recipients = models.JSONField(_('Recipients'), default=list)
+    dedupe_key = models.CharField(_('Dedupe Key'), max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(_('Status'), max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(_('Attempts'), default=0)
+    next_attempt_at = models.DateTimeField(_('Next Attempt At'), default=timezone.now)
+    last_error = models.TextField(_('Last Error'), blank=True)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    sent_at = models.DateTimeField(_('Sent At'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Outbound Email')
+        verbose_name_plural = _('Outbound Emails')
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.subject} → {", ".join(self.recipients)}'
@@ -0,0 +1,146 @@
+"""Transactional outbox for outgoing email.
+
+Views and signal receivers never talk to the SMTP server. ``enqueue()``
+writes an ``OutboundEmail`` row in the current transaction, so the email
+exists exactly when the change that caused it commits, and a request is
+never held up by a slow mail host. ``dedupe_key`` makes enqueueing the same
+email twice (a repeated signal, a retried request) a no-op.
+
+The ``run_mail_worker`` command drains the outbox in batches over a single
+reused connection of ``OUTBOX_EMAIL_BACKEND``. Failed sends are retried
+with exponential backoff and marked failed after ``OUTBOX_MAX_ATTEMPTS``.
+"""
+
+import logging
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Claimed rows are hidden from other workers for this long while they are sent
+LEASE = timedelta(minutes=5)
+
+DrainResult = namedtuple('DrainResult', ['sent', 'retried', 'failed'])
+
+
+def _max_attempts():
+    return getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+
+
+def backoff(attempts):
+    """Return the delay before retry number ``attempts``."""
+    base = getattr(settings, 'OUTBOX_RETRY_BACKOFF', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), getattr(settings, 'OUTBOX_RETRY_BACKOFF_MAX', 60 * 60 * 6)))
+
+
+def enqueue(subject, body, recipients, from_email=None, html_body='', dedupe_key=None):
+    """Add an email to the outbox in the current transaction and return its row.
+
+    Returns the existing row when an email with ``dedupe_key`` was already
+    enqueued.
+    """
+    from .models import OutboundEmail
+
+    fields = {
+        'subject': str(subject),
+        'body': str(body),
+        'html_body': html_body,
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+        'recipients': list(recipients),
+    }
+    if dedupe_key is None:
+        return OutboundEmail.objects.create(**fields)
+    email, created = OutboundEmail.objects.get_or_create(dedupe_key=dedupe_key, defaults=fields)
+    return email
+
+
+def _claim(batch_size):
+    from .models import OutboundEmail
+
+    now = timezone.now()
+    with transaction.atomic():
+        due = (
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        emails = list(due)
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(next_attempt_at=now + LEASE)
+    return emails
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject, email.body, email.from_email, email.recipients, connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def send_batch(connection, batch_size=50):
+    """Send one batch of due emails over ``connection``; return a ``DrainResult``."""
+    from .models import OutboundEmail
+
+    sent = retried = failed = 0
+    for email in _claim(batch_size):
+        email.attempts += 1
+        try:
+            # Opens the connection once and keeps it for the following emails
+            connection.open()
+            _message(email, connection).send()
+        except Exception as error:
+            logger.warning('Could not send outbound email %s: %s', email.pk, error)
+            # Reconnect for the next email in case the connection broke
+            connection.close()
+            email.last_error = str(error)
+            if email.attempts >= _max_attempts():
+                email.status = 'failed'
+                failed += 1
+            else:
+                email.next_attempt_at = timezone.now() + backoff(email.attempts)
+                retried += 1
+        else:
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            sent += 1
+        OutboundEmail.objects.filter(pk=email.pk).update(
+            status=email.status, attempts=email.attempts, next_attempt_at=email.next_attempt_at,
+            last_error=email.last_error, sent_at=email.sent_at,
+        )
+    return DrainResult(sent, retried, failed)
+
+
+def get_outbox_connection():
+    """Return a connection of the backend the worker delivers with."""
+    return get_connection(getattr(settings, 'OUTBOX_EMAIL_BACKEND', None))
+
+
+def drain(batch_size=50, connection=None):
+    """Send every due email in batches over one connection; return the totals."""
+    connection = connection or get_outbox_connection()
+    totals = [0, 0, 0]
+    try:
+        while True:
+            result = send_batch(connection, batch_size)
+            totals = [total + count for total, count in zip(totals, result)]
+            if sum(result) < batch_size:
+                break
+    finally:
+        connection.close()
+    return DrainResult(*totals)
+
+
+def purge_sent(older_than=None):
+    """Delete sent emails older than ``OUTBOX_RETENTION``; return how many."""
+    from .models import OutboundEmail
+
+    retention = older_than or timedelta(seconds=getattr(settings, 'OUTBOX_RETENTION', 60 * 60 * 24 * 30))
+    deleted, _ = OutboundEmail.objects.filter(status='sent', sent_at__lt=timezone.now() - retention).delete()
+    return deleted
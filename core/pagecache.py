@@ -0,0 +1,430 @@
+"""Dependency-tracked full-page cache for anonymous visitors.
+
+Views opt in with ``cached_page()``. A cached page is keyed by host, path
+(which carries the ``i18n_patterns`` language prefix), active language and
+the allowed query parameters. While the page renders, every instance of a
+tracked model that is loaded and every query touching a tracked table is
+recorded as a dependency: ``'blog.post:42'`` for an instance and
+``'blog.post'`` for the table as a whole.
+
+Saving or deleting a tracked object stamps its dependencies with the
+current time; a cached page is stale once any of its dependencies was
+stamped after it started rendering. Content edits only stamp the instance,
+so only the pages that showed it are re-rendered. Creating or deleting
+rows, or changing a field that decides which rows a list shows or in which
+order, also stamps the table.
+
+Hit, miss, stale and bypass counters are kept per URL pattern; see
+``page_stats()`` and ``page_cache_stats``.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import namedtuple
+from contextlib import ExitStack
+from functools import partial, wraps
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.middleware.csrf import CSRF_TOKEN_LENGTH, _unmask_cipher_token, get_token
+from django.template.response import SimpleTemplateResponse
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+from django.utils.http import urlencode
+from django.utils.translation import get_language
+
+KEY_PREFIX = 'pagecache:'
+STATS_KEYS = ('hits', 'misses', 'stale', 'bypassed')
+CSRF_PLACEHOLDER = b'__page_cache_csrf_token__'
+CSRF_TOKEN_RE = re.compile(rb'(?<![A-Za-z0-9])[A-Za-z0-9]{%d}(?![A-Za-z0-9])' % CSRF_TOKEN_LENGTH)
+SKIPPED_HEADERS = {'content-length', 'set-cookie'}
+
+# fields: changing one of them can change which rows a list shows or their
+#   order, so it invalidates every page that queried the table.
+# cascade: tables whose pages go stale with it (e.g. denormalized counters
+#   updated with ``QuerySet.update()``).
+# parents: foreign keys of owned rows such as comments; those only
+#   invalidate the page of their parent and are not tracked themselves.
+# schedule: returns when rows will appear or disappear without a save.
+Tracked = namedtuple('Tracked', ['fields', 'cascade', 'parents', 'schedule'], defaults=((), (), (), None))
+
+
+def _next_scheduled_post(now):
+    from blog.models import Post
+
+    return Post.objects.next_scheduled_at()
+
+
+def _next_announcement_change(now):
+    from .models import Announcement
+
+    active = Announcement.objects.filter(is_active=True, show_on_all_pages=True)
+    changes = [
+        active.filter(start_date__gt=now).order_by('start_date').values_list('start_date', flat=True).first(),
+        active.filter(end_date__gt=now).order_by('end_date').values_list('end_date', flat=True).first(),
+    ]
+    return min((change for change in changes if change), default=None)
+
+
+TRACKED_MODELS = {
+    'blog.post': Tracked(
+        fields=('is_published', 'is_featured', 'published_at', 'category_id'),
+        cascade=('blog.category', 'taggit.tag'),
+        schedule=_next_scheduled_post,
+    ),
+    'blog.category': Tracked(fields=('name',)),
+    'blog.comment': Tracked(parents=('post',)),
+    'taggit.tag': Tracked(fields=('name',)),
+    'core.project': Tracked(fields=('is_featured', 'order')),
+    'core.announcement': Tracked(
+        fields=('is_active', 'show_on_all_pages', 'start_date', 'end_date', 'priority'),
+        schedule=_next_announcement_change,
+    ),
+    'core.sitesettings': Tracked(),
+    'books.book': Tracked(
+        fields=('is_published', 'is_featured', 'category_id', 'status', 'rating', 'title', 'author'),
+        cascade=('books.bookcategory', 'taggit.tag'),
+    ),
+    'books.bookcategory': Tracked(fields=('name',)),
+    'books.booknote': Tracked(parents=('book',)),
+}
+
+_local = threading.local()
+_tables = {}
+
+
+def get_page_cache():
+    """Return the cache used for pages, dependency stamps and counters."""
+    return caches[getattr(settings, 'PAGE_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60 * 6)
+
+
+# Dependencies ------------------------------------------------------------
+
+def _tracked(model):
+    return TRACKED_MODELS.get(model._meta.label_lower)
+
+
+def is_tracked(model):
+    return model._meta.label_lower in TRACKED_MODELS
+
+
+def instance_dependency(instance):
+    return f'{instance._meta.label_lower}:{instance.pk}'
+
+
+def _tracked_tables(connection):
+    """Return ``{quoted table name: label}`` of tracked, non-owned models."""
+    if connection.vendor not in _tables:
+        _tables[connection.vendor] = {
+            connection.ops.quote_name(apps.get_model(label)._meta.db_table): label
+            for label, tracked in TRACKED_MODELS.items()
+            if not tracked.parents
+        }
+    return _tables[connection.vendor]
+
+
+class _Capture:
+    """Dependencies and hit callbacks collected while a page renders."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.dependencies = set()
+        self.callbacks = []
+
+    def track_query(self, execute, sql, params, many, context):
+        for table, label in _tracked_tables(context['connection']).items():
+            if table in sql:
+                self.dependencies.add(label)
+        return execute(sql, params, many, context)
+
+    def expires_in(self):
+        """Return the lifetime of the page, bounded by scheduled changes."""
+        timeout = _timeout()
+        now = timezone.now()
+        for label in self.dependencies:
+            tracked = TRACKED_MODELS.get(label)
+            if tracked and tracked.schedule:
+                change = tracked.schedule(now)
+                if change is not None:
+                    timeout = min(timeout, max(int((change - now).total_seconds()) + 1, 1))
+        return timeout
+
+
+def _current_capture():
+    return getattr(_local, 'capture', None)
+
+
+def track_instance(instance):
+    """Record ``instance`` as a dependency of the page being rendered."""
+    capture = _current_capture()
+    if capture is None or instance.pk is None:
+        return
+    tracked = _tracked(instance)
+    if tracked is not None and not tracked.parents:
+        capture.dependencies.add(instance_dependency(instance))
+
+
+def depends_on(*dependencies):
+    """Record dependencies of the page being rendered that were not loaded from the DB."""
+    capture = _current_capture()
+    if capture is not None:
+        capture.dependencies.update(dependencies)
+
+
+def replay_on_hit(func, *args):
+    """Call ``func(*args)`` again whenever the page being rendered is served from cache.
+
+    Used for side effects of a view, such as counting a post view. Outside
+    a cached render this does nothing; ``func`` must be importable.
+    """
+    capture = _current_capture()
+    if capture is not None:
+        capture.callbacks.append((func, args))
+
+
+# Invalidation ------------------------------------------------------------
+
+def _stamp(dependencies):
+    now = time.time()
+    get_page_cache().set_many(
+        {f'{KEY_PREFIX}dep:{dependency}': now for dependency in dependencies},
+        _timeout(),
+    )
+
+
+def invalidate(dependencies):
+    """Mark every page depending on ``dependencies`` as stale.
+
+    The stamp is written right away and again when the transaction commits,
+    so a page rendered from the old rows in between is not kept either.
+    """
+    dependencies = set(dependencies)
+    if not dependencies:
+        return
+    _stamp(dependencies)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(_stamp, dependencies))
+
+
+def _stored_fields(instance, fields):
+    if not fields or instance._state.adding or instance.pk is None:
+        return None
+    return type(instance)._default_manager.filter(pk=instance.pk).values_list(*fields).first()
+
+
+def remember_state(instance):
+    """Remember the list-affecting fields of ``instance`` before it is saved."""
+    instance._page_cache_state = _stored_fields(instance, _tracked(instance).fields)
+
+
+def _dependencies(instance, collection):
+    tracked = _tracked(instance)
+    dependencies = set()
+    for field in tracked.parents:
+        parent = type(instance)._meta.get_field(field).related_model
+        dependencies.add(f'{parent._meta.label_lower}:{getattr(instance, f"{field}_id")}')
+    if tracked.parents:
+        return dependencies
+    dependencies.add(instance_dependency(instance))
+    if collection:
+        dependencies.add(instance._meta.label_lower)
+        dependencies.update(tracked.cascade)
+    return dependencies
+
+
+def invalidate_saved(instance, created):
+    tracked = _tracked(instance)
+    changed = created
+    if not changed and tracked.fields:
+        previous = getattr(instance, '_page_cache_state', None)
+        current = tuple(getattr(instance, field) for field in tracked.fields)
+        changed = previous is None or tuple(previous) != current
+    invalidate(_dependencies(instance, changed))
+
+
+def invalidate_deleted(instance):
+    invalidate(_dependencies(instance, True))
+
+
+def invalidate_tags(instance):
+    """Invalidate after the tags of ``instance`` changed."""
+    dependencies = {'taggit.tag'}
+    if is_tracked(type(instance)):
+        dependencies.add(instance_dependency(instance))
+    invalidate(dependencies)
+
+
+# Serving -----------------------------------------------------------------
+
+def page_key(request):
+    query = urlencode(sorted((name, value) for name in request.GET for value in request.GET.getlist(name)))
+    raw = '\n'.join([request.get_host(), request.path, get_language() or '', query])
+    return f'{KEY_PREFIX}page:{hashlib.sha256(raw.encode("utf-8")).hexdigest()}'
+
+
+def _view_name(request, view_func):
+    match = getattr(request, 'resolver_match', None)
+    return (match and match.view_name) or view_func.__qualname__
+
+
+def _is_cacheable_request(request, query_params):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if any(name not in query_params for name in request.GET):
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return False
+    return not len(get_messages(request))
+
+
+def _is_cacheable_response(response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    cache_control = response.get('Cache-Control', '')
+    return 'private' not in cache_control and 'no-store' not in cache_control
+
+
+def _strip_csrf_tokens(request, content):
+    """Replace the visitor's CSRF tokens in ``content`` with a placeholder."""
+    secret = request.META.get('CSRF_COOKIE')
+    if not secret or not request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return content
+
+    def replace(match):
+        token = match.group(0).decode('ascii')
+        return CSRF_PLACEHOLDER if _unmask_cipher_token(token) == secret else match.group(0)
+    return CSRF_TOKEN_RE.sub(replace, content)
+
+
+def _is_fresh(cache, entry):
+    stamps = cache.get_many([f'{KEY_PREFIX}dep:{dependency}' for dependency in entry['dependencies']])
+    return all(stamp < entry['started'] for stamp in stamps.values())
+
+
+def _serve(request, entry):
+    content = entry['content']
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode('ascii'))
+    response = HttpResponse(content, status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    response['X-Page-Cache'] = 'hit'
+    for func, args in entry['callbacks']:
+        func(*args)
+    return response
+
+
+def _render(view_func, request, args, kwargs):
+    capture = _Capture()
+    _local.capture = capture
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(capture.track_query))
+            response = view_func(request, *args, **kwargs)
+            if isinstance(response, SimpleTemplateResponse) and not response.is_rendered:
+                response.render()
+    finally:
+        _local.capture = None
+    return response, capture
+
+
+def cached_page(query_params=()):
+    """Serve anonymous GET requests of a view from the page cache.
+
+    Requests carrying a query parameter outside ``query_params`` bypass the
+    cache, as do logged-in users and visitors with pending messages.
+    """
+    query_params = frozenset(query_params)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not getattr(settings, 'PAGE_CACHE_ENABLED', True):
+                return view_func(request, *args, **kwargs)
+            name = _view_name(request, view_func)
+            if not _is_cacheable_request(request, query_params):
+                _count(name, 'bypassed')
+                return view_func(request, *args, **kwargs)
+
+            cache = get_page_cache()
+            key = page_key(request)
+            entry = cache.get(key)
+            if entry is not None and _is_fresh(cache, entry):
+                _count(name, 'hits')
+                return _serve(request, entry)
+            _count(name, 'stale' if entry is not None else 'misses')
+
+            response, capture = _render(view_func, request, args, kwargs)
+            if _is_cacheable_response(response):
+                cache.set(key, {
+                    'content': _strip_csrf_tokens(request, response.content),
+                    'status': response.status_code,
+                    'headers': [
+                        (header, value) for header, value in response.items()
+                        if header.lower() not in SKIPPED_HEADERS
+                    ],
+                    'dependencies': sorted(capture.dependencies),
+                    'callbacks': capture.callbacks,
+                    'started': capture.started,
+                }, capture.expires_in())
+                response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
+
+
+# Stats -------------------------------------------------------------------
+
+def _stats_key(name, kind):
+    return f'{KEY_PREFIX}stats:{name}:{kind}'
+
+
+def _count(name, kind):
+    cache = get_page_cache()
+    key = _stats_key(name, kind)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def _view_names(patterns=None, namespace=''):
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from _view_names(pattern.url_patterns, prefix)
+        elif pattern.name:
+            yield namespace + pattern.name
+
+
+def page_stats():
+    """Return ``{view name: {kind: count}}`` for URL patterns with traffic."""
+    names = sorted(set(_view_names()))
+    found = get_page_cache().get_many([_stats_key(name, kind) for name in names for kind in STATS_KEYS])
+    stats = {}
+    for name in names:
+        counts = {kind: found.get(_stats_key(name, kind), 0) for kind in STATS_KEYS}
+        if any(counts.values()):
+            stats[name] = counts
+    return stats
+
+
+def reset_stats():
+    """Reset the per-pattern counters."""
+    names = set(_view_names())
+    get_page_cache().delete_many([_stats_key(name, kind) for name in names for kind in STATS_KEYS])
@@ -0,0 +1,310 @@
+"""Keyset (cursor) pagination.
+
+Pages are fetched with ``WHERE (ordering columns) after (cursor values)``
+instead of ``OFFSET``, so deep pages cost the same as the first one and no
+``COUNT(*)`` is needed. Cursors are opaque, signed tokens passed in the usual
+``?page=`` parameter.
+
+``CursorPage`` mimics ``django.core.paginator.Page`` so the existing
+``page_obj``/``is_paginated`` templates keep working:
+
+* ``next_page_number()``/``previous_page_number()`` return cursors.
+* ``paginator.page_range`` is empty, so no numbered links are rendered.
+* ``?page=1`` is the first page and ``?page=last`` the last page.
+* Other numeric values still work as offsets, so old links do not break.
+
+With ``approximate_count=True`` the total is counted once and cached for
+``PAGINATION_COUNT_TIMEOUT`` seconds, so ``paginator.count`` and
+``num_pages`` are available without a ``COUNT(*)`` on every request.
+"""
+
+import collections.abc
+import hashlib
+import math
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage
+from django.db.models import F, Q
+
+CURSOR_SALT = 'core.pagination.cursor'
+LAST = 'last'
+
+
+class CursorPaginator:
+    """Paginate a queryset by keyset over its ordering columns.
+
+    ``ordering`` defaults to the queryset's explicit ordering, then the
+    model's ``Meta.ordering``. The primary key is appended as a tie-breaker
+    when it is not already part of it. Only columns of the model itself (or
+    annotations) can be used.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None, approximate_count=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.approximate_count = approximate_count
+        self.ordering = self._resolve_ordering(
+            queryset.query.order_by or ordering or queryset.model._meta.ordering
+        )
+        self.fingerprint = hashlib.md5(repr(self.ordering).encode('utf-8')).hexdigest()[:8]
+        self._count = None
+
+    # Ordering ------------------------------------------------------------
+
+    def _resolve_ordering(self, ordering):
+        pk_name = self.queryset.model._meta.pk.name
+        resolved = []
+        for item in ordering:
+            if not isinstance(item, str):
+                raise ValueError('Cursor pagination only supports field names in ordering.')
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            if name == 'pk':
+                name = pk_name
+            if '__' in name or name == '?':
+                raise ValueError(f'Cannot paginate by cursor on "{item}".')
+            resolved.append((name, descending, self._field(name)))
+        if pk_name not in [name for name, _, _ in resolved]:
+            descending = resolved[-1][1] if resolved else False
+            resolved.append((pk_name, descending, self._field(pk_name)))
+        return tuple(resolved)
+
+    def _field(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            annotation = self.queryset.query.annotations.get(name)
+            if annotation is None:
+                raise ValueError(f'Cannot paginate by cursor on unknown field "{name}".')
+            return annotation.output_field
+
+    @staticmethod
+    def _nullable(field):
+        return getattr(field, 'null', False)
+
+    def _order_by(self, reverse=False):
+        expressions = []
+        for name, descending, field in self.ordering:
+            if reverse:
+                descending = not descending
+            if self._nullable(field):
+                # NULLs always sort last going forward, first going back
+                expression = F(name).desc if descending else F(name).asc
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+                expressions.append(expression(**nulls))
+            else:
+                expressions.append(f'-{name}' if descending else name)
+        return expressions
+
+    def _keyset(self, values, reverse=False):
+        """Return a ``Q`` selecting rows after (or before) ``values``."""
+        condition = None
+        for (name, descending, field), value in reversed(list(zip(self.ordering, values))):
+            nullable = self._nullable(field)
+            if value is None:
+                beyond = Q(**{f'{name}__isnull': False}) if reverse else None
+                equal = Q(**{f'{name}__isnull': True})
+            else:
+                lookup = 'gt' if descending == reverse else 'lt'
+                beyond = Q(**{f'{name}__{lookup}': value})
+                if nullable and not reverse:
+                    beyond |= Q(**{f'{name}__isnull': True})
+                equal = Q(**{name: value})
+            if condition is None:
+                condition = beyond
+            else:
+                tail = equal & condition
+                condition = tail if beyond is None else beyond | tail
+        return condition if condition is not None else Q(pk__in=[])
+
+    # Cursors -------------------------------------------------------------
+
+    def _values(self, obj):
+        return [getattr(obj, name) for name, _, _ in self.ordering]
+
+    @staticmethod
+    def _serialize(value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+    def encode_cursor(self, obj, direction, number):
+        values = [self._serialize(value) for value in self._values(obj)]
+        return signing.dumps(
+            {'o': self.fingerprint, 'd': direction, 'v': values, 'n': number},
+            salt=CURSOR_SALT,
+            compress=True,
+        )
+
+    def decode_cursor(self, cursor):
+        """Return ``(direction, values, number)`` or ``None`` if invalid."""
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            if data['o'] != self.fingerprint or data['d'] not in ('next', 'prev'):
+                return None
+            values = [
+                None if value is None else field.to_python(value)
+                for (_, _, field), value in zip(self.ordering, data['v'], strict=True)
+            ]
+            return data['d'], values, data.get('n')
+        except (signing.BadSignature, KeyError, TypeError, ValueError, ValidationError):
+            return None
+
+    # Counting ------------------------------------------------------------
+
+    @property
+    def count(self):
+        """Approximate total, or ``None`` when counting is disabled."""
+        if not self.approximate_count:
+            return None
+        if self._count is None:
+            try:
+                sql = str(self.queryset.query)
+            except EmptyResultSet:
+                self._count = 0
+                return self._count
+            key = 'pagination:count:' + hashlib.md5(sql.encode('utf-8')).hexdigest()
+            self._count = cache.get_or_set(
+                key, self.queryset.count, getattr(settings, 'PAGINATION_COUNT_TIMEOUT', 300)
+            )
+        return self._count
+
+    @property
+    def num_pages(self):
+        """Page count when the total is known, otherwise the ``last`` token."""
+        if self.count is None:
+            return LAST
+        return max(1, math.ceil(self.count / self.per_page))
+
+    @property
+    def page_range(self):
+        return []
+
+    # Pages ---------------------------------------------------------------
+
+    def get_page(self, cursor):
+        """Return the page for a cursor, ``last``, a page number or nothing.
+
+        Invalid or tampered cursors fall back to the first page.
+        """
+        cursor = str(cursor or '').strip()
+        if cursor == LAST:
+            return self._last_page()
+        if cursor.isdigit():
+            number = int(cursor)
+            if number <= 1:
+                return self._first_page()
+            if self.count is not None and number >= self.num_pages:
+                return self._last_page()
+            return self._offset_page(number)
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self._first_page()
+        direction, values, number = decoded
+        if direction == 'prev':
+            return self._page_before(values, number)
+        return self._page_after(values, number)
+
+    def _fetch(self, queryset):
+        rows = list(queryset[:self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def _first_page(self):
+        rows, more = self._fetch(self.queryset.order_by(*self._order_by()))
+        return CursorPage(rows, 1, self, has_previous=False, has_next=more)
+
+    def _last_page(self):
+        rows, more = self._fetch(self.queryset.order_by(*self._order_by(reverse=True)))
+        number = self.num_pages if self.count is not None else None
+        if not more:
+            number = 1
+        return CursorPage(rows[::-1], number, self, has_previous=more, has_next=False)
+
+    def _offset_page(self, number):
+        queryset = self.queryset.order_by(*self._order_by())
+        offset = (number - 1) * self.per_page
+        rows = list(queryset[offset:offset + self.per_page + 1])
+        if not rows:
+            return self._last_page()
+        return CursorPage(rows[:self.per_page], number, self, has_previous=True, has_next=len(rows) > self.per_page)
+
+    def _page_after(self, values, number):
+        queryset = self.queryset.order_by(*self._order_by()).filter(self._keyset(values))
+        rows, more = self._fetch(queryset)
+        if not rows:
+            return self._last_page()
+        return CursorPage(rows, number, self, has_previous=True, has_next=more)
+
+    def _page_before(self, values, number):
+        queryset = self.queryset.order_by(*self._order_by(reverse=True)).filter(self._keyset(values, reverse=True))
+        rows, more = self._fetch(queryset)
+        if not rows:
+            return self._first_page()
+        if not more:
+            number = 1
+        return CursorPage(rows[::-1], number, self, has_previous=more, has_next=True)
+
+
+class CursorPage(collections.abc.Sequence):
+    """A page of a ``CursorPaginator``, compatible with ``Page`` templates."""
+
+    def __init__(self, object_list, number, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f'<CursorPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def _neighbour_number(self, step):
+        return self.number + step if self.number is not None else None
+
+    def next_page_number(self):
+        """Return the cursor of the next page."""
+        if not self._has_next:
+            raise EmptyPage('That page contains no results')
+        return self.paginator.encode_cursor(self.object_list[-1], 'next', self._neighbour_number(1))
+
+    def previous_page_number(self):
+        """Return the cursor of the previous page."""
+        if not self._has_previous:
+            raise EmptyPage('That page number is less than 1')
+        return self.paginator.encode_cursor(self.object_list[0], 'prev', self._neighbour_number(-1))
+
+
+class CursorPaginationMixin:
+    """Use ``CursorPaginator`` in a ``ListView``."""
+    cursor_ordering = None
+    approximate_count = False
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(
+            queryset,
+            page_size,
+            ordering=self.cursor_ordering,
+            approximate_count=self.approximate_count,
+        )
+        page = paginator.get_page(self.request.GET.get(self.page_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
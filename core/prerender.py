@@ -0,0 +1,123 @@
+"""Pre-rendered documents served with conditional GET.
+
+Documents such as feeds and sitemaps are rendered once, stored with a
+gzip-compressed copy, a strong ETag per encoding and a Last-Modified date,
+and served from the cache until their scope is invalidated. Requests
+carrying a matching ``If-None-Match`` or ``If-Modified-Since`` get a
+``304 Not Modified`` without touching the database.
+
+Each scope (``'feeds'``, ``'sitemaps'``) has a generation number in the
+cache; ``invalidate(scope)`` bumps it so every document of the scope is
+rendered again on its next request, once.
+"""
+
+import gzip
+import hashlib
+import re
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils import timezone
+from django.utils.http import http_date
+
+KEY_PREFIX = 'prerender:'
+
+Document = namedtuple('Document', ['content', 'gzipped', 'content_type', 'digest', 'last_modified', 'timeout'])
+
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def get_prerender_cache():
+    """Return the cache holding pre-rendered documents."""
+    return caches[getattr(settings, 'PRERENDER_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'PRERENDER_TIMEOUT', 60 * 60 * 24 * 7)
+
+
+def generation(scope):
+    cache = get_prerender_cache()
+    key = f'{KEY_PREFIX}{scope}:generation'
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def _bump(scope):
+    get_prerender_cache().set(f'{KEY_PREFIX}{scope}:generation', uuid.uuid4().hex, timeout=None)
+
+
+def invalidate(scope):
+    """Render every document of ``scope`` again on its next request.
+
+    The generation changes right away and again when the transaction
+    commits, so a document rendered from the old rows in between is not kept
+    either.
+    """
+    _bump(scope)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scope))
+
+
+def build_document(content, content_type, last_modified, timeout=None):
+    """Return a ``Document`` for rendered ``content`` (bytes).
+
+    ``timeout`` caps how long the document may be served, e.g. until a
+    scheduled post goes live.
+    """
+    return Document(
+        content=content,
+        gzipped=gzip.compress(content, mtime=0),
+        content_type=content_type,
+        digest=hashlib.sha256(content).hexdigest()[:32],
+        last_modified=int(last_modified.timestamp()),
+        timeout=timeout,
+    )
+
+
+def timeout_until(moment):
+    """Return the seconds left until ``moment``, or ``None`` without one."""
+    if moment is None:
+        return None
+    return max(int((moment - timezone.now()).total_seconds()) + 1, 1)
+
+
+def serve(request, scope, name, render):
+    """Serve the document ``name`` of ``scope``, rendering it with ``render()`` if needed.
+
+    ``render`` returns a ``Document`` or raises ``Http404``.
+    """
+    cache = get_prerender_cache()
+    key = f'{KEY_PREFIX}{scope}:{generation(scope)}:{hashlib.sha256(name.encode("utf-8")).hexdigest()}'
+    document = cache.get(key)
+    if document is None:
+        document = render()
+        timeout = _timeout() if document.timeout is None else min(document.timeout, _timeout())
+        cache.set(key, document, timeout)
+    return document_response(request, document)
+
+
+def document_response(request, document):
+    """Return a conditional response for ``document``, gzipped when accepted."""
+    use_gzip = bool(_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    # Strong ETags identify a representation, so the gzipped one gets its own
+    etag = f'"{document.digest}-gzip"' if use_gzip else f'"{document.digest}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=document.last_modified)
+    if response is None:
+        response = HttpResponse(document.gzipped if use_gzip else document.content, content_type=document.content_type)
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = str(len(response.content))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(document.last_modified)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
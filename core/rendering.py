@@ -0,0 +1,225 @@
+"""Shared Markdown rendering service.
+
+Rendering goes through one reusable ``markdown.Markdown`` instance per
+profile and per thread (greenlet-local under gevent), reset between uses.
+Rendered HTML and the table of contents are cached by a hash of the source
+text and of the extension configuration, so unchanged content is never
+converted twice.
+
+Highlighted code blocks are memoized by lexer, formatter options and a hash
+of the code, so editing a post only re-highlights the blocks that changed.
+Both ``codehilite`` and ``fenced_code`` highlight through
+``markdown.extensions.codehilite.highlight``; that function is wrapped once
+when this module is imported.
+
+Markdown passes raw HTML through, and notes and reviews are written by any
+registered user, so the rendered HTML and TOC go through the ``nh3``
+allow-list sanitizer before they are cached and marked safe.
+
+Hit and miss counters live in the render cache so every worker reports to
+the same totals; see ``render_stats()`` and ``markdown_cache_stats``.
+"""
+
+import hashlib
+import threading
+from collections import Counter, OrderedDict, namedtuple
+
+import markdown
+import nh3
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+from markdown.extensions import codehilite
+
+KEY_PREFIX = 'markdown:'
+STATS_KEYS = ('render_hits', 'render_misses', 'highlight_hits', 'highlight_misses')
+HIGHLIGHT_CACHE_SIZE = 2048
+
+RenderedMarkdown = namedtuple('RenderedMarkdown', ['html', 'toc'])
+
+# Bump when the sanitizer settings change so cached HTML is rendered again
+SANITIZER_VERSION = 1
+# Classes carry the highlighting and TOC styles, ids the heading anchors
+SANITIZER_ATTRIBUTES = {
+    **{tag: set(attributes) for tag, attributes in nh3.ALLOWED_ATTRIBUTES.items()},
+    '*': {'class', 'id', 'title'},
+}
+
+
+def _blog_profile():
+    return (
+        [
+            'markdown.extensions.codehilite',
+            'markdown.extensions.toc',
+            'markdown.extensions.fenced_code',
+            'markdown.extensions.tables',
+            'markdown.extensions.nl2br',
+        ],
+        {
+            'markdown.extensions.codehilite': {
+                'css_class': 'highlight',
+                'use_pygments': True,
+            },
+            'markdown.extensions.toc': {
+                'permalink': True,
+            },
+        },
+    )
+
+
+def _markdownx_profile():
+    return (
+        list(getattr(settings, 'MARKDOWNX_MARKDOWN_EXTENSIONS', [])),
+        dict(getattr(settings, 'MARKDOWNX_MARKDOWN_EXTENSION_CONFIGS', {})),
+    )
+
+
+PROFILES = {
+    'blog': _blog_profile,
+    'markdownx': _markdownx_profile,
+}
+
+
+def get_render_cache():
+    """Return the cache used for rendered Markdown and the counters."""
+    return caches[getattr(settings, 'MARKDOWN_RENDER_CACHE', 'default')]
+
+
+# Highlight memo ----------------------------------------------------------
+
+class _HighlightMemo:
+    """Thread-safe LRU of highlighted code blocks."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+            return html
+
+    def set(self, key, html):
+        with self.lock:
+            self.entries[key] = html
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_highlight_memo = _HighlightMemo(HIGHLIGHT_CACHE_SIZE)
+_local = threading.local()
+_pygments_highlight = codehilite.highlight
+
+
+def _options_key(options):
+    return repr(sorted((name, repr(value)) for name, value in options.items()))
+
+
+def _memoized_highlight(code, lexer, formatter, outfile=None):
+    if outfile is not None:
+        return _pygments_highlight(code, lexer, formatter, outfile)
+    key = (
+        type(lexer).__name__,
+        _options_key(lexer.options),
+        type(formatter).__name__,
+        _options_key(formatter.options),
+        hashlib.sha256(code.encode('utf-8')).hexdigest(),
+    )
+    counts = getattr(_local, 'counts', None)
+    html = _highlight_memo.get(key)
+    if html is None:
+        html = _pygments_highlight(code, lexer, formatter)
+        _highlight_memo.set(key, html)
+        if counts is not None:
+            counts['highlight_misses'] += 1
+    elif counts is not None:
+        counts['highlight_hits'] += 1
+    return html
+
+
+if codehilite.pygments:
+    codehilite.highlight = _memoized_highlight
+
+
+# Rendering ---------------------------------------------------------------
+
+def sanitize(html):
+    """Strip the tags and attributes outside the allow-list from rendered HTML."""
+    if not html:
+        return ''
+    return nh3.clean(html, attributes=SANITIZER_ATTRIBUTES)
+
+
+def _get_instance(profile):
+    instances = getattr(_local, 'instances', None)
+    if instances is None:
+        instances = _local.instances = {}
+    if profile not in instances:
+        extensions, configs = PROFILES[profile]()
+        digest = hashlib.sha1(repr((extensions, sorted(configs.items()), SANITIZER_VERSION)).encode('utf-8'))
+        instances[profile] = (
+            markdown.Markdown(extensions=extensions, extension_configs=configs),
+            digest.hexdigest()[:12],
+        )
+    return instances[profile]
+
+
+def _count(cache, counts):
+    for name, value in counts.items():
+        if not value:
+            continue
+        key = f'{KEY_PREFIX}stats:{name}'
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            cache.set(key, value, timeout=None)
+
+
+def render(text, profile='blog'):
+    """Render Markdown ``text`` and return a ``RenderedMarkdown``."""
+    if not text:
+        return RenderedMarkdown('', '')
+    md, config_digest = _get_instance(profile)
+    source_digest = hashlib.sha256(str(text).encode('utf-8')).hexdigest()
+    key = f'{KEY_PREFIX}{profile}:{config_digest}:{source_digest}'
+    cache = get_render_cache()
+
+    cached = cache.get(key)
+    if cached is not None:
+        _count(cache, {'render_hits': 1})
+        return RenderedMarkdown(mark_safe(cached[0]), mark_safe(cached[1]))
+
+    _local.counts = counts = Counter(render_misses=1)
+    try:
+        html = md.reset().convert(str(text))
+    finally:
+        _local.counts = None
+    html, toc = sanitize(html), sanitize(getattr(md, 'toc', ''))
+    cache.set(key, (html, toc), getattr(settings, 'MARKDOWN_RENDER_TIMEOUT', 60 * 60 * 24 * 30))
+    _count(cache, counts)
+    return RenderedMarkdown(mark_safe(html), mark_safe(toc))
+
+
+def markdownify(content):
+    """Drop-in for ``MARKDOWNX_MARKDOWNIFY_FUNCTION`` using the shared service."""
+    return render(content, 'markdownx').html
+
+
+def render_stats():
+    """Return the hit and miss counters of the render and highlight caches."""
+    found = get_render_cache().get_many([f'{KEY_PREFIX}stats:{name}' for name in STATS_KEYS])
+    return {name: found.get(f'{KEY_PREFIX}stats:{name}', 0) for name in STATS_KEYS}
+
+
+def reset_stats():
+    """Reset the hit and miss counters."""
+    get_render_cache().delete_many([f'{KEY_PREFIX}stats:{name}' for name in STATS_KEYS])
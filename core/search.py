@@ -0,0 +1,429 @@
+"""Full-text search index shared by posts, projects, books and book notes.
+
+Every indexed object is denormalized into a ``SearchDocument`` row holding
+normalized title, keyword and body text, plus the body as written for
+snippets. The rows are kept current by the signal handlers in
+``core.signals`` and queried through a database specific backend: a
+weighted ``tsvector`` expression with a GIN index on PostgreSQL (created by
+migration ``core.0007``), and an FTS5 virtual table on SQLite.
+"""
+
+import re
+from html import unescape
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField, Func, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+# Harakat, Quranic annotation marks and superscript alef
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]')
+ARABIC_TATWEEL = '\u0640'
+ARABIC_LETTER_FORMS = str.maketrans({
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ى': 'ي',
+    'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+})
+WHITESPACE = re.compile(r'\s+')
+TERM = re.compile(r'\w+')
+
+SQLITE_FTS_TABLE = 'core_searchdocument_fts'
+POSTGRES_INDEX = 'core_searchdocument_vector_gin'
+# Must stay identical to the expression migration core.0007 indexes, or the
+# GIN index is not used
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title_text, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(keywords, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(body, '')), 'C')"
+)
+
+
+def normalize_text(text):
+    """Normalize Arabic spelling variants so they match at search time."""
+    if not text:
+        return ''
+    text = ARABIC_DIACRITICS.sub('', str(text)).replace(ARABIC_TATWEEL, '')
+    return text.translate(ARABIC_LETTER_FORMS)
+
+
+def html_to_text(html):
+    """Return the visible text of an HTML fragment on a single line."""
+    if not html:
+        return ''
+    return WHITESPACE.sub(' ', unescape(strip_tags(str(html)))).strip()
+
+
+def query_terms(query):
+    """Split a user query into normalized, lowercase search terms."""
+    return TERM.findall(normalize_text(query).lower())
+
+
+def _normalize_with_offsets(text):
+    """Return the lowercase ``normalize_text()`` of ``text`` and the source index of each character.
+
+    Normalization drops diacritics and tatweel and folds letter forms, so a
+    match in the normalized text is mapped back onto the text as written.
+    """
+    chars, offsets = [], []
+    for index, char in enumerate(text):
+        if char == ARABIC_TATWEEL or ARABIC_DIACRITICS.match(char):
+            continue
+        folded = char.translate(ARABIC_LETTER_FORMS).lower()
+        chars.append(folded)
+        offsets.extend([index] * len(folded))
+    offsets.append(len(text))
+    return ''.join(chars), offsets
+
+
+def build_snippet(text, query, length=200):
+    """Return an escaped excerpt of ``text`` with the query terms highlighted.
+
+    Terms are matched on the normalized text, but the excerpt keeps the
+    spelling and diacritics of ``text``.
+    """
+    if not text:
+        return ''
+    terms = query_terms(query)
+    spans = []
+    if terms:
+        normalized, offsets = _normalize_with_offsets(text)
+        pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)))
+        spans = [(offsets[match.start()], offsets[match.end()]) for match in pattern.finditer(normalized)]
+    start = max(0, spans[0][0] - length // 4) if spans else 0
+    end = start + length
+
+    parts, position = [], start
+    for span_start, span_end in spans:
+        if span_end <= position or span_start >= end:
+            continue
+        span_start, span_end = max(span_start, position), min(span_end, end)
+        parts.append(escape(text[position:span_start]))
+        parts.append(f'<mark>{escape(text[span_start:span_end])}</mark>')
+        position = span_end
+    parts.append(escape(text[position:end]))
+    fragment = ''.join(parts)
+    if start > 0:
+        fragment = '…' + fragment
+    if end < len(text):
+        fragment += '…'
+    return mark_safe(fragment)
+
+
+# Document builders -------------------------------------------------------
+
+def _post_document(post):
+    keywords = [tag.name for tag in post.tags.all()]
+    if post.category_id:
+        keywords.append(post.category.name)
+    return {
+        'kind': 'post',
+        'title': post.title,
+        'keywords': ' '.join(keywords),
+        'body': f'{post.excerpt} {post.plain_text}',
+        'category': post.category.slug if post.category_id else '',
+        'is_public': post.is_published,
+        'published_at': post.published_at,
+    }
+
+
+def _project_document(project):
+    return {
+        'kind': 'project',
+        'title': project.title,
+        'keywords': project.technologies.replace(',', ' '),
+        'body': f'{project.short_description} {project.description}',
+        'category': '',
+        'is_public': True,
+        'published_at': project.created_at,
+    }
+
+
+def _book_document(book):
+    keywords = [book.author, book.publisher, book.isbn or '', *(tag.name for tag in book.tags.all())]
+    if book.category_id:
+        keywords.append(book.category.name)
+    return {
+        'kind': 'book',
+        'title': book.title,
+        'keywords': ' '.join(keywords),
+        'body': f'{book.description} {book.review}',
+        'category': book.category.slug if book.category_id else '',
+        'is_public': book.is_published,
+        'published_at': book.created_at,
+    }
+
+
+def _book_note_document(note):
+    return {
+        'kind': 'note',
+        'title': note.title or note.book.title,
+        'keywords': note.book.title,
+        'body': note.content,
+        'category': '',
+        'is_public': note.book.is_published,
+        'published_at': note.created_at,
+    }
+
+
+DOCUMENT_BUILDERS = {
+    'blog.post': _post_document,
+    'core.project': _project_document,
+    'books.book': _book_document,
+    'books.booknote': _book_note_document,
+}
+
+
+# Related objects the builders touch, loaded up front when rebuilding
+DOCUMENT_RELATED = {
+    'blog.post': (['category'], ['tags']),
+    'core.project': ([], []),
+    'books.book': (['category'], ['tags']),
+    'books.booknote': (['book'], []),
+}
+
+
+def is_indexed(model):
+    return model._meta.label_lower in DOCUMENT_BUILDERS
+
+
+# Backends ----------------------------------------------------------------
+
+class SqliteBackend:
+    """FTS5 backend used in development and tests."""
+
+    def ensure_schema(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} '
+                f'USING fts5(title_text, keywords, body)'
+            )
+
+    def index(self, documents, connection):
+        rows = [(doc.pk, doc.title_text, doc.keywords, doc.body) for doc in documents]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_FTS_TABLE} (rowid, title_text, keywords, body) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, document_ids, connection):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in document_ids])
+
+    def clear(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLITE_FTS_TABLE}')
+
+    def filter(self, queryset, terms):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s', [match])
+        ).annotate(rank=_Fts5Rank(match))
+
+
+class _Fts5Rank(Func):
+    """Weighted BM25 score of a document (higher is better)."""
+
+    output_field = FloatField()
+
+    def __init__(self, match):
+        super().__init__(F('id'))
+        self.match = match
+
+    def as_sql(self, compiler, connection, **extra_context):
+        id_sql, id_params = compiler.compile(self.source_expressions[0])
+        sql = (
+            f'(SELECT -bm25({SQLITE_FTS_TABLE}, 10.0, 5.0, 1.0) FROM {SQLITE_FTS_TABLE} '
+            f'WHERE {SQLITE_FTS_TABLE} MATCH %s AND {SQLITE_FTS_TABLE}.rowid = {id_sql})'
+        )
+        return sql, [self.match, *id_params]
+
+
+class PostgresBackend:
+    """Weighted ``tsvector`` backend backed by an expression GIN index.
+
+    The index is created by migration ``core.0007_search_schema``.
+    """
+
+    def ensure_schema(self, connection):
+        pass
+
+    def index(self, documents, connection):
+        pass  # The expression index is maintained by PostgreSQL
+
+    def remove(self, document_ids, connection):
+        pass
+
+    def clear(self, connection):
+        pass
+
+    def filter(self, queryset, terms):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.filter(
+            RawSQL(f"({POSTGRES_VECTOR}) @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(f"ts_rank({POSTGRES_VECTOR}, to_tsquery('simple', %s))", [tsquery], output_field=FloatField())
+        )
+
+
+BACKENDS = {
+    'sqlite': SqliteBackend(),
+    'postgresql': PostgresBackend(),
+}
+
+
+def get_backend(connection):
+    try:
+        return BACKENDS[connection.vendor]
+    except KeyError:
+        raise NotImplementedError(f'No search backend for {connection.vendor}')
+
+
+# Index maintenance -------------------------------------------------------
+
+def index_objects(objects):
+    """Create or refresh the search documents of the given model instances."""
+    from .models import SearchDocument
+
+    objects = list(objects)
+    if not objects:
+        return []
+    model = type(objects[0])
+    build = DOCUMENT_BUILDERS[model._meta.label_lower]
+    content_type = ContentType.objects.get_for_model(model)
+    existing = dict(
+        SearchDocument.objects.filter(
+            content_type=content_type, object_id__in=[obj.pk for obj in objects]
+        ).values_list('object_id', 'pk')
+    )
+    documents = []
+    for obj in objects:
+        fields = build(obj)
+        body = WHITESPACE.sub(' ', fields['body']).strip()
+        documents.append(SearchDocument(
+            pk=existing.get(obj.pk),
+            content_type=content_type,
+            object_id=obj.pk,
+            kind=fields['kind'],
+            title=fields['title'][:300],
+            title_text=normalize_text(fields['title']),
+            keywords=normalize_text(fields['keywords']),
+            body=normalize_text(body),
+            display_body=body,
+            category=fields['category'],
+            is_public=fields['is_public'],
+            published_at=fields['published_at'],
+        ))
+    update_fields = [
+        'kind', 'title', 'title_text', 'keywords', 'body', 'display_body',
+        'category', 'is_public', 'published_at',
+    ]
+    to_update = [doc for doc in documents if doc.pk]
+    to_create = [doc for doc in documents if not doc.pk]
+    if to_update:
+        SearchDocument.objects.bulk_update(to_update, update_fields)
+    if to_create:
+        SearchDocument.objects.bulk_create(to_create)
+    connection = connections[SearchDocument.objects.db]
+    get_backend(connection).index(documents, connection)
+    return documents
+
+
+def remove_objects(model, object_ids):
+    """Drop the search documents of deleted objects."""
+    from .models import SearchDocument
+
+    documents = SearchDocument.objects.filter(
+        content_type=ContentType.objects.get_for_model(model), object_id__in=object_ids
+    )
+    document_ids = list(documents.values_list('pk', flat=True))
+    if not document_ids:
+        return
+    connection = connections[SearchDocument.objects.db]
+    get_backend(connection).remove(document_ids, connection)
+    SearchDocument.objects.filter(pk__in=document_ids).delete()
+
+
+def rebuild_index(models=None, batch_size=200):
+    """Rebuild the whole index (or the given models) and return row counts."""
+    from django.apps import apps
+
+    from .models import SearchDocument
+
+    labels = [m._meta.label_lower for m in models] if models else list(DOCUMENT_BUILDERS)
+    connection = connections[SearchDocument.objects.db]
+    backend = get_backend(connection)
+    backend.ensure_schema(connection)
+    counts = {}
+    for label in labels:
+        model = apps.get_model(label)
+        remove_objects(model, SearchDocument.objects.filter(
+            content_type=ContentType.objects.get_for_model(model)
+        ).values_list('object_id', flat=True))
+        select, prefetch = DOCUMENT_RELATED[label]
+        queryset = model._default_manager.select_related(*select).prefetch_related(*prefetch).order_by('pk')
+        counts[label] = 0
+        batch = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                counts[label] += len(index_objects(batch))
+                batch = []
+        counts[label] += len(index_objects(batch))
+    return counts
+
+
+# Querying ----------------------------------------------------------------
+
+def search_documents(query, models=None, public_only=False):
+    """Return matching ``SearchDocument`` rows annotated with ``rank``."""
+    from .models import SearchDocument
+
+    documents = SearchDocument.objects.all()
+    if models:
+        documents = documents.filter(content_type__in=[
+            ContentType.objects.get_for_model(model) for model in models
+        ])
+    if public_only:
+        documents = documents.filter(is_public=True)
+    terms = query_terms(query)
+    if not terms:
+        return documents.none()
+    connection = connections[documents.db]
+    return get_backend(connection).filter(documents, terms)
+
+
+def search_queryset(queryset, query, order_by_rank=True, snippets=False):
+    """Restrict a model queryset to objects matching ``query``.
+
+    The match, the rank and (optionally) the text used for snippets are all
+    resolved through subqueries so the result is still a single SQL query.
+    Objects are annotated with ``search_rank`` and, with ``snippets=True``,
+    ``search_body``.
+    """
+    documents = search_documents(query, models=[queryset.model])
+    matched = documents.filter(object_id=OuterRef('pk'))
+    queryset = queryset.filter(pk__in=documents.values('object_id'))
+    queryset = queryset.annotate(search_rank=Subquery(matched.values('rank')[:1]))
+    if snippets:
+        queryset = queryset.annotate(search_body=Subquery(matched.values('display_body')[:1]))
+    if order_by_rank:
+        queryset = queryset.order_by('-search_rank', '-pk')
+    return queryset
+
+
+def attach_snippets(objects, query, length=200):
+    """Set ``search_snippet`` on objects returned by ``search_queryset``."""
+    for obj in objects:
+        obj.search_snippet = build_snippet(getattr(obj, 'search_body', ''), query, length)
+    return objects
@@ -0,0 +1,212 @@
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from taggit.models import TaggedItem
+
+from . import counters, images, pagecache, search, sitemaps, snapshot, storage, tracking
+
+
+@receiver(post_save, sender='blog.Post')
+@receiver(post_save, sender='core.Project')
+@receiver(post_save, sender='books.Book')
+@receiver(post_save, sender='books.BookNote')
+def update_search_document(sender, instance, raw=False, **kwargs):
+    """Refresh the search document of an indexed object after it is saved."""
+    if raw:
+        return
+    search.index_objects([instance])
+    
+    # Book notes inherit the visibility of their book
+    if sender._meta.label_lower == 'books.book':
+        search.index_objects(instance.notes.select_related('book'))
+
+
+@receiver(post_delete, sender='blog.Post')
+@receiver(post_delete, sender='core.Project')
+@receiver(post_delete, sender='books.Book')
+@receiver(post_delete, sender='books.BookNote')
+def delete_search_document(sender, instance, **kwargs):
+    """Remove the search document of a deleted object."""
+    search.remove_objects(sender, [instance.pk])
+
+
+@receiver(m2m_changed, sender=TaggedItem)
+def update_search_document_tags(sender, instance, action, **kwargs):
+    """Re-index objects whose tags changed."""
+    if action in ('post_add', 'post_remove', 'post_clear') and search.is_indexed(type(instance)):
+        search.index_objects([instance])
+
+
+@receiver(post_save, sender='blog.Category')
+@receiver(post_save, sender='books.BookCategory')
+def update_category_search_documents(sender, instance, created, raw=False, **kwargs):
+    """Category names are indexed as keywords of their posts and books."""
+    if raw or created:
+        return
+    related = instance.posts if sender._meta.label_lower == 'blog.category' else instance.books
+    search.index_objects(related.select_related('category'))
+
+
+@receiver(pre_save, sender='blog.Post')
+@receiver(pre_save, sender='books.Book')
+def remember_counter_state(sender, instance, raw=False, **kwargs):
+    """Remember the publish state and category counters were based on."""
+    instance._counter_state = counters.stored_state(instance)
+
+
+@receiver(post_save, sender='blog.Post')
+@receiver(post_save, sender='books.Book')
+def update_counters_on_save(sender, instance, **kwargs):
+    """Move counts between categories and tags after a save."""
+    new = counters.current_state(instance)
+    old = getattr(instance, '_counter_state', counters.counter_state(False, None))
+    counters.apply_state_change(instance, old, new)
+    instance._counter_state = new
+
+
+@receiver(pre_delete, sender='blog.Post')
+@receiver(pre_delete, sender='books.Book')
+def update_counters_on_delete(sender, instance, **kwargs):
+    """Drop a deleted object from its counters before its tags are removed."""
+    counters.apply_state_change(
+        instance, counters.stored_state(instance), counters.counter_state(False, None)
+    )
+
+
+@receiver(m2m_changed, sender=TaggedItem)
+def update_tag_usage(sender, instance, action, pk_set, **kwargs):
+    """Count tags added to or removed from published objects."""
+    if not counters.is_counted(type(instance)) or not instance.is_published:
+        return
+    if action == 'pre_clear':
+        instance._cleared_tag_ids = counters.tag_ids_of(instance)
+    elif action == 'post_clear':
+        counters.adjust_tags(type(instance), getattr(instance, '_cleared_tag_ids', []), -1)
+    elif action == 'post_add':
+        counters.adjust_tags(type(instance), pk_set, 1)
+    elif action == 'post_remove':
+        counters.adjust_tags(type(instance), pk_set, -1)
+
+
+@receiver(post_save, sender='core.SiteSettings')
+@receiver(post_save, sender='core.Announcement')
+@receiver(post_delete, sender='core.SiteSettings')
+@receiver(post_delete, sender='core.Announcement')
+def bump_site_snapshot(sender, **kwargs):
+    """Make workers reload settings and announcements after a change."""
+    snapshot.bump_version()
+
+
+@receiver(post_save, sender='blog.Post')
+@receiver(post_save, sender='books.Book')
+@receiver(post_save, sender='accounts.UserProfile')
+def schedule_image_derivatives(sender, instance, raw=False, **kwargs):
+    """Generate responsive copies of a new cover or avatar off the request path."""
+    if not raw:
+        images.schedule(instance)
+
+
+@receiver(post_init, sender='auth.User')
+@receiver(post_init, sender='accounts.UserProfile')
+def remember_loaded_values(sender, instance, **kwargs):
+    """Snapshot field values so save receivers can tell what changed."""
+    tracking.remember(instance)
+
+
+@receiver(pre_save, sender='auth.User')
+@receiver(pre_save, sender='accounts.UserProfile')
+def record_changed_fields(sender, instance, update_fields=None, **kwargs):
+    """Record which fields this save changes before the receivers run."""
+    tracking.record_changes(instance, update_fields)
+
+
+@receiver(post_init, sender='blog.Post')
+@receiver(post_init, sender='books.Book')
+@receiver(post_init, sender='accounts.UserProfile')
+@receiver(post_init, sender='blog.MediaAsset')
+def remember_blob_references(sender, instance, **kwargs):
+    """Remember which stored files a row pointed to when it was loaded."""
+    storage.remember_references(instance)
+
+
+@receiver(post_save, sender='blog.Post')
+@receiver(post_save, sender='books.Book')
+@receiver(post_save, sender='accounts.UserProfile')
+@receiver(post_save, sender='blog.MediaAsset')
+def update_blob_references(sender, instance, raw=False, **kwargs):
+    """Move reference counts to the files a saved row points to now."""
+    if not raw:
+        storage.update_references(instance)
+
+
+@receiver(post_delete, sender='blog.Post')
+@receiver(post_delete, sender='books.Book')
+@receiver(post_delete, sender='accounts.UserProfile')
+@receiver(post_delete, sender='blog.MediaAsset')
+def release_blob_references(sender, instance, **kwargs):
+    """Release the files of a deleted row."""
+    storage.release_references(instance)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_sitemaps(sender, raw=False, **kwargs):
+    """Render the sitemap sections listing a changed model again."""
+    sections = sitemaps.SECTION_DEPENDENCIES.get(sender._meta.label_lower)
+    if sections and not raw:
+        sitemaps.invalidate_sections(*sections)
+
+
+@receiver(m2m_changed, sender=TaggedItem)
+def invalidate_tag_sitemap(sender, instance, action, **kwargs):
+    """Render the tag sitemap again when the tags of a post change."""
+    if action in ('post_add', 'post_remove', 'post_clear') and instance._meta.label_lower == 'blog.post':
+        sitemaps.invalidate_sections('tags')
+
+
+@receiver(post_init)
+def track_page_dependency(sender, instance, **kwargs):
+    """Record instances loaded while a cached page renders."""
+    pagecache.track_instance(instance)
+
+
+@receiver(pre_save)
+def remember_page_cache_state(sender, instance, raw=False, **kwargs):
+    """Remember the fields that decide which cached lists show an object."""
+    if not raw and pagecache.is_tracked(sender):
+        pagecache.remember_state(instance)
+
+
+@receiver(post_save)
+def invalidate_pages_on_save(sender, instance, created, raw=False, **kwargs):
+    """Expire the cached pages that depend on a saved object."""
+    if not raw and pagecache.is_tracked(sender):
+        pagecache.invalidate_saved(instance, created)
+
+
+@receiver(post_delete)
+def invalidate_pages_on_delete(sender, instance, **kwargs):
+    """Expire the cached pages that depend on a deleted object."""
+    if pagecache.is_tracked(sender):
+        pagecache.invalidate_deleted(instance)
+
+
+@receiver(m2m_changed, sender=TaggedItem)
+def invalidate_pages_on_tags(sender, instance, action, **kwargs):
+    """Expire tag lists and the object's pages when its tags change."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        pagecache.invalidate_tags(instance)
+
+
+def ensure_search_schema(sender, using, **kwargs):
+    """Create the SQLite FTS table after migrating.
+
+    Virtual tables are outside the migration framework; the PostgreSQL GIN
+    index is created by migration ``core.0007_search_schema``.
+    """
+    connection = connections[using]
+    try:
+        backend = search.get_backend(connection)
+    except NotImplementedError:
+        return
+    backend.ensure_schema(connection)
@@ -1,9 +1,72 @@
 from django.contrib.sitemaps import Sitemap
+from django.core.paginator import Paginator
+from django.db.models import Max
 from django.urls import reverse
+from . import prerender
 from .models import Project
 
+# Sitemap sections whose pre-rendered files go stale when a model changes
+SECTION_DEPENDENCIES = {
+    'blog.post': ('posts', 'categories', 'tags'),
+    'blog.category': ('categories',),
+    'taggit.tag': ('tags',),
+    'core.project': ('projects',),
+    'books.book': ('books', 'book-categories'),
+    'books.bookcategory': ('book-categories',),
+}
 
-class StaticViewSitemap(Sitemap):
+
+def section_scope(section):
+    return f'sitemap-{section}'
+
+
+def invalidate_sections(*sections):
+    """Render the files of ``sections`` and the index again on their next request."""
+    for section in sections:
+        prerender.invalidate(section_scope(section))
+
+
+class LocalizedItems:
+    """``(item, language)`` pairs of a queryset, sliced lazily for pagination.
+    
+    ``Sitemap._items()`` builds every pair in memory before paginating; this
+    lets the paginator count rows and fetch one page at a time instead.
+    """
+    
+    def __init__(self, items, languages):
+        self.items = items
+        self.languages = languages
+    
+    def count(self):
+        items = len(self.items) if isinstance(self.items, (list, tuple)) else self.items.count()
+        return items * len(self.languages)
+    
+    def __len__(self):
+        return self.count()
+    
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        per_item = len(self.languages)
+        start, stop = index.start or 0, index.stop if index.stop is not None else self.count()
+        first, last = start // per_item, -(-stop // per_item)
+        pairs = [(item, language) for item in self.items[first:last] for language in self.languages]
+        return pairs[start - first * per_item:stop - first * per_item]
+
+
+class I18nSitemap(Sitemap):
+    """Sitemap listing every URL per language with hreflang alternates."""
+    i18n = True
+    alternates = True
+    x_default = True
+    limit = 50000
+    
+    @property
+    def paginator(self):
+        return Paginator(LocalizedItems(self.items(), self._languages()), self.limit)
+
+
+class StaticViewSitemap(I18nSitemap):
     """Sitemap for static pages."""
     priority = 0.8
     changefreq = 'weekly'
@@ -15,13 +78,16 @@ class StaticViewSitemap(Sitemap):
         return reverse(item)
 
 
-class ProjectSitemap(Sitemap):
+class ProjectSitemap(I18nSitemap):
     """Sitemap for projects."""
     changefreq = 'monthly'
     priority = 0.6
     
     def items(self):
-        return Project.objects.all()
+        return Project.objects.only('slug', 'updated_at')
     
     def lastmod(self, obj):
-        return obj.updated_at
\ No newline at end of file
+        return obj.updated_at
+    
+    def get_latest_lastmod(self):
+        return Project.objects.aggregate(latest=Max('updated_at'))['latest']
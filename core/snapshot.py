@@ -0,0 +1,105 @@
+"""In-process snapshot of site settings and announcements.
+
+Every worker keeps the ``SiteSettings`` row and the visible site-wide
+announcements in memory and reuses them for every template render. A
+version number in the shared cache is bumped whenever either model is
+saved or deleted; a worker reloads its snapshot when the version it loaded
+is no longer current. The announcement list also expires at its next
+``start_date``/``end_date`` boundary, so scheduled announcements appear and
+disappear on time without querying in between.
+"""
+
+import threading
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+VERSION_KEY = 'snapshot:site:version'
+
+Snapshot = namedtuple('Snapshot', ['version', 'site_settings', 'announcements', 'expires_at', 'dependencies'])
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def get_snapshot_cache():
+    """Return the cache holding the snapshot version."""
+    return caches[getattr(settings, 'SITE_SNAPSHOT_CACHE', 'default')]
+
+
+def current_version():
+    cache = get_snapshot_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _set_version():
+    get_snapshot_cache().set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def bump_version():
+    """Make every worker reload its snapshot on the next render.
+
+    The version changes right away and again when the transaction commits,
+    so a snapshot loaded from the old rows in between is not kept either.
+    """
+    _set_version()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(_set_version)
+
+
+def _load(version):
+    from .models import Announcement, SiteSettings
+
+    site_settings = SiteSettings.objects.filter(pk=1).first() or SiteSettings(pk=1)
+
+    now = timezone.now()
+    candidates = Announcement.objects.filter(is_active=True, show_on_all_pages=True).filter(
+        Q(end_date__isnull=True) | Q(end_date__gt=now)
+    ).order_by('-priority', '-created_at')
+    announcements, boundaries = [], []
+    for announcement in candidates:
+        if announcement.start_date <= now:
+            announcements.append(announcement)
+            if announcement.end_date:
+                boundaries.append(announcement.end_date)
+        else:
+            boundaries.append(announcement.start_date)
+
+    dependencies = ['core.announcement'] + [f'core.announcement:{a.pk}' for a in announcements]
+    dependencies.append('core.sitesettings:1' if site_settings._state.db else 'core.sitesettings')
+    return Snapshot(version, site_settings, announcements, min(boundaries, default=None), dependencies)
+
+
+def _is_current(snapshot, version):
+    if snapshot is None or snapshot.version != version:
+        return False
+    return snapshot.expires_at is None or snapshot.expires_at > timezone.now()
+
+
+def get_snapshot():
+    """Return the current snapshot, reloading it when it is outdated."""
+    global _snapshot
+
+    version = current_version()
+    snapshot = _snapshot
+    if not _is_current(snapshot, version):
+        with _lock:
+            snapshot = _snapshot
+            if not _is_current(snapshot, version):
+                snapshot = _snapshot = _load(version)
+    return snapshot
+
+
+def clear_snapshot():
+    """Drop this worker's snapshot."""
+    global _snapshot
+    _snapshot = None
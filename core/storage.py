@@ -0,0 +1,320 @@
+"""Content-addressed media storage.
+
+``ContentAddressedStorage`` names every saved file after the SHA-256 of its
+bytes, sharded below the folder it was uploaded to:
+``blog/covers/ab/cd/<sha256>.png``. The hash is computed while the upload is
+streamed to a temporary file next to its destination. Identical bytes land
+on the same name, so a duplicate upload keeps the existing file and gets its
+URL back. The two shard levels keep directories small enough to list.
+
+Files referenced from the owning rows in ``BLOB_FIELDS`` are counted in
+``Blob.ref_count``; a count of zero marks a file nothing points to any
+more. ``recount()`` rebuilds the counts from the rows.
+
+``dedupe()`` (the ``dedupe_media`` command) moves files saved before this
+storage existed to their blob names, in place, and points the rows and the
+media URLs in post and book bodies at them.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from collections import namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+BLOB_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(?:\.[A-Za-z0-9]+)?$')
+
+# File fields that reference blobs, by model label
+BLOB_FIELDS = {
+    'blog.post': ('cover_image',),
+    'books.book': ('cover_image',),
+    'accounts.userprofile': ('avatar',),
+    'blog.mediaasset': ('path',),
+}
+
+# Models whose rows only index stored files; a row does not keep its file
+# from being collected by ``core.garbage``
+MEDIA_INDEX_MODELS = {'blog.mediaasset'}
+
+# Folder of the editor's media library (``blog.MediaAsset``)
+MEDIA_LIBRARY_FOLDER = 'uploads/'
+
+# HTML/Markdown fields that may embed media URLs, by model label
+MEDIA_REFERENCE_FIELDS = {
+    'blog.post': ('content', 'excerpt'),
+    'books.book': ('description', 'review'),
+    'books.booknote': ('content',),
+    'core.project': ('description',),
+}
+
+DedupeReport = namedtuple('DedupeReport', ['renamed', 'duplicates', 'reclaimed'])
+
+
+def blob_name(folder, sha256, extension=''):
+    """Return the sharded name of the blob ``sha256`` below ``folder``."""
+    return '/'.join(filter(None, [folder.strip('/'), sha256[:2], sha256[2:4], sha256 + extension.lower()]))
+
+
+def blob_sha256(name):
+    """Return the hash a blob name was derived from, or ``None`` for other names."""
+    match = BLOB_NAME_RE.search(name or '')
+    return match.group('sha256') if match else None
+
+
+def blob_folder(name):
+    """Return the folder a file was uploaded to, without the blob shards."""
+    folder = os.path.dirname(name)
+    if blob_sha256(name):
+        folder = os.path.dirname(os.path.dirname(folder))
+    return folder
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that keeps one file per distinct content."""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save()
+        return name
+
+    def _save(self, name, content):
+        folder, extension = os.path.dirname(name), os.path.splitext(name)[1]
+        directory = self.path(folder)
+        os.makedirs(directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk: hash it and move it, without another copy
+            with open(content.temporary_file_path(), 'rb') as source:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            temporary = content.temporary_file_path()
+        else:
+            descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.incoming-')
+            try:
+                with os.fdopen(descriptor, 'wb') as output:
+                    for chunk in content.chunks(CHUNK_SIZE):
+                        digest.update(chunk)
+                        output.write(chunk)
+            except BaseException:
+                os.remove(temporary)
+                raise
+
+        final = blob_name(folder, digest.hexdigest(), extension)
+        if self.exists(final):
+            if not hasattr(content, 'temporary_file_path'):
+                os.remove(temporary)
+        else:
+            os.makedirs(os.path.dirname(self.path(final)), exist_ok=True)
+            file_move_safe(temporary, self.path(final), allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(self.path(final), self.file_permissions_mode)
+        return final
+
+
+blob_storage = ContentAddressedStorage()
+
+
+# Reference counts -----------------------------------------------------------
+
+def referenced_names(instance):
+    """Return the blob names ``instance`` references."""
+    names = []
+    for field in BLOB_FIELDS.get(instance._meta.label_lower, ()):
+        value = getattr(instance, field)
+        name = getattr(value, 'name', value)
+        if name and blob_sha256(name):
+            names.append(name)
+    return names
+
+
+def adjust(names, delta):
+    """Add ``delta`` to the reference counts of blobs ``names``."""
+    from .models import Blob
+
+    for name in names:
+        changes = {'ref_count': F('ref_count') + delta, 'updated_at': timezone.now()}
+        updated = Blob.objects.filter(path=name).update(**changes)
+        if not updated and delta > 0:
+            blob, created = Blob.objects.get_or_create(
+                path=name, defaults={'sha256': blob_sha256(name), 'size': _size(name), 'ref_count': delta},
+            )
+            if not created:
+                Blob.objects.filter(pk=blob.pk).update(**changes)
+
+
+def _size(name):
+    try:
+        return blob_storage.size(name)
+    except OSError:
+        return 0
+
+
+def remember_references(instance):
+    """Remember the blobs ``instance`` referenced when it was loaded."""
+    instance._blob_references = referenced_names(instance)
+
+
+def update_references(instance):
+    """Move reference counts from the blobs ``instance`` used to the ones it uses now."""
+    old = getattr(instance, '_blob_references', [])
+    new = referenced_names(instance)
+    adjust([name for name in old if name not in new], -1)
+    adjust([name for name in new if name not in old], 1)
+    instance._blob_references = new
+
+
+def release_references(instance):
+    """Drop the references of a deleted ``instance``."""
+    adjust(getattr(instance, '_blob_references', referenced_names(instance)), -1)
+
+
+def recount():
+    """Rebuild every blob reference count from the owning rows; return the number fixed."""
+    from .models import Blob
+
+    counts = {}
+    for label, fields in BLOB_FIELDS.items():
+        model = apps.get_model(label)
+        for field in fields:
+            for name in model.objects.exclude(**{field: ''}).values_list(field, flat=True).iterator():
+                if name and blob_sha256(name):
+                    counts[name] = counts.get(name, 0) + 1
+
+    fixed = 0
+    for blob in Blob.objects.all().iterator():
+        expected = counts.pop(blob.path, 0)
+        if blob.ref_count != expected:
+            Blob.objects.filter(pk=blob.pk).update(ref_count=expected, updated_at=timezone.now())
+            fixed += 1
+    for name, count in counts.items():
+        Blob.objects.create(path=name, sha256=blob_sha256(name), size=_size(name), ref_count=count)
+        fixed += 1
+    return fixed
+
+
+# Migrating existing files ---------------------------------------------------
+
+def _folders():
+    folders = {MEDIA_LIBRARY_FOLDER}
+    for label, fields in BLOB_FIELDS.items():
+        for field in fields:
+            upload_to = getattr(apps.get_model(label)._meta.get_field(field), 'upload_to', None)
+            if isinstance(upload_to, str) and upload_to:
+                folders.add(upload_to)
+    return sorted(folder.strip('/') for folder in folders)
+
+
+def _legacy_files(folder):
+    """Yield the names of the files below ``folder`` that are not blobs yet."""
+    try:
+        entries = os.scandir(blob_storage.path(folder))
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            name = f'{folder}/{entry.name}'
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from _legacy_files(name)
+            elif entry.is_file(follow_symlinks=False) and not blob_sha256(name):
+                yield name
+
+
+def _digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _rename_rows(renames):
+    """Point every stored path in ``renames`` at its blob, merging rows of unique paths."""
+    fields = {**BLOB_FIELDS, 'core.imagesource': ('path',)}
+    for label, names in fields.items():
+        model = apps.get_model(label)
+        for field in names:
+            unique = model._meta.get_field(field).unique
+            for old, new in renames.items():
+                rows = model.objects.filter(**{field: old})
+                if unique and model.objects.filter(**{field: new}).exists():
+                    rows.delete()
+                else:
+                    rows.update(**{field: new})
+
+
+def _rewrite_urls(renames):
+    """Replace the media URLs of renamed files in the HTML/Markdown fields."""
+    urls = {blob_storage.url(old): blob_storage.url(new) for old, new in renames.items()}
+    pattern = re.compile('|'.join(re.escape(url) for url in sorted(urls, key=len, reverse=True)))
+    for label, fields in MEDIA_REFERENCE_FIELDS.items():
+        model = apps.get_model(label)
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__contains': settings.MEDIA_URL})
+        for instance in model.objects.filter(condition).iterator():
+            changed = []
+            for field in fields:
+                value = getattr(instance, field) or ''
+                rewritten = pattern.sub(lambda match: urls[match.group(0)], value)
+                if rewritten != value:
+                    setattr(instance, field, rewritten)
+                    changed.append(field)
+            if changed:
+                instance.save(update_fields=changed)
+
+
+def dedupe(dry_run=False):
+    """Move the files saved before content addressing to their blob names.
+
+    Each file is linked to its blob name (or found to duplicate an existing
+    blob), the rows and embedded URLs are rewritten in one transaction, and
+    only then are the old names removed, so an interrupted run loses nothing.
+    With ``dry_run`` only the report is computed. Returns a ``DedupeReport``.
+    """
+    from .images import forget
+
+    renames, created, duplicates, reclaimed = {}, set(), 0, 0
+    for folder in _folders():
+        for old in list(_legacy_files(folder)):
+            path = blob_storage.path(old)
+            new = blob_name(os.path.dirname(old), _digest(path), os.path.splitext(old)[1])
+            if new in created or blob_storage.exists(new):
+                duplicates += 1
+                reclaimed += os.path.getsize(path)
+            elif not dry_run:
+                _link(path, blob_storage.path(new))
+            created.add(new)
+            renames[old] = new
+
+    if renames and not dry_run:
+        with transaction.atomic():
+            _rename_rows(renames)
+            _rewrite_urls(renames)
+        for old, new in renames.items():
+            os.remove(blob_storage.path(old))
+            forget(old)
+            forget(new)
+        recount()
+    return DedupeReport(len(renames), duplicates, reclaimed)
@@ -0,0 +1,40 @@
+"""Custom template tags shared by every app."""
+
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+from core import images
+
+register = template.Library()
+
+FALLBACK_FORMAT = 'jpeg'
+
+
+def _srcset(candidates):
+    return ', '.join(f'{url} {width}w' for url, width in candidates)
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', alt='', **attrs):
+    """Render an image field as a ``<picture>`` with WebP and JPEG srcsets.
+
+    Extra keyword arguments become attributes of the ``<img>``. The original
+    file is rendered until its derivatives have been generated.
+    """
+    if not image:
+        return ''
+    attrs = {'alt': alt, 'loading': 'lazy', 'decoding': 'async', **attrs}
+    derivatives = images.lookup(image.name)
+    if derivatives is None:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    srcsets = derivatives.srcsets
+    fallback = srcsets.get(FALLBACK_FORMAT) or next(iter(srcsets.values()))
+    attrs.update({'src': fallback[-1][0], 'srcset': _srcset(fallback), 'sizes': sizes})
+    attrs.setdefault('width', derivatives.width)
+    attrs.setdefault('height', derivatives.height)
+    sources = format_html_join(
+        '', '<source type="image/{}" srcset="{}" sizes="{}">',
+        ((format, _srcset(candidates), sizes) for format, candidates in srcsets.items() if candidates is not fallback),
+    )
+    return format_html('<picture>{}<img{}></picture>', sources, flatatt(attrs))
@@ -1,8 +1,40 @@
-from django.test import TestCase, Client
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.middleware.csrf import _unmask_cipher_token
+from unittest import mock
+
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from .models import Project, ContactMessage, SiteSettings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.core import mail
+from django.utils import timezone
+from PIL import Image
+from blog.counters import pending_views
+from blog.models import Category, Post
+from books.models import Book, BookCategory
+from .models import (
+    Announcement, Blob, Project, ContactMessage, SiteSettings, SearchDocument, ImageDerivative, ImageSource,
+    OutboundEmail,
+)
 from .forms import ContactForm
+from .counters import categories_with_counts, reconcile_counters, tags_with_counts
+from .pagecache import page_stats
+from .snapshot import clear_snapshot, get_snapshot
+from .garbage import collect, referenced_paths
+from .outbox import drain, enqueue, get_outbox_connection
+from .storage import blob_name, blob_storage, recount
+from .throttle import hit, lockout_remaining, record_failure
+from .pagination import CursorPaginator
+from .rendering import _highlight_memo, markdownify, render, render_stats
+from .search import attach_snippets, normalize_text, rebuild_index, search_queryset
 
 User = get_user_model()
 
@@ -186,4 +218,855 @@ class ContactFormTest(TestCase):
         }
         form = ContactForm(data=form_data)
         self.assertFalse(form.is_valid())
-        self.assertIn('message', form.errors)
\ No newline at end of file
+        self.assertIn('message', form.errors)
+
+
+class SearchIndexTest(TestCase):
+    """Test the unified full-text search index."""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', password='testpass123')
+        self.django_post = Post.objects.create(
+            title='Django performance',
+            slug='django-performance',
+            excerpt='Making Django fast',
+            content='<p>Caching and <strong>query</strong> tuning.</p>',
+            author=self.user,
+            is_published=True,
+        )
+        self.other_post = Post.objects.create(
+            title='Gardening notes',
+            slug='gardening-notes',
+            excerpt='Plants',
+            content='<p>A short mention of django at the end.</p>',
+            author=self.user,
+            is_published=True,
+        )
+        self.arabic_post = Post.objects.create(
+            title='البرمجة بلغة بايثون',
+            slug='python-arabic',
+            excerpt='مقدمة',
+            content='<p>تَعَلُّم الإِحصاء</p>',
+            author=self.user,
+            is_published=True,
+        )
+    
+    def test_normalize_text(self):
+        """Diacritics, tatweel and letter variants are folded."""
+        self.assertEqual(normalize_text('تَعَلُّم'), 'تعلم')
+        self.assertEqual(normalize_text('الإحصـــاء'), 'الاحصاء')
+    
+    def test_documents_follow_saves_and_deletes(self):
+        """Saving and deleting posts keeps the index in sync."""
+        self.assertEqual(SearchDocument.objects.filter(kind='post').count(), 3)
+        self.django_post.title = 'Flask performance'
+        self.django_post.save()
+        document = SearchDocument.objects.get(object_id=self.django_post.pk, kind='post')
+        self.assertEqual(document.title, 'Flask performance')
+        self.django_post.delete()
+        self.assertEqual(SearchDocument.objects.filter(kind='post').count(), 2)
+    
+    def test_search_ranks_title_matches_first(self):
+        """Title matches rank above body-only matches."""
+        results = list(search_queryset(Post.objects.all(), 'django'))
+        self.assertEqual(results, [self.django_post, self.other_post])
+    
+    def test_search_matches_prefixes_and_html_is_stripped(self):
+        """Terms match word prefixes and markup is not indexed."""
+        self.assertEqual(list(search_queryset(Post.objects.all(), 'perf')), [self.django_post])
+        self.assertFalse(search_queryset(Post.objects.all(), 'strong').exists())
+    
+    def test_arabic_search_ignores_diacritics(self):
+        """Arabic queries match regardless of diacritics and hamza forms."""
+        results = search_queryset(Post.objects.all(), 'الاحصاء')
+        self.assertEqual(list(results), [self.arabic_post])
+    
+    def test_snippets_keep_original_spelling(self):
+        """Snippets show the text as written, with the match highlighted."""
+        [result] = attach_snippets(list(search_queryset(Post.objects.all(), 'الاحصاء', snippets=True)), 'الاحصاء')
+        self.assertIn('<mark>الإِحصاء</mark>', result.search_snippet)
+        self.assertIn('تَعَلُّم', result.search_snippet)
+        document = SearchDocument.objects.get(object_id=self.arabic_post.pk, kind='post')
+        self.assertEqual(document.body, 'مقدمه تعلم الاحصاء')
+        self.assertEqual(document.display_body, 'مقدمة تَعَلُّم الإِحصاء')
+    
+    def test_tag_changes_are_indexed(self):
+        """Adding a tag makes the post searchable by it."""
+        self.other_post.tags.add('botany')
+        self.assertEqual(list(search_queryset(Post.objects.all(), 'botany')), [self.other_post])
+    
+    def test_rebuild_index(self):
+        """The rebuild command restores a wiped index."""
+        SearchDocument.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', 'blog.Post', stdout=out)
+        self.assertIn('Indexed 3 blog.post objects', out.getvalue())
+        self.assertEqual(rebuild_index([Post])['blog.post'], 3)
+        self.assertTrue(search_queryset(Post.objects.all(), 'django').exists())
+    
+    def test_global_search_view(self):
+        """The global search page shows highlighted snippets."""
+        response = self.client.get(reverse('core:global_search'), {'q': 'caching'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<mark>Caching</mark>')
+
+
+class MarkdownRenderingTest(TestCase):
+    """Test the memoized Markdown rendering service."""
+    
+    def setUp(self):
+        cache.clear()
+        _highlight_memo.clear()
+    
+    def test_render_html_and_toc(self):
+        """Rendering returns HTML and a table of contents."""
+        rendered = render('# Title\n\nSome *text*')
+        self.assertIn('<em>text</em>', rendered.html)
+        self.assertIn('href="#title"', rendered.toc)
+    
+    def test_rendered_output_is_cached(self):
+        """Rendering the same text twice is served from the cache."""
+        first = render('Hello **world**')
+        second = render('Hello **world**')
+        self.assertEqual(first, second)
+        stats = render_stats()
+        self.assertEqual(stats['render_misses'], 1)
+        self.assertEqual(stats['render_hits'], 1)
+    
+    def test_only_changed_code_blocks_are_highlighted(self):
+        """Unchanged code blocks are reused when the document changes."""
+        code = '```python\nprint("hi")\n```'
+        render(f'Intro\n\n{code}')
+        render(f'Edited intro\n\n{code}\n\n```python\nx = 1\n```')
+        stats = render_stats()
+        self.assertEqual(stats['render_misses'], 2)
+        self.assertEqual(stats['highlight_misses'], 2)
+        self.assertEqual(stats['highlight_hits'], 1)
+    
+    def test_markdownify_uses_markdownx_extensions(self):
+        """The markdownx preview function renders with its own profile."""
+        html = markdownify('| a |\n|---|\n| b |')
+        self.assertIn('<table>', html)
+    
+    def test_raw_html_is_sanitized(self):
+        """Scripts and event handlers are stripped; highlighting and anchors are kept."""
+        html = markdownify(
+            '# Title\n\n<script>alert(1)</script>\n\n<img src="x.png" onerror="alert(2)">\n\n'
+            '<a href="javascript:alert(3)">link</a>\n\n```python\nx = 1\n```'
+        )
+        self.assertNotIn('<script', html)
+        self.assertNotIn('onerror', html)
+        self.assertNotIn('javascript:', html)
+        self.assertIn('<img src="x.png">', html)
+        self.assertIn('id="title"', html)
+        self.assertIn('<span class="n">x</span>', html)
+    
+    def test_stats_command(self):
+        """The stats command prints the counters."""
+        render('cached')
+        render('cached')
+        out = StringIO()
+        call_command('markdown_cache_stats', '--reset', stdout=out)
+        self.assertIn('render: 1 hits, 1 misses (50.0% hit rate)', out.getvalue())
+        self.assertEqual(render_stats()['render_hits'], 0)
+
+
+class CursorPaginatorTest(TestCase):
+    """Test keyset pagination."""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        # Pairs of books share a rating, and some have none
+        for index, rating in enumerate([5, 5, None, 3, None, 3, 1]):
+            Book.objects.create(
+                title=f'Book {index}', slug=f'book-{index}', author='Author',
+                rating=rating, added_by=self.user,
+            )
+        self.books = Book.objects.all()
+    
+    def walk(self, paginator):
+        page = paginator.get_page(None)
+        pages = [list(page)]
+        while page.has_next():
+            page = paginator.get_page(page.next_page_number())
+            pages.append(list(page))
+        return page, pages
+    
+    def test_forward_walk_matches_ordering(self):
+        """Following next cursors visits every row once, in order."""
+        paginator = CursorPaginator(self.books, 3, ordering=('-created_at', '-id'))
+        page, pages = self.walk(paginator)
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), list(self.books.order_by('-created_at', '-id')))
+        self.assertEqual(page.number, 3)
+    
+    def test_backward_walk(self):
+        """Previous cursors lead back to the first page."""
+        paginator = CursorPaginator(self.books, 3)
+        page, pages = self.walk(paginator)
+        page = paginator.get_page(page.previous_page_number())
+        self.assertEqual(list(page), pages[1])
+        page = paginator.get_page(page.previous_page_number())
+        self.assertEqual(list(page), pages[0])
+        self.assertFalse(page.has_previous())
+        self.assertEqual(page.number, 1)
+    
+    def test_nullable_ordering_puts_nulls_last(self):
+        """Nullable columns paginate without skipping or repeating rows."""
+        paginator = CursorPaginator(self.books.order_by('-rating'), 2)
+        _, pages = self.walk(paginator)
+        ratings = [book.rating for book in sum(pages, [])]
+        self.assertEqual(ratings, [5, 5, 3, 3, 1, None, None])
+        
+        paginator = CursorPaginator(self.books.order_by('rating'), 2)
+        page = paginator.get_page('last')
+        self.assertEqual([book.rating for book in page], [None, None])
+        page = paginator.get_page(page.previous_page_number())
+        self.assertEqual([book.rating for book in page], [5, 5])
+    
+    def test_pages_do_not_count(self):
+        """Fetching a page runs a single query and no COUNT."""
+        paginator = CursorPaginator(self.books, 3)
+        cursor = paginator.get_page(None).next_page_number()
+        with self.assertNumQueries(1):
+            page = paginator.get_page(cursor)
+        self.assertIsNone(paginator.count)
+        self.assertEqual(paginator.num_pages, 'last')
+        self.assertEqual(list(paginator.page_range), [])
+        self.assertTrue(page.has_previous())
+    
+    def test_approximate_count_is_cached(self):
+        """Approximate totals are counted once and cached."""
+        paginator = CursorPaginator(self.books, 3, approximate_count=True)
+        self.assertEqual(paginator.count, 7)
+        self.assertEqual(paginator.num_pages, 3)
+        Book.objects.filter(slug='book-0').delete()
+        self.assertEqual(CursorPaginator(self.books, 3, approximate_count=True).count, 7)
+    
+    def test_invalid_cursor_and_page_numbers(self):
+        """Tampered cursors fall back to the first page, numbers still work."""
+        paginator = CursorPaginator(self.books, 3)
+        first = list(paginator.get_page(None))
+        self.assertEqual(list(paginator.get_page('garbage')), first)
+        cursor = paginator.get_page(None).next_page_number()
+        self.assertEqual(list(paginator.get_page(cursor[:-2] + 'xx')), first)
+        # Cursors from another ordering are rejected
+        other = CursorPaginator(self.books.order_by('title'), 3)
+        self.assertEqual(list(other.get_page(cursor)), list(other.get_page(None)))
+        # Legacy page numbers
+        self.assertEqual(paginator.get_page('2').number, 2)
+        self.assertEqual(list(paginator.get_page('99')), list(paginator.get_page('last')))
+    
+    def test_project_list_uses_cursors(self):
+        """List views render with cursor pages."""
+        for index in range(10):
+            Project.objects.create(
+                title=f'Project {index}', slug=f'project-{index}',
+                description='Description', short_description='Short',
+            )
+        response = self.client.get(reverse('core:projects'))
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        self.assertTrue(response.context['is_paginated'])
+        response = self.client.get(reverse('core:projects'), {'page': page.next_page_number()})
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+
+class CounterTest(TestCase):
+    """Test the denormalized category and tag counters."""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpass123')
+        self.python = Category.objects.create(name='Python', slug='python')
+        self.django = Category.objects.create(name='Django', slug='django')
+        self.post = Post.objects.create(
+            title='Post', slug='post', content='Content', author=self.user,
+            category=self.python, is_published=True,
+        )
+        self.post.tags.add('web', 'orm')
+        self.draft = Post.objects.create(
+            title='Draft', slug='draft', content='Content', author=self.user,
+            category=self.python,
+        )
+        self.draft.tags.add('web')
+    
+    def counts(self):
+        self.python.refresh_from_db()
+        self.django.refresh_from_db()
+        tags = {tag.name: tag.post_count for tag in tags_with_counts(Post)}
+        return self.python.published_post_count, self.django.published_post_count, tags
+    
+    def test_counts_follow_publish_state_and_category(self):
+        """Publishing, moving and deleting posts adjust the counters."""
+        self.assertEqual(self.counts(), (1, 0, {'web': 1, 'orm': 1}))
+        
+        self.draft.is_published = True
+        self.draft.save()
+        self.assertEqual(self.counts(), (2, 0, {'web': 2, 'orm': 1}))
+        
+        self.post.category = self.django
+        self.post.save()
+        self.assertEqual(self.counts(), (1, 1, {'web': 2, 'orm': 1}))
+        
+        self.post.is_published = False
+        self.post.save()
+        self.assertEqual(self.counts(), (1, 0, {'web': 1}))
+        
+        self.draft.delete()
+        self.assertEqual(self.counts(), (0, 0, {}))
+        self.assertEqual(reconcile_counters(dry_run=True), [])
+    
+    def test_tag_changes_on_published_posts(self):
+        """Adding, removing and clearing tags adjust tag usage."""
+        self.post.tags.add('python')
+        self.post.tags.remove('orm')
+        self.assertEqual(self.counts()[2], {'web': 1, 'python': 1})
+        self.post.tags.clear()
+        self.assertEqual(self.counts()[2], {})
+    
+    def test_tag_usage_is_per_content_type(self):
+        """Books using a tag do not count as blog posts."""
+        category = BookCategory.objects.create(name='Novels', slug='novels')
+        book = Book.objects.create(
+            title='Book', slug='book', author='Author', category=category, added_by=self.user,
+        )
+        book.tags.add('web')
+        self.assertEqual({tag.name: tag.book_count for tag in tags_with_counts(Book)}, {'web': 1})
+        self.assertEqual(self.counts()[2], {'web': 1, 'orm': 1})
+        self.assertEqual([(c.name, c.book_count) for c in categories_with_counts(Book)], [('Novels', 1)])
+    
+    def test_sidebar_reads_counters(self):
+        """The post list sidebar reads counters without aggregating."""
+        response = self.client.get(reverse('blog:post_list'))
+        categories = response.context['categories']
+        self.assertEqual([(c.name, c.post_count) for c in categories], [('Python', 1)])
+        self.assertNotIn('COUNT(', str(categories.query))
+    
+    def test_reconcile_command(self):
+        """The reconcile command fixes drifted counters."""
+        Category.objects.filter(pk=self.python.pk).update(published_post_count=7)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('stored 7, expected 1', out.getvalue())
+        self.assertEqual(self.counts()[0], 1)
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class PageCacheTest(TestCase):
+    """Test the dependency-tracked page cache."""
+    
+    def setUp(self):
+        cache.clear()
+        SiteSettings.get_settings()
+        self.user = User.objects.create_user(username='writer', password='testpass123')
+        self.category = Category.objects.create(name='Python', slug='python')
+        self.posts = [
+            Post.objects.create(
+                title=f'Post {index}', slug=f'post-{index}', content='Content', author=self.user,
+                category=self.category, is_published=True,
+                published_at=timezone.now() - timezone.timedelta(days=10 - index),
+            )
+            for index in range(3)
+        ]
+    
+    def get(self, url, **kwargs):
+        response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response.get('X-Page-Cache')
+    
+    def test_hit_runs_no_queries(self):
+        """A second anonymous request is served from the cache."""
+        url = reverse('blog:post_list')
+        self.assertEqual(self.get(url), 'miss')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(url), 'hit')
+    
+    def test_content_edit_only_expires_dependent_pages(self):
+        """Editing a post expires the pages showing it and nothing else."""
+        edited = self.posts[0].get_absolute_url()
+        unrelated = self.posts[2].get_absolute_url()
+        listing = reverse('blog:post_list')
+        for url in (edited, unrelated, listing):
+            self.get(url)
+        
+        self.posts[0].title = 'Renamed'
+        self.posts[0].save()
+        
+        self.assertEqual(self.get(edited), 'miss')
+        self.assertEqual(self.get(unrelated), 'hit')
+        self.assertContains(self.client.get(listing), 'Renamed')
+    
+    def test_publishing_expires_lists(self):
+        """Publishing a post expires the pages that list posts."""
+        url = reverse('blog:post_list')
+        self.get(url)
+        Post.objects.create(
+            title='Brand new', slug='brand-new', content='Content', author=self.user,
+            category=self.category, is_published=True, published_at=timezone.now(),
+        )
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Brand new')
+    
+    def test_tag_change_expires_tag_cloud(self):
+        """Tagging a post expires the pages showing the tag cloud."""
+        url = reverse('blog:post_list')
+        self.get(url)
+        self.posts[1].tags.add('caching')
+        self.assertContains(self.client.get(url), 'caching')
+    
+    def test_bypass(self):
+        """Logged-in users and unknown query parameters skip the cache."""
+        url = reverse('blog:post_list')
+        self.get(url)
+        self.assertIsNone(self.get(url, data={'search': 'post'}))
+        self.client.login(username='writer', password='testpass123')
+        self.assertIsNone(self.get(url))
+        self.assertEqual(page_stats()['blog:post_list'], {'hits': 0, 'misses': 1, 'stale': 0, 'bypassed': 2})
+    
+    def test_csrf_token_is_per_visitor(self):
+        """Cached pages carry the CSRF token of the visitor being served."""
+        url = reverse('core:home')
+        self.get(url)
+        response = Client().get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        token = response.content.decode().split('name="csrf-token" content="')[1].split('"')[0]
+        self.assertEqual(_unmask_cipher_token(token), response.cookies['csrftoken'].value)
+    
+    def test_hits_still_count_post_views(self):
+        """Serving a post from the cache still records the view."""
+        url = self.posts[0].get_absolute_url()
+        self.get(url)
+        self.assertEqual(self.get(url), 'hit')
+        self.assertEqual(pending_views(self.posts[0].pk), 2)
+    
+    def test_stats_command(self):
+        """The stats command reports the hit rate per URL pattern."""
+        self.get(reverse('core:home'))
+        self.get(reverse('core:home'))
+        out = StringIO()
+        call_command('page_cache_stats', '--reset', stdout=out)
+        self.assertIn('core:home: 1 hits, 1 misses, 0 stale, 0 bypassed (50.0% hit rate)', out.getvalue())
+        self.assertEqual(page_stats(), {})
+
+
+class SiteSnapshotTest(TestCase):
+    """Test the snapshot behind the site context processors."""
+    
+    def setUp(self):
+        cache.clear()
+        clear_snapshot()
+        self.now = timezone.now()
+    
+    def context(self):
+        from .context_processors import active_announcements, site_settings
+        request = RequestFactory().get('/')
+        return {**site_settings(request), **active_announcements(request)}
+    
+    def announce(self, title, **kwargs):
+        return Announcement.objects.create(title=title, message='Message', **kwargs)
+    
+    def test_renders_without_queries(self):
+        """Once loaded, the snapshot serves renders without touching the DB."""
+        SiteSettings.objects.create(pk=1, site_title='Snapshot')
+        self.announce('Live', start_date=self.now - timezone.timedelta(hours=1))
+        self.context()
+        with self.assertNumQueries(0):
+            context = self.context()
+        self.assertEqual(context['site_settings'].site_title, 'Snapshot')
+        self.assertEqual([a.title for a in context['active_announcements']], ['Live'])
+        self.assertTrue(context['has_announcements'])
+    
+    def test_missing_settings_are_not_created(self):
+        """Rendering without a settings row does not write one."""
+        self.assertEqual(self.context()['site_settings'].site_title, SiteSettings().site_title)
+        self.assertFalse(SiteSettings.objects.exists())
+    
+    def test_save_reloads_snapshot(self):
+        """Saving settings or announcements bumps the snapshot version."""
+        settings = SiteSettings.objects.create(pk=1, site_title='Before')
+        self.context()
+        settings.site_title = 'After'
+        settings.save()
+        self.announce('New', start_date=self.now - timezone.timedelta(minutes=1))
+        context = self.context()
+        self.assertEqual(context['site_settings'].site_title, 'After')
+        self.assertEqual([a.title for a in context['active_announcements']], ['New'])
+    
+    def test_schedule_boundaries(self):
+        """Scheduled announcements appear and expire on time."""
+        self.announce(
+            'Ending', start_date=self.now - timezone.timedelta(hours=1),
+            end_date=self.now + timezone.timedelta(hours=1),
+        )
+        self.announce('Upcoming', start_date=self.now + timezone.timedelta(hours=2))
+        self.assertEqual([a.title for a in self.context()['active_announcements']], ['Ending'])
+        self.assertEqual(get_snapshot().expires_at, self.now + timezone.timedelta(hours=1))
+        
+        with mock.patch('core.snapshot.timezone.now', return_value=self.now + timezone.timedelta(minutes=90)):
+            self.assertEqual(self.context()['active_announcements'], [])
+        with mock.patch('core.snapshot.timezone.now', return_value=self.now + timezone.timedelta(hours=3)):
+            self.assertEqual([a.title for a in self.context()['active_announcements']], ['Upcoming'])
+
+
+class ImageDerivativeTest(TestCase):
+    """Test responsive image derivatives of covers and avatars."""
+    
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_WIDTHS=(100, 200, 400))
+        self.override.enable()
+        self.user = User.objects.create_user(username='author', password='pass')
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def upload(self, name='cover.png', size=(300, 150), color='red'):
+        output = BytesIO()
+        Image.new('RGB', size, color).save(output, 'PNG')
+        return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+    
+    def create_post(self, title='Post', **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(title=title, content='Body', author=self.user, cover_image=self.upload(**kwargs))
+    
+    def render(self, post):
+        template = Template('{% load core_extras %}{% responsive_image post.cover_image sizes="50vw" alt=post.title %}')
+        return template.render(Context({'post': post}))
+    
+    def test_derivatives_generated_after_commit(self):
+        """Saving only schedules the work; it runs once the transaction commits."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(title='Post', content='Body', author=self.user, cover_image=self.upload())
+        self.assertFalse(ImageDerivative.objects.exists())
+        for callback in callbacks:
+            callback()
+        
+        source = ImageSource.objects.get(path=post.cover_image.name)
+        self.assertEqual((source.width, source.height), (300, 150))
+        self.assertEqual(
+            sorted(ImageDerivative.objects.values_list('format', 'width', 'height')),
+            [('jpeg', 100, 50), ('jpeg', 200, 100), ('jpeg', 300, 150),
+             ('webp', 100, 50), ('webp', 200, 100), ('webp', 300, 150)],
+        )
+    
+    def test_unchanged_bytes_are_not_encoded_again(self):
+        """Re-saving a model or uploading the same bytes again reuses the derivatives."""
+        post = self.create_post()
+        with mock.patch('core.images._encode') as encode:
+            with self.captureOnCommitCallbacks(execute=True):
+                post.save()
+            copy = self.create_post(title='Copy')
+        encode.assert_not_called()
+        self.assertEqual(copy.cover_image.name, post.cover_image.name)
+        self.assertEqual(ImageDerivative.objects.count(), 6)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            post.cover_image = self.upload(color='blue')
+            post.save()
+        self.assertEqual(ImageDerivative.objects.count(), 12)
+    
+    def test_responsive_image_tag(self):
+        """The tag renders srcsets with the intrinsic size, or the original while pending."""
+        with self.captureOnCommitCallbacks():
+            pending = Post.objects.create(title='Pending', content='Body', author=self.user, cover_image=self.upload())
+        html = self.render(pending)
+        self.assertTrue(html.startswith('<img src="%s"' % pending.cover_image.url))
+        self.assertNotIn('srcset', html)
+        
+        post = self.create_post()
+        html = self.render(post)
+        self.assertIn('<source type="image/webp" srcset="', html)
+        self.assertIn('.webp 100w, ', html)
+        self.assertIn('300.jpg 300w"', html)
+        self.assertIn('height="150"', html)
+        self.assertIn('width="300"', html)
+        self.assertIn('alt="Post"', html)
+        with self.assertNumQueries(0):
+            self.render(post)
+
+
+class ContentAddressedStorageTest(TestCase):
+    """Test content-addressed media files and their reference counts."""
+    
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.user = User.objects.create_user(username='author', password='pass')
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def image(self, color='red'):
+        output = BytesIO()
+        Image.new('RGB', (40, 20), color).save(output, 'PNG')
+        return output.getvalue()
+    
+    def create_post(self, title, content='Body', color='red'):
+        cover = SimpleUploadedFile('Cover.PNG', self.image(color), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(title=title, content=content, author=self.user, cover_image=cover)
+    
+    def test_identical_uploads_share_one_file(self):
+        """The same bytes are stored once under a name derived from their hash."""
+        first = self.create_post('First')
+        second = self.create_post('Second')
+        sha256 = hashlib.sha256(self.image()).hexdigest()
+        self.assertEqual(first.cover_image.name, blob_name('blog/covers', sha256, '.PNG'))
+        self.assertEqual(first.cover_image.name, f'blog/covers/{sha256[:2]}/{sha256[2:4]}/{sha256}.png')
+        self.assertEqual(second.cover_image.name, first.cover_image.name)
+        self.assertEqual(os.listdir(os.path.dirname(first.cover_image.path)), [f'{sha256}.png'])
+    
+    def test_reference_counts_follow_rows(self):
+        """Rows referencing a file are counted; replacing or deleting them releases it."""
+        first = self.create_post('First')
+        second = self.create_post('Second')
+        red = Blob.objects.get(path=first.cover_image.name)
+        self.assertEqual(red.ref_count, 2)
+        self.assertEqual(red.size, len(self.image()))
+        
+        second.cover_image = SimpleUploadedFile('blue.png', self.image('blue'))
+        second.save()
+        self.assertEqual(Blob.objects.get(path=first.cover_image.name).ref_count, 1)
+        self.assertEqual(Blob.objects.get(path=second.cover_image.name).ref_count, 1)
+        
+        first.delete()
+        self.assertEqual(Blob.objects.get(path=red.path).ref_count, 0)
+        self.assertTrue(blob_storage.exists(red.path))
+        
+        Blob.objects.update(ref_count=7)
+        self.assertEqual(recount(), 2)
+        self.assertEqual(dict(Blob.objects.values_list('path', 'ref_count')), {red.path: 0, second.cover_image.name: 1})
+    
+    def test_dedupe_command_moves_existing_files(self):
+        """Files saved under their upload names are moved to blobs and duplicates removed."""
+        for name in ('blog/covers/a.png', 'blog/covers/b.png', 'uploads/documents/notes.pdf'):
+            os.makedirs(os.path.join(self.media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as output:
+                output.write(b'notes' if name.endswith('.pdf') else self.image())
+        post = Post.objects.create(title='Old', content='![cover](/media/blog/covers/b.png)', author=self.user)
+        Post.objects.filter(pk=post.pk).update(cover_image='blog/covers/a.png')
+        
+        out = StringIO()
+        call_command('dedupe_media', '--dry-run', stdout=out)
+        self.assertIn('Would move 3 files, 1 duplicates', out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, 'blog/covers/a.png')))
+        
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('Moved 3 files, 1 duplicates', out.getvalue())
+        post.refresh_from_db()
+        sha256 = hashlib.sha256(self.image()).hexdigest()
+        self.assertEqual(post.cover_image.name, blob_name('blog/covers', sha256, '.png'))
+        self.assertEqual(post.content, f'![cover](/media/{post.cover_image.name})')
+        self.assertTrue(os.path.exists(post.cover_image.path))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'blog/covers/a.png')))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'blog/covers/b.png')))
+        self.assertEqual(Blob.objects.get(path=post.cover_image.name).ref_count, 1)
+        
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('Moved 0 files', out.getvalue())
+
+
+class MediaGarbageTest(TestCase):
+    """Test the garbage collector of unreferenced media files."""
+    
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_GC_GRACE_PERIOD=60,
+                                          MEDIA_GC_QUARANTINE_DIR=os.path.join(self.media_root, '.quarantine'))
+        self.override.enable()
+        self.user = User.objects.create_user(username='author', password='pass')
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def write(self, name, content=b'data', age=3600, root=None):
+        path = os.path.join(root or self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as output:
+            output.write(content)
+        stamp = timezone.now().timestamp() - age
+        os.utime(path, (stamp, stamp))
+        return path
+    
+    def test_referenced_paths(self):
+        """File fields and URLs inside bodies are references."""
+        Post.objects.create(title='Post', author=self.user, cover_image='blog/covers/cover.png',
+                            content='<img src="/media/uploads/images/in%20body.png"> [doc](/media/uploads/documents/a.pdf)')
+        Project.objects.create(title='Project', slug='project', description='x', short_description='x', image='projects/p.png')
+        self.assertTrue({'blog/covers/cover.png', 'uploads/images/in body.png', 'uploads/documents/a.pdf',
+                         'projects/p.png'} <= referenced_paths())
+    
+    def test_collect_quarantines_then_deletes(self):
+        """Old unreferenced files are quarantined, then deleted after the grace period."""
+        Post.objects.create(title='Post', author=self.user, content='![x](/media/uploads/images/used.png)')
+        used = self.write('uploads/images/used.png')
+        orphan = self.write('uploads/images/orphan.png', b'orphan')
+        fresh = self.write('uploads/images/fresh.png', age=0)
+        upload = self.write('.uploads/partial.part')
+        
+        out = StringIO()
+        call_command('collect_media_garbage', '--dry-run', stdout=out)
+        self.assertIn('Would quarantine 1 files', out.getvalue())
+        self.assertTrue(os.path.exists(orphan))
+        
+        report = collect()
+        self.assertEqual((report.quarantined, report.quarantined_bytes, report.deleted), (1, 6, 0))
+        quarantined = os.path.join(self.media_root, '.quarantine', 'uploads/images/orphan.png')
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(quarantined))
+        for path in (used, fresh, upload):
+            self.assertTrue(os.path.exists(path))
+        
+        self.assertEqual(collect().deleted, 0)
+        stamp = timezone.now().timestamp() - 120
+        os.utime(quarantined, (stamp, stamp))
+        out = StringIO()
+        call_command('collect_media_garbage', stdout=out)
+        self.assertIn('Deleted 1 files, 6\xa0bytes reclaimed', out.getvalue())
+        self.assertFalse(os.path.exists(quarantined))
+    
+    def test_deleted_library_upload_is_collected(self):
+        """A library upload no body uses is collected, even after reconcile re-indexes it."""
+        from blog.media_library import reconcile, remove_file
+        
+        kept = self.write('uploads/images/kept.png', b'kept')
+        deleted = self.write('uploads/images/deleted.png', b'deleted')
+        Post.objects.create(title='Post', author=self.user, content='<img src="/media/uploads/images/kept.png">')
+        reconcile()
+        remove_file('uploads/images/deleted.png')
+        self.assertEqual(reconcile().imported, ['uploads/images/deleted.png'])
+        
+        self.assertEqual(collect().quarantined, 1)
+        self.assertFalse(os.path.exists(deleted))
+        self.assertTrue(os.path.exists(kept))
+        self.assertEqual(reconcile().missing, ['uploads/images/deleted.png'])
+    
+    def test_referenced_again_is_restored(self):
+        """A quarantined file that is referenced again moves back into place."""
+        self.write('uploads/documents/a.pdf', root=os.path.join(self.media_root, '.quarantine'))
+        Post.objects.create(title='Post', author=self.user, content='[doc](/media/uploads/documents/a.pdf)')
+        self.assertEqual(collect().restored, 1)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, 'uploads/documents/a.pdf')))
+
+
+class OutboxTest(TestCase):
+    """Test the transactional email outbox and its worker."""
+    
+    def test_contact_queues_email_with_message(self):
+        """The contact form writes the email to the outbox instead of sending it."""
+        response = self.client.post(reverse('core:contact'), {
+            'name': 'Reader', 'email': 'reader@example.com', 'subject': 'Hello', 'message': 'A long enough message.',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.dedupe_key, f'contact:{ContactMessage.objects.get().pk}')
+        self.assertIn('Hello', email.subject)
+    
+    def test_registration_queues_one_welcome_email(self):
+        """Registering queues the welcome email once, not once per code path."""
+        User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        self.assertEqual(OutboundEmail.objects.filter(dedupe_key__startswith='welcome:').count(), 1)
+    
+    def test_dedupe_key(self):
+        """Enqueueing the same key twice keeps one email."""
+        first = enqueue('Subject', 'Body', ['a@example.com'], dedupe_key='key')
+        second = enqueue('Other', 'Body', ['a@example.com'], dedupe_key='key')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+    
+    def test_worker_sends_over_one_connection(self):
+        """The worker sends due emails in batches and marks them sent."""
+        for index in range(5):
+            enqueue(f'Subject {index}', 'Body', ['a@example.com'], html_body='<p>Body</p>')
+        later = enqueue('Later', 'Body', ['a@example.com'])
+        OutboundEmail.objects.filter(pk=later.pk).update(next_attempt_at=timezone.now() + timezone.timedelta(hours=1))
+        
+        with mock.patch('core.outbox.get_outbox_connection', wraps=get_outbox_connection) as connect:
+            result = drain(batch_size=2)
+        connect.assert_called_once()
+        self.assertEqual(result.sent, 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>Body</p>', 'text/html')])
+        self.assertEqual(OutboundEmail.objects.filter(status='sent').count(), 5)
+        self.assertEqual(OutboundEmail.objects.get(status='pending').subject, 'Later')
+    
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BACKOFF=60)
+    def test_failed_sends_back_off_then_fail(self):
+        """A failing send is retried later and marked failed after the last attempt."""
+        email = enqueue('Subject', 'Body', ['a@example.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(drain().retried, 1)
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, 1)
+            self.assertEqual(email.last_error, 'down')
+            self.assertGreater(email.next_attempt_at, timezone.now() + timezone.timedelta(seconds=50))
+            
+            self.assertEqual(drain().sent + drain().retried, 0)
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(drain().failed, 1)
+        self.assertEqual(OutboundEmail.objects.get().status, 'failed')
+        self.assertEqual(len(mail.outbox), 0)
+    
+    def test_run_mail_worker_once(self):
+        """The worker command drains the outbox and reports what it sent."""
+        enqueue('Subject', 'Body', ['a@example.com'])
+        out = StringIO()
+        call_command('run_mail_worker', '--once', stdout=out)
+        self.assertIn('Sent 1 emails', out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES={'contact': '3/m', 'login': '100/m'},
+                   THROTTLE_LOCKOUT_THRESHOLD=3, THROTTLE_LOCKOUT_DURATION=60)
+class ThrottleTest(TestCase):
+    """Test request throttling and login lockouts."""
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_sliding_window(self):
+        """The previous window counts in proportion to its overlap."""
+        self.assertEqual([hit('scope', 'ip', '4/m', now=60 * 10 + 30) for _ in range(4)], [0, 0, 0, 0])
+        self.assertEqual(hit('scope', 'ip', '4/m', now=60 * 10 + 31), 29)
+        # Half a minute later half of the previous 5 (rejected ones included) still count
+        self.assertEqual(hit('scope', 'ip', '4/m', now=60 * 11 + 30), 0)
+        self.assertEqual(hit('scope', 'ip', '4/m', now=60 * 11 + 30), 6)
+        self.assertEqual(hit('scope', 'other', '4/m', now=60 * 11 + 30), 0)
+    
+    def test_throttled_view_returns_429_before_queries(self):
+        """Requests over the rate get a 429 with Retry-After and no database work."""
+        data = {'name': 'Reader', 'email': 'reader@example.com', 'subject': 'Hi', 'message': 'A long enough message.'}
+        for _ in range(3):
+            self.assertEqual(self.client.post(reverse('core:contact'), data).status_code, 302)
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('core:contact'), data)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) > 0)
+        self.assertEqual(ContactMessage.objects.count(), 3)
+        self.assertEqual(self.client.get(reverse('core:contact')).status_code, 200)
+    
+    def test_progressive_login_lockout(self):
+        """Repeated failures lock out the username and IP, each time for longer."""
+        User.objects.create_user(username='victim', password='right-password')
+        for _ in range(3):
+            self.client.post(reverse('accounts:login'), {'username': 'victim', 'password': 'wrong'})
+        self.assertEqual(lockout_remaining('victim', '127.0.0.1'), 60)
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('accounts:login'), {'username': 'victim', 'password': 'right-password'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.post(reverse('accounts:login'), {'username': 'other', 'password': 'x'}).status_code, 200)
+        
+        for _ in range(2):
+            self.assertEqual(record_failure('victim', '127.0.0.1'), 0)
+        self.assertEqual(record_failure('victim', '127.0.0.1'), 120)
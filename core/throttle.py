@@ -0,0 +1,162 @@
+"""Cache-backed request throttling and login lockouts.
+
+``@throttle(scope)`` limits a view to the rate configured for ``scope`` in
+``THROTTLE_RATES`` (``'10/m'``), per client IP. Requests are counted in a
+sliding window made of two fixed windows: the previous window's count is
+weighted by how much of it still overlaps the sliding window. Counting
+is one atomic ``add()``/``incr()`` pair on the cache, so a flood of requests
+is answered with a ``429`` and a ``Retry-After`` header before the view, the
+session or the ORM is touched.
+
+Failed logins are counted per (username, IP). After
+``THROTTLE_LOCKOUT_THRESHOLD`` failures that pair is locked out, and each
+further lockout doubles in length up to ``THROTTLE_LOCKOUT_MAX``.
+"""
+
+import hashlib
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+from django.utils.translation import gettext as _
+
+KEY_PREFIX = 'throttle:'
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def get_throttle_cache():
+    """Return the cache holding throttle counters."""
+    return caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+
+def parse_rate(rate):
+    """Return ``(requests, seconds)`` of a rate such as ``'10/m'`` or ``'100/5m'``."""
+    count, period = rate.split('/')
+    multiplier = int(period[:-1] or 1)
+    return int(count), multiplier * PERIODS[period[-1]]
+
+
+def enabled():
+    return getattr(settings, 'THROTTLE_ENABLED', True)
+
+
+def client_ip(request):
+    """Return the client address set by the reverse proxy, or the peer address."""
+    return request.META.get('HTTP_X_REAL_IP') or request.META.get('REMOTE_ADDR', '')
+
+
+def _digest(value):
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+def _incr(cache, key, timeout):
+    cache.add(key, 0, timeout=timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key expired between add() and incr()
+        cache.set(key, 1, timeout=timeout)
+        return 1
+
+
+def hit(scope, ident, rate, now=None):
+    """Count one request of ``ident`` against ``rate``.
+
+    Returns ``0`` when the request is allowed, otherwise the number of
+    seconds until it would be.
+    """
+    limit, period = parse_rate(rate)
+    now = time.time() if now is None else now
+    window = int(now // period)
+    elapsed = (now % period) / period
+    cache = get_throttle_cache()
+    prefix = f'{KEY_PREFIX}{scope}:{_digest(ident)}:'
+
+    previous = cache.get(f'{prefix}{window - 1}', 0)
+    current = _incr(cache, f'{prefix}{window}', period * 2)
+    if previous * (1 - elapsed) + current <= limit:
+        return 0
+
+    # Rejected requests still count, so hammering keeps the window full
+    if current > limit:
+        return math.ceil(period * (1 - elapsed))
+    # The previous window's weight decays linearly until the estimate fits
+    excess = previous * (1 - elapsed) + current - limit
+    return max(1, math.ceil(excess / previous * period))
+
+
+def too_many_requests(retry_after, as_json=False):
+    """Return a ``429`` response asking the client to retry after ``retry_after`` seconds."""
+    message = _('Too many requests. Please try again later.')
+    if as_json:
+        response = JsonResponse({'error': message, 'retry_after': retry_after}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def throttle(scope, methods=('POST',), as_json=False):
+    """Limit a view to ``THROTTLE_RATES[scope]`` requests per client IP.
+
+    Only requests with one of ``methods`` are counted (``None`` counts all).
+    ``as_json`` answers rejected requests with a JSON body.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = getattr(settings, 'THROTTLE_RATES', {}).get(scope)
+            if rate and enabled() and (methods is None or request.method in methods):
+                retry_after = hit(scope, client_ip(request), rate)
+                if retry_after:
+                    return too_many_requests(retry_after, as_json)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Login lockouts -----------------------------------------------------------
+
+def _lockout_prefix(username, ip):
+    return f'{KEY_PREFIX}lockout:{_digest(f"{username.lower()}|{ip}")}:'
+
+
+def lockout_remaining(username, ip):
+    """Return the seconds left of the lockout of (``username``, ``ip``), or ``0``."""
+    if not enabled():
+        return 0
+    until = get_throttle_cache().get(f'{_lockout_prefix(username, ip)}until')
+    return max(0, math.ceil(until - time.time())) if until else 0
+
+
+def record_failure(username, ip):
+    """Count a failed login; lock the pair out once it reaches the threshold.
+
+    Returns the length of the lockout that started, or ``0``.
+    """
+    if not enabled():
+        return 0
+    cache = get_throttle_cache()
+    prefix = _lockout_prefix(username, ip)
+    threshold = getattr(settings, 'THROTTLE_LOCKOUT_THRESHOLD', 5)
+    base = getattr(settings, 'THROTTLE_LOCKOUT_DURATION', 60)
+    longest = getattr(settings, 'THROTTLE_LOCKOUT_MAX', 60 * 60 * 24)
+
+    failures = _incr(cache, f'{prefix}failures', longest)
+    if failures < threshold:
+        return 0
+    level = _incr(cache, f'{prefix}level', longest * 2)
+    duration = min(base * 2 ** (level - 1), longest)
+    cache.set(f'{prefix}until', time.time() + duration, timeout=duration)
+    cache.delete(f'{prefix}failures')
+    return duration
+
+
+def reset_failures(username, ip):
+    """Forget the failures and lockout level of (``username``, ``ip``) after a successful login."""
+    prefix = _lockout_prefix(username, ip)
+    get_throttle_cache().delete_many([f'{prefix}failures', f'{prefix}level', f'{prefix}until'])
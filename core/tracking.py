@@ -0,0 +1,67 @@
+"""Dirty-field tracking for models whose saves have costly side effects.
+
+Instances of the models wired up in ``core.signals`` remember the field
+values they were loaded with. Just before a save the values are compared
+(only the ``update_fields`` of a partial save), the changed field names are
+kept on the instance, and the snapshot moves on to the saved values.
+
+``post_save`` receivers decorated with ``when_changed`` then run only for
+new rows or when one of the fields they declare actually changed, so a
+save that touches ``User.last_login`` on login skips them entirely.
+"""
+
+from functools import wraps
+
+
+def _snapshot(instance, fields=None):
+    values = {}
+    for field in instance._meta.concrete_fields:
+        if field.attname in instance.__dict__ and (fields is None or field.name in fields):
+            values[field.name] = instance.__dict__[field.attname]
+    return values
+
+
+def remember(instance):
+    """Remember the values ``instance`` was loaded or created with."""
+    instance._loaded_values = _snapshot(instance)
+    instance._changed_fields = None
+
+
+def record_changes(instance, update_fields=None):
+    """Store the names of the fields a save is about to change and move the snapshot on."""
+    fields = set(update_fields) if update_fields is not None else None
+    current = _snapshot(instance, fields)
+    loaded = getattr(instance, '_loaded_values', {})
+    if instance._state.adding:
+        changed = set(current)
+    else:
+        changed = {name for name, value in current.items() if name not in loaded or loaded[name] != value}
+    instance._changed_fields = frozenset(changed)
+    instance._loaded_values = {**loaded, **current}
+
+
+def mark_saved(instance, **values):
+    """Record ``values`` written with ``QuerySet.update()`` as the stored state."""
+    for name, value in values.items():
+        setattr(instance, name, value)
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **values}
+
+
+def has_changed(instance, *fields):
+    """Return whether the last save of ``instance`` changed any of ``fields``.
+
+    Instances that were saved without tracking count as changed.
+    """
+    changed = getattr(instance, '_changed_fields', None)
+    return changed is None or not changed.isdisjoint(fields)
+
+
+def when_changed(*fields):
+    """Run a ``post_save`` receiver only for new rows or when one of ``fields`` changed."""
+    def decorator(receiver):
+        @wraps(receiver)
+        def wrapper(sender, instance, created=False, **kwargs):
+            if created or has_changed(instance, *fields):
+                return receiver(sender, instance, created=created, **kwargs)
+        return wrapper
+    return decorator
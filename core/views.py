@@ -1,25 +1,39 @@
+import datetime
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
-from django.core.mail import send_mail
 from django.conf import settings
-from django.http import HttpResponse
+from django.contrib.sitemaps import views as sitemap_views
+from django.http import Http404, HttpResponse
+from django.db import transaction
+from django.utils import timezone
+from django.utils.http import parse_http_date_safe
 from django.views.generic import ListView, DetailView
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.utils.decorators import method_decorator
+
+from . import outbox, prerender
 from .models import Project, ContactMessage, SiteSettings
+from .pagecache import cached_page
 from .forms import ContactForm
+from .pagination import CursorPaginationMixin
+from .search import attach_snippets, search_queryset
+from .sitemaps import section_scope
+from .throttle import throttle
+from blog.cards import post_cards
 from blog.models import Post, Category
 from taggit.models import Tag
 
 
+@cached_page()
 def home(request):
     """Home page view."""
     # Get featured projects
-    featured_projects = Project.objects.filter(is_featured=True)[:3]
+    featured_projects = Project.objects.filter(is_featured=True).only(*Project.CARD_FIELDS)[:3]
     
     # Get latest blog posts
-    latest_posts = Post.objects.filter(is_published=True)[:3]
+    latest_posts = post_cards(Post.objects.filter(is_published=True))[:3]
     
     context = {
         'featured_projects': featured_projects,
@@ -33,35 +47,32 @@ def about(request):
     return render(request, 'core/about.html')
 
 
+@throttle('contact')
 def contact(request):
     """Contact page view."""
     if request.method == 'POST':
         form = ContactForm(request.POST)
         if form.is_valid():
-            # Save message to database
-            contact_message = ContactMessage.objects.create(
-                name=form.cleaned_data['name'],
-                email=form.cleaned_data['email'],
-                subject=form.cleaned_data['subject'],
-                message=form.cleaned_data['message']
-            )
-            
-            # Send email notification
-            try:
-                send_mail(
+            # Save message to database and queue the notification with it
+            with transaction.atomic():
+                contact_message = ContactMessage.objects.create(
+                    name=form.cleaned_data['name'],
+                    email=form.cleaned_data['email'],
+                    subject=form.cleaned_data['subject'],
+                    message=form.cleaned_data['message']
+                )
+                
+                outbox.enqueue(
                     subject=f"رسالة جديدة من الموقع: {form.cleaned_data['subject']}",
-                    message=f"""اسم المرسل: {form.cleaned_data['name']}
+                    body=f"""اسم المرسل: {form.cleaned_data['name']}
 البريد الإلكتروني: {form.cleaned_data['email']}
 الموضوع: {form.cleaned_data['subject']}
 
 الرسالة:
 {form.cleaned_data['message']}""",
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[settings.DEFAULT_FROM_EMAIL],
-                    fail_silently=True,
+                    recipients=[settings.DEFAULT_FROM_EMAIL],
+                    dedupe_key=f'contact:{contact_message.pk}',
                 )
-            except Exception as e:
-                pass  # Handle email sending errors gracefully
             
             messages.success(request, _('تم إرسال رسالتك بنجاح. سأتواصل معك قريباً!'))
             return redirect('core:contact')
@@ -71,7 +82,8 @@ def contact(request):
     return render(request, 'core/contact.html', {'form': form})
 
 
-class ProjectListView(ListView):
+@method_decorator(cached_page(query_params=('page',)), name='dispatch')
+class ProjectListView(CursorPaginationMixin, ListView):
     """Projects list view."""
     model = Project
     template_name = 'core/projects.html'
@@ -79,9 +91,10 @@ class ProjectListView(ListView):
     paginate_by = 9
     
     def get_queryset(self):
-        return Project.objects.all()
+        return Project.objects.only(*Project.CARD_FIELDS)
 
 
+@method_decorator(cached_page(), name='dispatch')
 class ProjectDetailView(DetailView):
     """Project detail view."""
     model = Project
@@ -114,6 +127,37 @@ def robots_txt(request):
     return HttpResponse("\n".join(lines), content_type="text/plain")
 
 
+def _sitemap_document(response):
+    response.render()
+    last_modified = parse_http_date_safe(response.get('Last-Modified', ''))
+    return prerender.build_document(
+        response.content,
+        response['Content-Type'],
+        datetime.datetime.fromtimestamp(last_modified, datetime.timezone.utc) if last_modified else timezone.now(),
+        # Scheduled posts go live without a save
+        prerender.timeout_until(Post.objects.next_scheduled_at()),
+    )
+
+
+def sitemap_index(request, sitemaps):
+    """Sitemap index, pre-rendered until one of its sections changes."""
+    generations = [prerender.generation(section_scope(section)) for section in sitemaps]
+    return prerender.serve(
+        request, 'sitemaps', ':'.join(['index', request.scheme, *generations]),
+        lambda: _sitemap_document(sitemap_views.index(request, sitemaps, sitemap_url_name='sitemap_section')),
+    )
+
+
+def sitemap_section(request, sitemaps, section):
+    """One page of a sitemap section, pre-rendered until the section changes."""
+    if section not in sitemaps:
+        raise Http404(f'No sitemap available for section: {section!r}')
+    return prerender.serve(
+        request, section_scope(section), ':'.join([request.scheme, request.GET.get('p', '1')]),
+        lambda: _sitemap_document(sitemap_views.sitemap(request, sitemaps, section=section)),
+    )
+
+
 # Custom error views
 def custom_404(request, exception):
     """Custom 404 error page."""
@@ -148,29 +192,17 @@ def global_search(request):
         # Search in blog posts
         if search_type in ['all', 'posts']:
             posts_queryset = Post.objects.published().select_related('author', 'category').prefetch_related('tags')
-            posts_queryset = posts_queryset.filter(
-                Q(title__icontains=query) |
-                Q(excerpt__icontains=query) |
-                Q(content__icontains=query) |
-                Q(tags__name__icontains=query)
-            ).distinct()
+            posts_queryset = search_queryset(posts_queryset, query, snippets=True)
             
             if category_slug:
                 posts_queryset = posts_queryset.filter(category__slug=category_slug)
             
-            posts = posts_queryset[:6]  # Limit results
+            posts = attach_snippets(posts_queryset[:6], query)  # Limit results
         
         # Search in projects
         if search_type in ['all', 'projects']:
-            projects_queryset = Project.objects.all()
-            projects_queryset = projects_queryset.filter(
-                Q(title__icontains=query) |
-                Q(short_description__icontains=query) |
-                Q(description__icontains=query) |
-                Q(technologies__icontains=query)
-            ).distinct()
-            
-            projects = projects_queryset[:6]  # Limit results
+            projects_queryset = search_queryset(Project.objects.all(), query, snippets=True)
+            projects = attach_snippets(projects_queryset[:6], query)  # Limit results
     
     # Get categories for filter
     categories = Category.objects.filter(posts__is_published=True).distinct()
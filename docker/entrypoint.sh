@@ -58,6 +58,9 @@ run_migrations() {
     python manage.py makemigrations --noinput
     python manage.py migrate --noinput
     
+    # Fill in the derived columns of posts saved by an older content analysis
+    python manage.py analyze_posts
+    
     print_success "Database migrations completed!"
 }
 
@@ -126,11 +129,18 @@ setup_cron() {
     # Create crontab file
     cat > /tmp/crontab << EOF
 # Django management commands
+* * * * * cd /app && python manage.py flush_view_counts
+* * * * * cd /app && python manage.py update_related_posts
 0 2 * * * cd /app && python manage.py clearsessions
 0 3 * * * cd /app && python manage.py cleanup_uploads
+15 3 * * * cd /app && python manage.py reconcile_media
+45 3 * * * cd /app && python manage.py collect_media_garbage
 0 4 * * * cd /app && python manage.py update_index
+15 4 * * * cd /app && python manage.py rebuild_related_posts
+30 4 * * * cd /app && python manage.py reconcile_counters
+45 4 * * * cd /app && python manage.py compact_login_attempts
 30 4 * * 0 cd /app && python manage.py dbbackup
-0 5 * * * cd /app && python manage.py send_mail
+0 9 * * 1 cd /app && python manage.py send_newsletter_digest
 
 # Log rotation
 0 6 * * * /usr/sbin/logrotate -f /etc/logrotate.conf
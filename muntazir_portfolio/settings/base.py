@@ -117,6 +117,18 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resumable chunked uploads are assembled here, on the media volume so the
+# finished file is moved into place; nginx does not serve dot-directories
+CHUNKED_UPLOAD_DIR = MEDIA_ROOT / '.uploads'
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY = 60 * 60 * 24
+
+# Unreferenced media older than the grace period is quarantined by
+# collect_media_garbage and deleted after another grace period
+MEDIA_GC_GRACE_PERIOD = 60 * 60 * 24 * 7
+MEDIA_GC_QUARANTINE_DIR = MEDIA_ROOT / '.quarantine'
+MEDIA_GC_WORKERS = 4
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -128,16 +140,83 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "tailwind"
 CRISPY_TEMPLATE_PACK = "tailwind"
 
 # Markdownx
-MARKDOWNX_MARKDOWNIFY_FUNCTION = 'markdownx.utils.markdownify'
+MARKDOWNX_MARKDOWNIFY_FUNCTION = 'core.rendering.markdownify'
 MARKDOWNX_MARKDOWN_EXTENSIONS = [
     'markdown.extensions.extra',
     'markdown.extensions.codehilite',
     'markdown.extensions.toc',
 ]
 
+# Rendered Markdown, TOCs and highlight counters are cached here by content hash
+MARKDOWN_RENDER_CACHE = 'default'
+MARKDOWN_RENDER_TIMEOUT = 60 * 60 * 24 * 30
+
+# Approximate totals of cursor-paginated lists are cached for this many seconds
+PAGINATION_COUNT_TIMEOUT = 300
+
+# Full-page cache for anonymous visitors; entries expire on dependency changes
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE = 'default'
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Cache holding the version of the per-worker settings/announcements snapshot
+SITE_SNAPSHOT_CACHE = 'default'
+
+# Pre-rendered feeds and sitemaps; a content change renders them again
+PRERENDER_CACHE = 'default'
+PRERENDER_TIMEOUT = 60 * 60 * 24 * 7
+
+# Responsive cover/avatar copies, encoded on a worker pool after a save
+IMAGE_DERIVATIVE_WIDTHS = (160, 320, 640, 960, 1280)
+IMAGE_DERIVATIVE_FORMATS = ('webp', 'jpeg')
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_DERIVATIVE_WORKERS = 2
+IMAGE_DERIVATIVES_ASYNC = True
+IMAGE_DERIVATIVE_CACHE = 'default'
+
+# Post bodies with lazy media and responsive images, cached by content hash
+POST_BODY_CACHE = 'default'
+POST_BODY_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Approved comments per page of a post (cursor-paginated with ?comments=)
+POST_COMMENTS_PER_PAGE = 20
+
 # Taggit
 TAGGIT_CASE_INSENSITIVE = True
 
+# Request throttling (core.throttle): requests per client IP in a sliding
+# window, and progressive lockouts per (username, IP) after failed logins
+THROTTLE_ENABLED = True
+THROTTLE_CACHE = 'default'
+THROTTLE_RATES = {
+    'login': '10/m',
+    'password_reset': '5/h',
+    'comment': '10/m',
+    'contact': '5/h',
+    'upload': '60/m',
+    'ajax_check': '30/m',
+}
+THROTTLE_LOCKOUT_THRESHOLD = 5
+THROTTLE_LOCKOUT_DURATION = 60
+THROTTLE_LOCKOUT_MAX = 60 * 60 * 24
+
+# Login attempts (accounts.login_log) are queued and written in batches of
+# LOGIN_LOG_BATCH_SIZE or every LOGIN_LOG_FLUSH_INTERVAL seconds;
+# compact_login_attempts keeps raw attempts for LOGIN_LOG_RETENTION and hourly
+# rollups for LOGIN_ROLLUP_HOURLY_RETENTION before folding them into days
+LOGIN_LOG_ASYNC = True
+LOGIN_LOG_BATCH_SIZE = 100
+LOGIN_LOG_FLUSH_INTERVAL = 2
+LOGIN_LOG_QUEUE_SIZE = 10000
+LOGIN_LOG_RETENTION = 60 * 60 * 24 * 7
+LOGIN_ROLLUP_HOURLY_RETENTION = 60 * 60 * 24 * 90
+
+# Blog view counters are buffered in this cache and flushed by flush_view_counts
+BLOG_VIEW_COUNTER_CACHE = 'default'
+
+# Posts waiting for update_related_posts are marked in this cache
+BLOG_RELATED_PENDING_CACHE = 'default'
+
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
@@ -147,6 +226,21 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'contact@yourdomain.com')
 
+# Outgoing email is queued in OutboundEmail and sent by run_mail_worker with
+# OUTBOX_EMAIL_BACKEND (EMAIL_BACKEND when unset); failed sends are retried
+# with exponential backoff
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BACKOFF = 60
+OUTBOX_RETRY_BACKOFF_MAX = 60 * 60 * 6
+OUTBOX_RETENTION = 60 * 60 * 24 * 30
+
+# Newsletter digest (send_newsletter_digest): subscribers fetched per query,
+# messages per second, messages sent before reconnecting, first run's period
+NEWSLETTER_CHUNK_SIZE = 500
+NEWSLETTER_RATE = 10
+NEWSLETTER_MESSAGES_PER_CONNECTION = 100
+NEWSLETTER_DEFAULT_PERIOD = 60 * 60 * 24 * 7
+
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -30,8 +30,21 @@ CACHES = {
 # Disable Redis for tests
 REDIS_URL = None
 
+# Disable the page cache; PageCacheTest enables it explicitly
+PAGE_CACHE_ENABLED = False
+
+# Generate image derivatives inline when the transaction commits
+IMAGE_DERIVATIVES_ASYNC = False
+
+# Tests opt in to throttling with override_settings
+THROTTLE_ENABLED = False
+
+# Write login attempts in the request
+LOGIN_LOG_ASYNC = False
+
 # Test email backend
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+OUTBOX_EMAIL_BACKEND = EMAIL_BACKEND
 
 # Disable Celery for tests
 CELERY_TASK_ALWAYS_EAGER = True
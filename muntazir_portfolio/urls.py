@@ -5,15 +5,22 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
-from django.contrib.sitemaps.views import sitemap
 from django.views.i18n import set_language
-from blog.sitemaps import PostSitemap
-from core.sitemaps import StaticViewSitemap
+from blog.sitemaps import BlogStaticSitemap, CategorySitemap, PostSitemap, TagSitemap
+from books.sitemaps import BookCategorySitemap, BookSitemap
+from core.sitemaps import ProjectSitemap, StaticViewSitemap
+from core.views import sitemap_index, sitemap_section
 
 # Sitemaps
 sitemaps = {
-    'posts': PostSitemap,
     'static': StaticViewSitemap,
+    'blog': BlogStaticSitemap,
+    'posts': PostSitemap,
+    'categories': CategorySitemap,
+    'tags': TagSitemap,
+    'projects': ProjectSitemap,
+    'books': BookSitemap,
+    'book-categories': BookCategorySitemap,
 }
 
 # Non-internationalized URLs
@@ -21,7 +28,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('markdownx/', include('markdownx.urls')),
     path('ckeditor/', include('ckeditor_uploader.urls')),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap.xml', sitemap_index, {'sitemaps': sitemaps}, name='sitemap_index'),
+    path('sitemap-<section>.xml', sitemap_section, {'sitemaps': sitemaps}, name='sitemap_section'),
     path('i18n/setlang/', set_language, name='set_language'),
 ]
 
@@ -35,6 +35,11 @@
         }
     };
 
+    // الملفات الأكبر من هذا الحجم تُرفع على أجزاء قابلة للاستئناف
+    const CHUNKED_UPLOAD_THRESHOLD = 4 * 1024 * 1024; // 4MB
+    const CHUNK_SIZE = 4 * 1024 * 1024; // 4MB
+    const MAX_CHUNK_RETRIES = 5;
+
     // فئة مدير الملفات
     class CKEditorFileManager {
         constructor(editor) {
@@ -282,6 +287,10 @@
 
         // رفع ملف واحد
         async uploadSingleFile(file) {
+            if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+                return await this.uploadChunked(file);
+            }
+
             const formData = new FormData();
             formData.append('upload', file);
             formData.append('csrfmiddlewaretoken', this.getCSRFToken());
@@ -301,6 +310,69 @@
             return await response.json();
         }
 
+        // رفع ملف كبير على أجزاء مع الاستئناف بعد انقطاع الاتصال
+        async uploadChunked(file) {
+            const headers = {
+                'Tus-Resumable': '1.0.0',
+                'X-CSRFToken': this.getCSRFToken(),
+                'X-Requested-With': 'XMLHttpRequest'
+            };
+            const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+            const checksum = 'sha256 ' + btoa(String.fromCharCode(...new Uint8Array(digest)));
+
+            const created = await fetch('/blog/upload/chunked/', {
+                method: 'POST',
+                headers: {
+                    ...headers,
+                    'Upload-Length': String(file.size),
+                    'Upload-Metadata': 'filename ' + btoa(unescape(encodeURIComponent(file.name)))
+                }
+            });
+            if (!created.ok) {
+                throw new Error(`HTTP error! status: ${created.status}`);
+            }
+            const location = created.headers.get('Location');
+
+            let offset = 0;
+            let retries = 0;
+            while (offset < file.size) {
+                try {
+                    const response = await fetch(location, {
+                        method: 'PATCH',
+                        headers: {
+                            ...headers,
+                            'Content-Type': 'application/offset+octet-stream',
+                            'Upload-Offset': String(offset)
+                        },
+                        body: file.slice(offset, offset + CHUNK_SIZE)
+                    });
+                    if (!response.ok && response.status !== 409) {
+                        throw new Error(`HTTP error! status: ${response.status}`);
+                    }
+                    offset = parseInt(response.headers.get('Upload-Offset'), 10);
+                    retries = 0;
+                } catch (error) {
+                    if (++retries > MAX_CHUNK_RETRIES) {
+                        throw error;
+                    }
+                    // استئناف الرفع من آخر إزاحة استلمها الخادم
+                    await new Promise((resolve) => setTimeout(resolve, 1000 * retries));
+                    const status = await fetch(location, { method: 'HEAD', headers });
+                    offset = parseInt(status.headers.get('Upload-Offset'), 10) || offset;
+                }
+                this.updateProgress((offset / file.size) * 100, `رفع ${file.name}...`);
+            }
+
+            const response = await fetch(location + 'finalize/', {
+                method: 'POST',
+                headers: { ...headers, 'Upload-Checksum': checksum }
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return await response.json();
+        }
+
         // إدراج الملف في المحرر
         insertFileIntoEditor(uploadResult, file) {
             const extension = file.name.split('.').pop().toLowerCase();
@@ -387,10 +459,14 @@
             this.loadMediaGallery();
         }
 
-        // تحميل معرض الوسائط
-        async loadMediaGallery() {
+        // تحميل معرض الوسائط (صفحة تلو الأخرى)
+        async loadMediaGallery(cursor = null) {
             try {
-                const response = await fetch('/blog/browse/', {
+                const params = new URLSearchParams();
+                if (cursor) {
+                    params.set('page', cursor);
+                }
+                const response = await fetch('/blog/browse/?' + params.toString(), {
                     headers: {
                         'X-Requested-With': 'XMLHttpRequest'
                     }
@@ -398,7 +474,8 @@
                 
                 if (response.ok) {
                     const data = await response.json();
-                    this.renderMediaGallery(data.files || []);
+                    this.renderMediaGallery(data.files || [], Boolean(cursor));
+                    this.renderLoadMore(data.next);
                 } else {
                     throw new Error('فشل في تحميل الوسائط');
                 }
@@ -408,16 +485,34 @@
             }
         }
 
+        // زر تحميل المزيد من الملفات
+        renderLoadMore(cursor) {
+            const grid = document.getElementById('media-grid');
+            grid.querySelector('.media-load-more')?.remove();
+            if (!cursor) {
+                return;
+            }
+            const button = document.createElement('button');
+            button.className = 'media-load-more';
+            button.textContent = 'تحميل المزيد';
+            button.style.cssText = 'grid-column: 1 / -1; padding: 8px; background: #4f46e5; color: white; border: none; border-radius: 6px; cursor: pointer;';
+            button.addEventListener('click', () => {
+                button.remove();
+                this.loadMediaGallery(cursor);
+            });
+            grid.appendChild(button);
+        }
+
         // عرض معرض الوسائط
-        renderMediaGallery(files) {
+        renderMediaGallery(files, append = false) {
             const grid = document.getElementById('media-grid');
             
-            if (files.length === 0) {
+            if (files.length === 0 && !append) {
                 grid.innerHTML = '<div style="text-align: center; color: #718096; grid-column: 1 / -1;">لا توجد ملفات</div>';
                 return;
             }
             
-            grid.innerHTML = files.map(file => {
+            const html = files.map(file => {
                 const isImage = file.type && file.type.startsWith('image/');
                 return `
                     <div class="media-item" data-url="${file.url}" data-name="${file.name}" style="
@@ -429,7 +524,7 @@
                         text-align: center;
                     " onmouseover="this.style.borderColor='#4f46e5'; this.style.transform='scale(1.05)'" onmouseout="this.style.borderColor='#e2e8f0'; this.style.transform='scale(1)'">
                         ${isImage ? 
-                            `<img src="${file.url}" alt="${file.name}" style="width: 100%; height: 100px; object-fit: cover; border-radius: 4px;">` :
+                            `<img src="${file.thumbnail || file.url}" alt="${file.name}" loading="lazy" style="width: 100%; height: 100px; object-fit: cover; border-radius: 4px;">` :
                             `<div style="height: 100px; display: flex; align-items: center; justify-content: center; background: #f7fafc; border-radius: 4px; font-size: 32px;">${this.getFileIcon(file.name)}</div>`
                         }
                         <div style="margin-top: 8px; font-size: 12px; color: #2d3748; word-break: break-all;">${file.name}</div>
@@ -437,8 +532,15 @@
                 `;
             }).join('');
             
+            if (append) {
+                grid.insertAdjacentHTML('beforeend', html);
+            } else {
+                grid.innerHTML = html;
+            }
+            
             // إضافة مستمعي الأحداث
-            grid.querySelectorAll('.media-item').forEach(item => {
+            grid.querySelectorAll('.media-item:not([data-bound])').forEach(item => {
+                item.dataset.bound = 'true';
                 item.addEventListener('click', () => {
                     const url = item.dataset.url;
                     const name = item.dataset.name;